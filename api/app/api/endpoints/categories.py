@@ -1,51 +1,52 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import List, Optional
 
 from app.api.models.document import Categoria
-from app.db.database import execute_query
+from app.db.database import DatabaseTimeout
+from app.db.category_catalog import category_catalog
+from app.config import CATEGORY_CACHE_CONTROL
+from app.api.etag import etag_matches, make_etag, not_modified, set_cache_headers
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Categoria])
-async def list_categories():
+async def list_categories(response: Response, if_none_match: Optional[str] = Header(None)):
     """
-    Recupera la lista de todas las categorías disponibles.
+    Recupera la lista de todas las categorías disponibles (desde el catálogo en memoria).
+    Admite peticiones condicionales con If-None-Match.
     """
     try:
-        sql = "SELECT id, nombre FROM categoria ORDER BY nombre"
-        results = execute_query(sql)
-        
-        categories = []
-        for row in results:
-            categories.append({
-                "id": row[0],
-                "nombre": row[1]
-            })
-        
-        return categories
+        snapshot = await category_catalog.snapshot()
+        if etag_matches(if_none_match, snapshot.etag):
+            return not_modified(snapshot.etag, CATEGORY_CACHE_CONTROL)
+        set_cache_headers(response, snapshot.etag, CATEGORY_CACHE_CONTROL)
+        return snapshot.categories
         
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar categorías: {str(e)}")
 
 @router.get("/{id_categoria}", response_model=Categoria)
-async def get_category(id_categoria: int):
+async def get_category(id_categoria: int, response: Response, if_none_match: Optional[str] = Header(None)):
     """
-    Recupera una categoría específica por su ID.
+    Recupera una categoría específica por su ID (desde el catálogo en memoria).
+    Admite peticiones condicionales con If-None-Match.
     """
     try:
-        sql = "SELECT id, nombre FROM categoria WHERE id = %s"
-        result = execute_query(sql, [id_categoria], fetchone=True)
+        category = await category_catalog.get(id_categoria)
         
-        if not result:
+        if not category:
             raise HTTPException(status_code=404, detail=f"Categoría con ID {id_categoria} no encontrada")
         
-        category = {
-            "id": result[0],
-            "nombre": result[1]
-        }
-        
+        etag = make_etag(category["id"], category["nombre"])
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, CATEGORY_CACHE_CONTROL)
+        set_cache_headers(response, etag, CATEGORY_CACHE_CONTROL)
         return category
         
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -1,116 +1,355 @@
-from fastapi import APIRouter, HTTPException, Path
-from typing import List
+import base64
+import binascii
+import json
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
+from datetime import date
+import logging
 
-from app.api.models.document import Documento
-from app.db.database import execute_query
+import httpx
+
+from app.api.models.document import Documento, DocumentoBatchRequest, DocumentoBatchResponse
+from app.api.models.search import SimilarResponse
+from app.api.endpoints.search import parse_engine_results
+from app.clients.search_engine import search_engine
+from app.config import DOCUMENT_CACHE_CONTROL, DOCUMENT_BATCH_MAX, DOCUMENT_BATCH_CHUNK
+from app.api.etag import document_etags, etag_matches, make_etag, not_modified, set_cache_headers
+from app.db.database import run_query, DatabaseTimeout
 
 router = APIRouter()
+logger = logging.getLogger("documents_router")
+
+# autores del documento en orden, leídos de la tabla de unión documento_autor
+AUTHORS_SQL = """ARRAY(
+            SELECT a.nombre FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+            WHERE da.id_documento = d.id ORDER BY da.orden
+        ) AS autores"""
+
+# campos que se pueden pedir con `fields` (id se devuelve siempre)
+DOCUMENT_FIELDS = ("titulo", "autor", "fecha_publicacion", "url_fuente", "categoria", "resumen")
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """ Campos pedidos en `fields` (separados por comas); None si se piden todos """
+    if not fields:
+        return None
+    requested = tuple(sorted({field.strip() for field in fields.split(",") if field.strip()}))
+    unknown = [field for field in requested if field not in DOCUMENT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(DOCUMENT_FIELDS)}"
+        )
+    return requested
 
-@router.get("/{id_documento}", response_model=Documento)
-async def get_document(id_documento: int = Path(..., description="ID del documento a recuperar")):
+def document_sql(fields: Optional[Tuple[str, ...]] = None, version: bool = False) -> str:
     """
-    Recupera un documento específico por su ID, incluyendo su resumen y categoría.
+    SELECT de documentos con solo las columnas y joins de los campos pedidos
+    (todos si `fields` es None). Los campos no pedidos se sustituyen por NULL
+    para conservar las posiciones de row_to_document. La fecha se lee siempre
+    porque es la clave del cursor de los listados. Con `version` se añaden los
+    xmin del documento y de su resumen, para el ETag.
+    """
+    wanted = set(DOCUMENT_FIELDS if fields is None else fields)
+    columns = [
+        "d.id",
+        "d.titulo" if "titulo" in wanted else "NULL",
+        AUTHORS_SQL if "autor" in wanted else "NULL",
+        "d.fecha_publicacion",
+        "d.url_fuente" if "url_fuente" in wanted else "NULL",
+        "c.id as id_categoria, c.nombre as categoria_nombre" if "categoria" in wanted else "NULL, NULL",
+        "r.id as resumen_id, r.texto_resumen" if "resumen" in wanted else "NULL, NULL"
+    ]
+    if version:
+        columns.append("d.xmin::text, r.xmin::text" if "resumen" in wanted else "d.xmin::text, NULL")
+    sql = "\n        SELECT " + ", ".join(columns) + "\n        FROM documento d\n"
+    if "categoria" in wanted:
+        sql += "        LEFT JOIN categoria c ON d.id_categoria = c.id\n"
+    if "resumen" in wanted:
+        sql += "        LEFT JOIN resumen r ON d.id = r.id_documento\n"
+    return sql
+
+def row_to_document(row, fields: Optional[Tuple[str, ...]] = None):
     """
+    Construye el documento con su categoría y resumen a partir de una fila de
+    document_sql. Con `fields` solo se incluyen esos campos, además del id.
+    """
+    documento = {
+        "id": row[0],
+        "titulo": row[1],
+        "autor": list(row[2]) if row[2] else [],  # Lista de autores
+        "fecha_publicacion": row[3],
+        "url_fuente": row[4],
+        "categoria": {
+            "id": row[5],
+            "nombre": row[6]
+        } if row[5] else None,
+        "resumen": {
+            "id": row[7],
+            "id_documento": row[0],
+            "texto_resumen": row[8]
+        } if row[7] else None
+    }
+    if fields is not None:
+        documento = {key: value for key, value in documento.items() if key == "id" or key in fields}
+    return documento
+
+# clave de orden de los listados: fecha descendente (sin fecha primero, como el
+# ORDER BY fecha_publicacion DESC original) y id como desempate; coincide con los
+# índices idx_documento_orden e idx_documento_categoria_orden (migración 007)
+ORDER_KEY_SQL = "COALESCE(d.fecha_publicacion, 'infinity'::date)"
+
+def encode_cursor(row) -> str:
+    """ Cursor opaco con la clave de orden de la última fila de la página """
+    fecha = row[3].isoformat() if row[3] else "infinity"
+    return base64.urlsafe_b64encode(f"{fecha}|{row[0]}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """ (fecha, id) de un cursor de encode_cursor; ValueError si no es válido """
     try:
-        # Obtener información del documento
-        doc_sql = """
-        SELECT d.id, d.titulo, d.autor, d.fecha_publicacion, d.url_fuente, 
-               c.id as id_categoria, c.nombre as categoria_nombre,
-               r.id as resumen_id, r.texto_resumen
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        fecha, id_documento = raw.split("|")
+        if fecha != "infinity":
+            fecha = date.fromisoformat(fecha)
+        return fecha, int(id_documento)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Cursor no válido: {cursor}") from e
+
+# versión de la fila del documento y de su resumen, para el ETag
+DOCUMENT_VERSION_SQL = """
+        SELECT d.xmin::text, r.xmin::text
         FROM documento d
-        LEFT JOIN categoria c ON d.id_categoria = c.id
         LEFT JOIN resumen r ON d.id = r.id_documento
         WHERE d.id = %s
         """
+
+def document_etag(id_documento: int, version, fields: Optional[Tuple[str, ...]] = None) -> str:
+    """ ETag de la representación: versión de las filas leídas y campos incluidos """
+    version_documento, version_resumen = version
+    if fields is not None and "resumen" not in fields:
+        version_resumen = None
+    return make_etag(id_documento, version_documento, version_resumen, *(fields or ()))
+
+@router.get("/{id_documento}", response_model=Documento, response_model_exclude_unset=True)
+async def get_document(
+    response: Response,
+    id_documento: int = Path(..., description="ID del documento a recuperar"),
+    fields: Optional[str] = Query(None, description="Campos separados por comas (por defecto, todos)"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Recupera un documento específico por su ID, incluyendo su resumen y categoría.
+    Admite peticiones condicionales con If-None-Match.
+    """
+    fields = parse_fields(fields)
+    try:
+        if if_none_match:
+            # revalidación: primero el ETag recordado, si no la versión de la fila
+            etag = document_etags.get((id_documento, fields))
+            if etag is None:
+                version = await run_query(DOCUMENT_VERSION_SQL, [id_documento], fetchone=True)
+                if version:
+                    etag = document_etag(id_documento, version, fields)
+                    document_etags.put((id_documento, fields), etag)
+            if etag and etag_matches(if_none_match, etag):
+                return not_modified(etag, DOCUMENT_CACHE_CONTROL)
+
+        # Obtener información del documento
+        doc_sql = document_sql(fields, version=True) + " WHERE d.id = %s"
         
-        result = execute_query(doc_sql, [id_documento], fetchone=True)
+        result = await run_query(doc_sql, [id_documento], fetchone=True)
         
         if not result:
             raise HTTPException(status_code=404, detail=f"Documento con ID {id_documento} no encontrado")
         
-        # Si el autor es una cadena, convertirlo a lista. Si es None, usar lista vacía
-        autor = []
-        if result[2]:
-            autor = [result[2]]
-        
-        # Construir el objeto documento con su categoría y resumen
-        documento = {
-            "id": result[0],
-            "titulo": result[1],
-            "autor": autor,  # Lista de autores
-            "fecha_publicacion": result[3],
-            "url_fuente": result[4],
-            "categoria": {
-                "id": result[5],
-                "nombre": result[6]
-            } if result[5] else None,
-            "resumen": {
-                "id": result[7],
-                "id_documento": result[0],
-                "texto_resumen": result[8]
-            } if result[7] else None
-        }
+        documento = row_to_document(result, fields)
         
+        etag = document_etag(result[0], result[9:11], fields)
+        document_etags.put((id_documento, fields), etag)
+        set_cache_headers(response, etag, DOCUMENT_CACHE_CONTROL)
         return documento
         
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Error al recuperar el documento: {str(e)}")
 
-@router.get("/", response_model=List[Documento])
-async def list_documents(id_categoria: int = None, limit: int = 20, offset: int = 0):
+async def fetch_documents(ids: List[int]):
+    """ Documentos de `ids` con una sola consulta, en el orden pedido (los inexistentes se omiten) """
+    results = await run_query(document_sql() + " WHERE d.id = ANY(%s)", [ids])
+    by_id = {row[0]: row for row in results}
+    return [row_to_document(by_id[i]) for i in ids if i in by_id]
+
+async def stream_batch(ids: List[int], first_chunk):
+    """
+    Cuerpo JSON de un lote grande, generado por trozos de DOCUMENT_BATCH_CHUNK
+    documentos: el cliente recibe los primeros sin esperar a todo el lote.
+    """
+    found = set()
+    yield '{"documentos":['
+    first = True
+    for start in range(0, len(ids), DOCUMENT_BATCH_CHUNK):
+        chunk = first_chunk if start == 0 else await fetch_documents(ids[start:start + DOCUMENT_BATCH_CHUNK])
+        for documento in chunk:
+            found.add(documento["id"])
+            yield ("" if first else ",") + Documento(**documento).model_dump_json()
+            first = False
+    yield '],"faltantes":' + json.dumps([i for i in ids if i not in found]) + '}'
+
+@router.post("/batch", response_model=DocumentoBatchResponse)
+async def get_documents_batch(batch: DocumentoBatchRequest):
     """
-    Recupera una lista de documentos, opcionalmente filtrados por categoría.
+    Recupera varios documentos a la vez, en el orden de `ids`, e indica los que
+    no existen. Los lotes de más de DOCUMENT_BATCH_CHUNK documentos se envían
+    en streaming.
     """
+    # sin duplicados, conservando el orden pedido
+    ids = list(dict.fromkeys(batch.ids))
+    if len(ids) > DOCUMENT_BATCH_MAX:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Se admiten como máximo {DOCUMENT_BATCH_MAX} documentos por lote ({len(ids)} solicitados)"
+        )
+
+    try:
+        # el primer trozo se lee antes de responder para poder devolver 503/500
+        documentos = await fetch_documents(ids[:DOCUMENT_BATCH_CHUNK])
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al recuperar los documentos: {str(e)}")
+
+    if len(ids) > DOCUMENT_BATCH_CHUNK:
+        return StreamingResponse(stream_batch(ids, documentos), media_type="application/json")
+
+    found = {documento["id"] for documento in documentos}
+    return {"documentos": documentos, "faltantes": [i for i in ids if i not in found]}
+
+@router.get("/{id_documento}/similar", response_model=SimilarResponse)
+async def get_similar_documents(
+    id_documento: int = Path(..., description="ID del documento de referencia"),
+    id_categoria: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Recupera documentos relacionados con uno dado. El motor de búsqueda usa
+    el vector almacenado del documento, sin volver a generar un embedding.
+    """
+    params = {"limit": limit, "offset": offset}
+    if id_categoria is not None:
+        params["id_categoria"] = id_categoria
+    if fecha_desde is not None:
+        params["fecha_desde"] = fecha_desde.isoformat()
+    if fecha_hasta is not None:
+        params["fecha_hasta"] = fecha_hasta.isoformat()
+
+    try:
+        response = await search_engine.get(f"/similar/{id_documento}", params=params)
+    except httpx.RequestError as e:
+        logger.error(f"Error de comunicación con el motor de búsqueda: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error de comunicación con el motor de búsqueda: {str(e)}"
+        )
+
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail=f"Documento con ID {id_documento} no encontrado")
+    if response.status_code != 200:
+        logger.error(f"Error del motor de búsqueda: {response.status_code} - {response.text}")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Error del motor de búsqueda: {response.text}"
+        )
+
+    data = response.json()
+    return SimilarResponse(
+        results=parse_engine_results(data.get("results", [])),
+        total=data.get("total", 0),
+        id_documento=id_documento
+    )
+
+@router.get("/", response_model=List[Documento], response_model_exclude_unset=True)
+async def list_documents(
+    response: Response,
+    id_categoria: int = None,
+    autor: str = None,
+    fecha_desde: date = None,
+    fecha_hasta: date = None,
+    limit: int = Query(20, ge=0),
+    offset: int = Query(0, ge=0, description="Paginación por posición (se ignora si se indica cursor)"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Campos separados por comas (por defecto, todos)")
+):
+    """
+    Recupera una lista de documentos, opcionalmente filtrados por categoría,
+    autor y rango de fechas de publicación, ordenados por fecha descendente.
+
+    Para recorrer el listado, usar el cursor de la cabecera X-Next-Cursor:
+    cada página cuesta lo mismo que la primera, a diferencia de offset.
+    """
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fields = parse_fields(fields)
+
     try:
         # Construir consulta SQL base
-        sql = """
-        SELECT d.id, d.titulo, d.autor, d.fecha_publicacion, d.url_fuente, 
-               c.id as id_categoria, c.nombre as categoria_nombre, 
-               r.id as resumen_id, r.texto_resumen
-        FROM documento d
-        LEFT JOIN categoria c ON d.id_categoria = c.id
-        LEFT JOIN resumen r ON d.id = r.id_documento
-        """
+        sql = document_sql(fields)
         
+        conditions = []
         params = []
         
         # Añadir filtro por categoría si se especificó
         if id_categoria:
-            sql += " WHERE d.id_categoria = %s"
+            conditions.append("d.id_categoria = %s")
             params.append(id_categoria)
         
-        # Añadir límite y offset para paginación
-        sql += f" ORDER BY d.fecha_publicacion DESC LIMIT {limit} OFFSET {offset}"
+        # Filtro por autor resuelto con los índices de autor y documento_autor
+        if autor:
+            conditions.append("""d.id IN (
+                SELECT da.id_documento FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+                WHERE LOWER(a.nombre) = LOWER(%s)
+            )""")
+            params.append(autor.strip())
+        
+        # Rango de fechas, resuelto con el índice de fecha_publicacion
+        if fecha_desde:
+            conditions.append("d.fecha_publicacion >= %s")
+            params.append(fecha_desde)
+        if fecha_hasta:
+            conditions.append("d.fecha_publicacion <= %s")
+            params.append(fecha_hasta)
+        
+        # Keyset: filas estrictamente posteriores a la última de la página anterior
+        if position:
+            conditions.append(f"({ORDER_KEY_SQL}, d.id) < (%s::date, %s)")
+            params.extend(position)
+        
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        
+        # Orden total (id como desempate) para que las páginas no repitan ni salten filas
+        sql += f" ORDER BY {ORDER_KEY_SQL} DESC, d.id DESC LIMIT %s"
+        params.append(limit)
+        if not position and offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+        
+        results = await run_query(sql, params)
         
-        results = execute_query(sql, params)
+        if results and len(results) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(results[-1])
         
         # Formatear resultados
-        documentos = []
-        for row in results:
-            # Manejo consistente del campo autor
-            autor = []
-            if row[2]:
-                autor = [row[2]]
-
-            documentos.append({
-                "id": row[0],
-                "titulo": row[1],
-                "autor": autor,  # Lista de autores
-                "fecha_publicacion": row[3],
-                "url_fuente": row[4],
-                "categoria": {
-                    "id": row[5],
-                    "nombre": row[6]
-                } if row[5] else None,
-                "resumen": {
-                    "id": row[7],
-                    "id_documento": row[0],
-                    "texto_resumen": row[8]
-                } if row[7] else None
-            })
-        return documentos
+        return [row_to_document(row, fields) for row in results]
         
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar documentos: {str(e)}")
\ No newline at end of file
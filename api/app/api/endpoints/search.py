@@ -1,81 +1,190 @@
 from fastapi import APIRouter, HTTPException, status
 import httpx
 from typing import List
-import os
 import logging
 
-from app.api.models.search import SearchQuery, SearchResponse, SearchResult
+from app.api.models.search import SearchQuery, SearchResponse, SearchResult, SearchField
+from app.config import SEARCH_ENGINE_URLS, SEARCH_FALLBACK_TIMEOUT_MS
+from app.clients.search_engine import search_engine
+from app.db.database import run_query, DatabaseTimeout
 
 router = APIRouter()
 logger = logging.getLogger("search_router")
 
-# URL del microservicio del motor de búsqueda
-SEARCH_ENGINE_URL = os.getenv("SEARCH_ENGINE_URL", "http://localhost:8001")
+logger.info(f"Configurado motor de búsqueda en: {', '.join(SEARCH_ENGINE_URLS)}")
 
-logger.info(f"Configurado motor de búsqueda en: {SEARCH_ENGINE_URL}")
+def parse_engine_results(items: List[dict]) -> List[SearchResult]:
+    """
+    Transforma los resultados del motor de búsqueda al formato esperado por la API.
+    """
+    results = []
+    for item in items:
+        try:
+            # solo los campos que ha enviado el motor (todos, salvo que se pida `fields`)
+            fields = {field: item[field] for field in SearchField.__args__ if field in item}
+            results.append(
+                SearchResult(
+                    id_documento=item["id"],
+                    score=item["score"],
+                    score_rerank=item.get("score_rerank"),
+                    # los scores de la búsqueda de texto no son similitudes coseno
+                    origen=item.get("origen", "vectorial"),
+                    **fields
+                )
+            )
+        except KeyError as e:
+            logger.error(f"Error al procesar resultado: {str(e)}, item: {item}")
+    return results
+
+# Búsqueda degradada, sin unir resumen: las coincidencias en el título salen del
+# índice de trigramas (idx_documento_titulo_trgm, migración 006) y los documentos
+# en el orden de los listados, del índice idx_documento_orden (migración 007)
+FALLBACK_SQL = """
+        SELECT d.id, d.titulo, d.fecha_publicacion, d.url_fuente,
+               c.id as id_categoria, c.nombre as categoria_nombre
+        FROM documento d
+        LEFT JOIN categoria c ON d.id_categoria = c.id
+        WHERE TRUE{conditions}
+        ORDER BY COALESCE(d.fecha_publicacion, 'infinity'::date) DESC, d.id DESC
+        LIMIT %s OFFSET %s
+        """
+
+async def degraded_search(query: SearchQuery) -> SearchResponse:
+    """
+    Respuesta de la propia API cuando el motor no está disponible (circuito
+    abierto o sin respuesta): documentos cuyo título contiene alguna palabra
+    de la consulta o, si no hay ninguno a tiempo, los más recientes. No se
+    cuenta el total: solo se conoce si la página no se llena.
+    """
+    conditions, params = "", []
+    if query.id_categoria is not None:
+        conditions += " AND d.id_categoria = %s"
+        params.append(query.id_categoria)
+    if query.autor:
+        conditions += """ AND d.id IN (
+            SELECT da.id_documento FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+            WHERE LOWER(a.nombre) = LOWER(%s)
+        )"""
+        params.append(query.autor.strip())
+    if query.fecha_desde:
+        conditions += " AND d.fecha_publicacion >= %s"
+        params.append(query.fecha_desde)
+    if query.fecha_hasta:
+        conditions += " AND d.fecha_publicacion <= %s"
+        params.append(query.fecha_hasta)
+
+    # un ILIKE por palabra (y no ILIKE ANY) para que el GIN de trigramas las combine con BitmapOr
+    words = [f"%{word}%" for word in query.query.split() if len(word) > 2]
+    rows, origen = [], "texto"
+    if words:
+        title_conditions = " AND (" + " OR ".join(["d.titulo ILIKE %s"] * len(words)) + ")"
+        try:
+            rows = await run_query(
+                FALLBACK_SQL.format(conditions=conditions + title_conditions),
+                params + words + [query.limit, query.offset],
+                timeout_ms=SEARCH_FALLBACK_TIMEOUT_MS
+            )
+        except DatabaseTimeout:
+            logger.warning("Búsqueda degradada por título demasiado lenta, se devuelven los más recientes")
+    total_known = True
+    if not rows:
+        origen = "reciente"
+        try:
+            rows = await run_query(
+                FALLBACK_SQL.format(conditions=conditions),
+                params + [query.limit, query.offset],
+                timeout_ms=SEARCH_FALLBACK_TIMEOUT_MS
+            )
+        except DatabaseTimeout:
+            logger.warning("Búsqueda degradada sin respuesta a tiempo de la base de datos")
+            total_known = False
+
+    results = []
+    for row in rows:
+        item = {
+            "titulo": row[1],
+            "autor": [],
+            "fecha_publicacion": row[2],
+            "url_fuente": row[3],
+            "categoria": {"id": row[4], "nombre": row[5]} if row[4] else None,
+            "texto_resumen": None
+        }
+        if query.fields is not None:
+            item = {key: value for key, value in item.items() if key in query.fields}
+        results.append(SearchResult(id_documento=row[0], score=0.0, origen=origen, **item))
+
+    # solo con la página incompleta se sabe el total sin contar
+    total = query.offset + len(results) if total_known and len(rows) < query.limit else None
 
-@router.post("/", response_model=SearchResponse)
+    return SearchResponse(
+        results=results,
+        total=total,
+        query=query.query,
+        facetas=None,
+        parcial=False,
+        degradado=True
+    )
+
+@router.post("/", response_model=SearchResponse, response_model_exclude_unset=True)
 async def search_documents(query: SearchQuery):
     """
     Endpoint para buscar documentos usando procesamiento de lenguaje natural.
-    Este endpoint delega la búsqueda al microservicio del motor de búsqueda.
+    Este endpoint delega la búsqueda al microservicio del motor de búsqueda;
+    si el motor no está disponible responde con degraded_search.
     """
     try:
         # Registrar información de la solicitud
         logger.info(f"Enviando consulta al motor de búsqueda: {query.query}")
-        logger.info(f"URL del motor de búsqueda: {SEARCH_ENGINE_URL}")
         
-        # Llamar al microservicio del motor de búsqueda con timeout y manejo de errores
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        breaker = search_engine.breaker
+        if not breaker.allow():
+            logger.warning("Circuito del motor de búsqueda abierto: búsqueda degradada")
+            return await degraded_search(query)
+        
+        # Llamar al microservicio del motor de búsqueda con el cliente compartido
+        error = None
+        try:
+            response = await search_engine.hedged("POST", "/search", json=query.model_dump(mode="json"))
+            if response.status_code >= 500:
+                error = f"Error del motor de búsqueda: {response.status_code} - {response.text}"
+        except httpx.RequestError as e:
+            error = f"Error de comunicación con el motor de búsqueda: {str(e)}"
+        
+        # sin respuesta o con un 5xx: cuenta para el circuito y se sirve la búsqueda degradada
+        if error is not None:
+            breaker.record_failure()
+            logger.error(error)
             try:
-                response = await client.post(
-                    f"{SEARCH_ENGINE_URL}/search",
-                    json=query.dict()
-                )
-                
-                # Verificar respuesta
-                if response.status_code != 200:
-                    logger.error(f"Error del motor de búsqueda: {response.status_code} - {response.text}")
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"Error del motor de búsqueda: {response.text}"
-                    )
-                
-                # Procesar resultados
-                search_results = response.json()
-                logger.info(f"Recibidos {len(search_results.get('results', []))} resultados")
-                
-                # Transformar resultados al formato esperado por la API
-                results = []
-                for item in search_results.get("results", []):
-                    try:
-                        results.append(
-                            SearchResult(
-                                id_documento=item["id"],
-                                titulo=item["titulo"],
-                                autor=item["autor"] if "autor" in item else [],
-                                url_fuente=item.get("url_fuente"),
-                                texto_resumen=item.get("texto_resumen"),
-                                fecha_publicacion=item.get("fecha_publicacion"),  # Añadido
-                                categoria=item.get("categoria"),  # Añadido
-                                score=item["score"]
-                            )
-                        )
-                    except KeyError as e:
-                        logger.error(f"Error al procesar resultado: {str(e)}, item: {item}")
-                
-                return SearchResponse(
-                    results=results,
-                    total=search_results.get("total", 0),
-                    query=query.query
-                )
-                
-            except httpx.RequestError as e:
-                logger.error(f"Error de comunicación con el motor de búsqueda: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
-                    detail=f"Error de comunicación con el motor de búsqueda: {str(e)}"
-                )
+                return await degraded_search(query)
+            except Exception as fallback_error:
+                logger.error(f"Búsqueda degradada fallida: {str(fallback_error)}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=error)
+        breaker.record_success()
+        
+        # Verificar respuesta
+        if response.status_code != 200:
+            logger.error(f"Error del motor de búsqueda: {response.status_code} - {response.text}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Error del motor de búsqueda: {response.text}"
+            )
+        
+        # Procesar resultados
+        search_results = response.json()
+        logger.info(f"Recibidos {len(search_results.get('results', []))} resultados")
+        
+        # Transformar resultados al formato esperado por la API
+        results = parse_engine_results(search_results.get("results", []))
+        
+        return SearchResponse(
+            results=results,
+            total=search_results.get("total", 0),
+            query=query.query,
+            facetas=search_results.get("facetas"),
+            parcial=search_results.get("parcial", False)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error inesperado en la búsqueda: {str(e)}")
         raise HTTPException(
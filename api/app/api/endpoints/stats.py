@@ -0,0 +1,84 @@
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from psycopg2 import errors
+
+from app.api.models.stats import EstadisticasCorpus
+from app.db.database import run_query, DatabaseTimeout
+from app.db.category_catalog import category_catalog
+from app.config import STATS_CACHE_CONTROL
+from app.api.etag import etag_matches, make_etag, not_modified, set_cache_headers
+
+router = APIRouter()
+
+# una fila por (categoría, año, con resumen): la vista ya está agregada
+STATS_SQL = """
+        SELECT id_categoria, anio, con_resumen, documentos, vectorizados, actualizado
+        FROM estadisticas_corpus
+        """
+
+@router.get("/", response_model=EstadisticasCorpus)
+async def get_stats(
+    response: Response,
+    id_categoria: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Número de documentos por categoría, por año de publicación y con o sin
+    resumen, leído de la vista materializada estadisticas_corpus (se refresca
+    tras cada lote de ingesta, así que puede ir ligeramente por detrás).
+    """
+    try:
+        sql, params = STATS_SQL, []
+        if id_categoria is not None:
+            sql += " WHERE id_categoria = %s"
+            params.append(id_categoria)
+        rows = await run_query(sql, params)
+        nombres = (await category_catalog.snapshot()).by_id
+    except errors.UndefinedTable:
+        raise HTTPException(
+            status_code=503,
+            detail="La vista estadisticas_corpus no existe: aplica database/migrations/005_estadisticas_corpus.sql"
+        )
+    except DatabaseTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos saturada: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener las estadísticas: {str(e)}")
+
+    actualizado = max((row[5] for row in rows), default=None)
+    etag = make_etag(id_categoria, actualizado, len(rows))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, STATS_CACHE_CONTROL)
+
+    por_categoria, por_anio = Counter(), Counter()
+    con_resumen = vectorizados = 0
+    for categoria, anio, resumen, documentos, vectorizados_fila, _ in rows:
+        por_categoria[categoria] += documentos
+        por_anio[anio] += documentos
+        con_resumen += documentos if resumen else 0
+        vectorizados += vectorizados_fila
+    total = sum(por_categoria.values())
+
+    # la vista guarda 0 para los documentos sin categoría o sin fecha
+    categorias = []
+    for categoria, documentos in por_categoria.most_common():
+        if categoria == 0:
+            categorias.append({"id": None, "nombre": "Sin categoría", "documentos": documentos})
+        else:
+            nombre = nombres.get(categoria, {}).get("nombre", f"Categoría {categoria}")
+            categorias.append({"id": categoria, "nombre": nombre, "documentos": documentos})
+
+    set_cache_headers(response, etag, STATS_CACHE_CONTROL)
+    return {
+        "documentos": total,
+        "con_resumen": con_resumen,
+        "sin_resumen": total - con_resumen,
+        "vectorizados": vectorizados,
+        "por_categoria": categorias,
+        "por_anio": [
+            {"anio": anio or None, "documentos": documentos}
+            for anio, documentos in sorted(por_anio.items(), reverse=True)
+        ],
+        "actualizado": actualizado
+    }
@@ -0,0 +1,74 @@
+"""
+ETags y peticiones condicionales (If-None-Match -> 304).
+
+Los documentos no cambian tras la ingesta, así que su ETag se deriva de la
+versión de la fila (xmin de documento y de su resumen) y se recuerda en
+memoria durante ETAG_CACHE_TTL segundos: una revalidación de un documento
+reciente se responde con 304 sin consultar la base de datos.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from fastapi import Response
+
+from app.config import ETAG_CACHE_SIZE, ETAG_CACHE_TTL
+
+
+def make_etag(*parts: Any) -> str:
+    """ ETag fuerte a partir de las partes que identifican la versión del recurso """
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """ Comparación débil de If-None-Match (RFC 9110): ignora el prefijo W/ y admite * """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+class EtagCache:
+    """ ETags recientes por recurso, acotados en tamaño y caducados tras un TTL """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, etag: str):
+        with self._lock:
+            self._data[key] = (time.monotonic(), etag)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+document_etags = EtagCache(ETAG_CACHE_SIZE, ETAG_CACHE_TTL)
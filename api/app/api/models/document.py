@@ -1,6 +1,6 @@
 from typing import Optional, List
 from datetime import date
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ResumenBase(BaseModel):
     texto_resumen: str
@@ -27,8 +27,18 @@ class DocumentoCreate(DocumentoBase):
 
 class Documento(DocumentoBase):
     id: int
+    # opcionales en la respuesta: pueden quedar fuera con `fields`
+    titulo: Optional[str] = None
+    fecha_publicacion: Optional[date] = None
     categoria: Optional[Categoria] = None
     resumen: Optional[Resumen] = None
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class DocumentoBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, description="IDs de los documentos, en el orden deseado")
+
+class DocumentoBatchResponse(BaseModel):
+    documentos: List[Documento]
+    faltantes: List[int] = Field([], description="IDs solicitados que no existen")
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import date
 from pydantic import BaseModel, Field
 
@@ -6,23 +6,50 @@ class Categoria(BaseModel):
     id: int
     nombre: str
 
+# campos que se pueden pedir con `fields` (id_documento y score se devuelven siempre)
+SearchField = Literal["titulo", "autor", "fecha_publicacion", "url_fuente", "categoria", "texto_resumen"]
+
 class SearchResult(BaseModel):
     id_documento: int
-    titulo: str
+    titulo: Optional[str] = None
     autor: List[str] = []
     fecha_publicacion: Optional[date] = None  # Añadido
     url_fuente: Optional[str] = None
     texto_resumen: Optional[str] = None
     score: float = Field(..., description="Puntuación de similitud con la consulta")
+    score_rerank: Optional[float] = Field(None, description="Puntuación del cross-encoder, si se ha aplicado")
+    origen: Literal["vectorial", "texto", "reciente"] = Field(
+        "vectorial",
+        description="De dónde sale el score: similitud coseno, BM25 normalizado (no comparable con la similitud) o documentos recientes"
+    )
     categoria: Optional[Categoria] = None  # Añadido
     
+class FacetaCategoria(BaseModel):
+    id: int
+    nombre: str
+    total: int = Field(..., description="Resultados de la categoría entre los mejores candidatos")
+
 class SearchQuery(BaseModel):
     query: str = Field(..., description="Consulta en lenguaje natural")
     id_categoria: Optional[int] = Field(None, description="ID de la categoría para filtrar resultados")
+    autor: Optional[str] = Field(None, description="Nombre del autor para filtrar resultados")
+    fecha_desde: Optional[date] = Field(None, description="Fecha de publicación mínima (incluida)")
+    fecha_hasta: Optional[date] = Field(None, description="Fecha de publicación máxima (incluida)")
+    facetas: bool = Field(False, description="Incluir el número de resultados por categoría")
+    rerank: Optional[bool] = Field(None, description="Reordenar con el cross-encoder (por defecto, según la configuración)")
+    fields: Optional[List[SearchField]] = Field(None, description="Campos de cada resultado (por defecto, todos)")
     limit: int = Field(20, description="Número máximo de resultados")
     offset: int = Field(0, description="Posición inicial para paginación")
 
 class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    total: Optional[int] = Field(..., description="Resultados en total (None si la búsqueda degradada no ha podido contarlos)")
+    query: str
+    facetas: Optional[List[FacetaCategoria]] = None
+    parcial: bool = Field(False, description="Algún fragmento del motor no ha respondido y faltan sus resultados")
+    degradado: bool = Field(False, description="El motor no está disponible: resultados por título, sin similitud semántica")
+
+class SimilarResponse(BaseModel):
     results: List[SearchResult]
     total: int
-    query: str
\ No newline at end of file
+    id_documento: int = Field(..., description="Documento de referencia")
@@ -0,0 +1,21 @@
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class EstadisticaCategoria(BaseModel):
+    id: Optional[int] = None
+    nombre: str
+    documentos: int
+
+class EstadisticaAnio(BaseModel):
+    anio: Optional[int] = Field(None, description="Año de publicación (None: sin fecha)")
+    documentos: int
+
+class EstadisticasCorpus(BaseModel):
+    documentos: int
+    con_resumen: int
+    sin_resumen: int
+    vectorizados: int
+    por_categoria: List[EstadisticaCategoria]
+    por_anio: List[EstadisticaAnio]
+    actualizado: Optional[datetime] = Field(None, description="Último refresco de la vista estadisticas_corpus")
@@ -0,0 +1,142 @@
+"""
+Reparto de carga entre las réplicas del motor de búsqueda (SEARCH_ENGINE_URLS).
+
+Cada petición va a la réplica con menos peticiones en curso: con
+SEARCH_BALANCER=p2c se comparan dos réplicas elegidas al azar (power of two
+choices) y con SEARCH_BALANCER=least se recorren todas. A igualdad de
+peticiones en curso gana la de menor latencia media (EWMA).
+
+Una réplica con SEARCH_EJECT_FAILURES fallos seguidos, o que no supera la
+comprobación activa de salud (GET / cada SEARCH_HEALTH_INTERVAL segundos),
+se expulsa durante SEARCH_EJECT_TIME segundos, el doble en cada expulsión
+consecutiva. Nunca se expulsa más de SEARCH_MAX_EJECTED del total y, si
+todas quedan fuera, se vuelve a usar cualquiera.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger("search_engine_balancer")
+
+# peso de la última petición en la latencia media
+EWMA_ALPHA = 0.2
+# la espera de expulsión deja de crecer tras estas expulsiones consecutivas
+MAX_EJECTION_BACKOFF = 5
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ewma_ms: Optional[float] = None
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.healthy = True
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ewma_ms": self.ewma_ms,
+            "healthy": self.healthy,
+            "ejected": self.is_ejected(now),
+            "ejections": self.ejections
+        }
+
+
+class ReplicaBalancer:
+    def __init__(
+        self,
+        urls: Sequence[str],
+        strategy: str = "p2c",
+        eject_failures: int = 3,
+        eject_time: float = 10.0,
+        max_ejected: float = 0.5
+    ):
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self.eject_failures = eject_failures
+        self.eject_time = eject_time
+        self.max_ejected = max_ejected
+
+    def available(self) -> List[Replica]:
+        now = time.monotonic()
+        live = [r for r in self.replicas if not r.is_ejected(now)]
+        # si todas están expulsadas es mejor intentarlo que no responder
+        return live or list(self.replicas)
+
+    def pick(self, exclude: Optional[Replica] = None) -> Replica:
+        """ Réplica para la siguiente petición (distinta de `exclude` si es posible) """
+        candidates = [r for r in self.available() if r is not exclude] or self.available()
+        if len(candidates) > 2 and self.strategy == "p2c":
+            candidates = random.sample(candidates, 2)
+        return min(candidates, key=lambda r: (r.outstanding, r.ewma_ms or 0.0))
+
+    def started(self, replica: Replica):
+        replica.outstanding += 1
+        replica.requests += 1
+
+    def finished(self, replica: Replica, ok: Optional[bool], elapsed_ms: float):
+        """ Registra el resultado de una petición (ok: sin error de red ni 5xx; None: cancelada) """
+        replica.outstanding -= 1
+        if ok is None:
+            return
+        if ok:
+            replica.consecutive_failures = 0
+            replica.ejections = 0
+            replica.ewma_ms = elapsed_ms if replica.ewma_ms is None else \
+                (1 - EWMA_ALPHA) * replica.ewma_ms + EWMA_ALPHA * elapsed_ms
+            return
+        replica.errors += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.eject_failures:
+            self.eject(replica, f"{replica.consecutive_failures} fallos seguidos")
+
+    def eject(self, replica: Replica, reason: str):
+        now = time.monotonic()
+        if replica.is_ejected(now):
+            return
+        ejected = sum(1 for r in self.replicas if r.is_ejected(now))
+        if ejected + 1 > max(1, int(len(self.replicas) * self.max_ejected)):
+            logger.warning(f"No se expulsa {replica.url} ({reason}): ya hay {ejected} réplicas fuera")
+            return
+        duration = self.eject_time * 2 ** min(replica.ejections, MAX_EJECTION_BACKOFF)
+        replica.ejected_until = now + duration
+        replica.ejections += 1
+        replica.consecutive_failures = 0
+        logger.warning(f"Réplica {replica.url} expulsada {duration:.0f} s: {reason}")
+
+    async def check(self, client: httpx.AsyncClient, replica: Replica, timeout: float):
+        """ Comprobación activa de salud de una réplica """
+        try:
+            response = await client.get(f"{replica.url}/", timeout=timeout)
+            replica.healthy = response.status_code == 200
+        except httpx.HTTPError:
+            replica.healthy = False
+        if not replica.healthy:
+            self.eject(replica, "comprobación de salud fallida")
+
+    async def run_health_checks(self, client: httpx.AsyncClient, interval: float, timeout: float):
+        """ Tarea de fondo del lifespan: comprueba todas las réplicas cada `interval` segundos """
+        while True:
+            await asyncio.gather(*(self.check(client, r, timeout) for r in self.replicas))
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "replicas": [r.stats(now) for r in self.replicas]
+        }
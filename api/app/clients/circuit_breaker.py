@@ -0,0 +1,68 @@
+"""
+Circuit breaker para las llamadas al motor de búsqueda.
+
+Tras SEARCH_BREAKER_FAILURES fallos seguidos el circuito se abre y las
+peticiones se rechazan al instante (la API responde con su búsqueda
+degradada) en lugar de esperar al timeout. Pasados SEARCH_BREAKER_RESET
+segundos se deja pasar una única petición de prueba (half-open): si va bien
+el circuito se cierra y si falla vuelve a abrirse.
+
+Solo se usa desde el event loop, así que no necesita locks.
+"""
+import time
+from typing import Any, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started = None
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """ Indica si se puede llamar al motor; en half-open solo pasa una petición de prueba """
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self.trial_started = None
+        if self.state == HALF_OPEN:
+            # una prueba que no ha terminado (p. ej. cancelada) no bloquea para siempre
+            if self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.trial_started = now
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.trial_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
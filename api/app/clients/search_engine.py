@@ -0,0 +1,215 @@
+"""
+Cliente HTTP compartido hacia el motor de búsqueda.
+
+Se crea una sola vez en el lifespan de la aplicación y mantiene las
+conexiones abiertas (keep-alive) entre peticiones, con límites de pool y
+timeouts de conexión y lectura por separado.
+
+Con varias réplicas (SEARCH_ENGINE_URLS) las peticiones se reparten entre
+ellas con ReplicaBalancer (ver app.clients.balancer) y `hedged` lanza una
+segunda petición a otra réplica si la primera tarda más que el p95 reciente;
+se usa la primera respuesta válida.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+
+from app.clients.balancer import Replica, ReplicaBalancer
+from app.clients.circuit_breaker import CircuitBreaker
+from app.config import (
+    SEARCH_ENGINE_URLS,
+    SEARCH_ENGINE_MAX_CONNECTIONS,
+    SEARCH_ENGINE_MAX_KEEPALIVE,
+    SEARCH_ENGINE_KEEPALIVE_EXPIRY,
+    SEARCH_ENGINE_CONNECT_TIMEOUT,
+    SEARCH_ENGINE_READ_TIMEOUT,
+    SEARCH_ENGINE_POOL_TIMEOUT,
+    SEARCH_ENGINE_HTTP2,
+    SEARCH_BREAKER_FAILURES,
+    SEARCH_BREAKER_RESET,
+    SEARCH_HEDGE,
+    SEARCH_HEDGE_DELAY,
+    SEARCH_HEDGE_MIN_DELAY,
+    SEARCH_HEDGE_MIN_SAMPLES,
+    SEARCH_HEDGE_WINDOW,
+    SEARCH_BALANCER,
+    SEARCH_EJECT_FAILURES,
+    SEARCH_EJECT_TIME,
+    SEARCH_MAX_EJECTED,
+    SEARCH_HEALTH_INTERVAL,
+    SEARCH_HEALTH_TIMEOUT
+)
+
+logger = logging.getLogger("search_engine_client")
+
+
+class SearchEngineClient:
+    """ Envoltorio del AsyncClient con métricas de uso """
+
+    def __init__(self, urls: Sequence[str]):
+        self.urls = list(urls)
+        self.base_url = self.urls[0]
+        self._client: Optional[httpx.AsyncClient] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.balancer = ReplicaBalancer(
+            self.urls,
+            strategy=SEARCH_BALANCER,
+            eject_failures=SEARCH_EJECT_FAILURES,
+            eject_time=SEARCH_EJECT_TIME,
+            max_ejected=SEARCH_MAX_EJECTED
+        )
+        self.breaker = CircuitBreaker(SEARCH_BREAKER_FAILURES, SEARCH_BREAKER_RESET)
+        # latencias recientes de las respuestas correctas, para el retardo del hedging
+        self.latencies = deque(maxlen=SEARCH_HEDGE_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_ms = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def start(self):
+        http2 = SEARCH_ENGINE_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("SEARCH_ENGINE_HTTP2 activado pero falta el paquete h2; se usa HTTP/1.1")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=SEARCH_ENGINE_MAX_CONNECTIONS,
+                max_keepalive_connections=SEARCH_ENGINE_MAX_KEEPALIVE,
+                keepalive_expiry=SEARCH_ENGINE_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=SEARCH_ENGINE_CONNECT_TIMEOUT,
+                read=SEARCH_ENGINE_READ_TIMEOUT,
+                write=SEARCH_ENGINE_READ_TIMEOUT,
+                pool=SEARCH_ENGINE_POOL_TIMEOUT
+            )
+        )
+        if len(self.urls) > 1 and SEARCH_HEALTH_INTERVAL > 0:
+            self._health_task = asyncio.create_task(
+                self.balancer.run_health_checks(self._client, SEARCH_HEALTH_INTERVAL, SEARCH_HEALTH_TIMEOUT)
+            )
+        logger.info(f"Cliente del motor de búsqueda listo: {', '.join(self.urls)} (http2={http2})")
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, path: str, replica: Optional[Replica] = None, **kwargs) -> httpx.Response:
+        if self._client is None:
+            # p. ej. en pruebas que no ejecutan el lifespan
+            await self.start()
+        replica = replica or self.balancer.pick()
+        self.requests += 1
+        self.in_flight += 1
+        self.balancer.started(replica)
+        # None: cancelada (p. ej. por el hedging), no cuenta a favor ni en contra de la réplica
+        ok = None
+        start = time.perf_counter()
+        try:
+            response = await self._client.request(method, f"{replica.url}{path}", **kwargs)
+            ok = response.status_code < 500
+            if ok:
+                self.latencies.append(time.perf_counter() - start)
+            return response
+        except httpx.RequestError:
+            ok = False
+            self.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.balancer.finished(replica, ok, elapsed_ms)
+            self.in_flight -= 1
+            self.total_ms += elapsed_ms
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    def hedge_delay(self) -> float:
+        """ Espera antes de la petición de respaldo: p95 de las latencias recientes """
+        if len(self.latencies) < SEARCH_HEDGE_MIN_SAMPLES:
+            return SEARCH_HEDGE_DELAY
+        ordered = sorted(self.latencies)
+        return max(ordered[int(0.95 * (len(ordered) - 1))], SEARCH_HEDGE_MIN_DELAY)
+
+    async def hedged(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Petición idempotente con respaldo: si la primera réplica no ha respondido
+        tras hedge_delay() (o ha fallado) se envía la misma petición a otra y se
+        devuelve la primera respuesta sin error 5xx; la otra se cancela.
+        """
+        if not SEARCH_HEDGE or len(self.urls) < 2:
+            return await self.request(method, path, **kwargs)
+
+        first = self.balancer.pick()
+        primary = asyncio.create_task(self.request(method, path, replica=first, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if done and primary.exception() is None and primary.result().status_code < 500:
+            return primary.result()
+
+        self.hedges += 1
+        backup = asyncio.create_task(self.request(method, path, replica=self.balancer.pick(exclude=first), **kwargs))
+        pending = {primary, backup}
+        response, error = None, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task.result().status_code < 500:
+                    for other in pending:
+                        other.cancel()
+                    if task is backup:
+                        self.hedge_wins += 1
+                    return task.result()
+                response = task.result()
+        if response is not None:
+            return response
+        raise error
+
+    def _pool_connections(self) -> Dict[str, int]:
+        # httpx no expone el pool; se lee el de httpcore si está disponible
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {}
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "urls": self.urls,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_ms": self.total_ms / self.requests if self.requests else 0.0,
+            "hedge_delay_ms": self.hedge_delay() * 1000,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breaker": self.breaker.stats(),
+            "balancer": self.balancer.stats(),
+            "max_connections": SEARCH_ENGINE_MAX_CONNECTIONS,
+            "max_keepalive": SEARCH_ENGINE_MAX_KEEPALIVE,
+            "pool": self._pool_connections() if self._client is not None else {}
+        }
+
+
+search_engine = SearchEngineClient(SEARCH_ENGINE_URLS)
@@ -7,8 +7,73 @@ load_dotenv()
 # Configuración de la base de datos
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://admin:admin123@db:5432/cliniccloud")
 
+# Pool de conexiones: consultas simultáneas, tiempo máximo por consulta y de espera de conexión
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_QUERY_TIMEOUT_MS = int(os.getenv("DB_QUERY_TIMEOUT_MS", "5000"))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "5"))
+
 # Configuración del motor de búsqueda
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
-MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "20"))
\ No newline at end of file
+MAX_SEARCH_RESULTS = int(os.getenv("MAX_SEARCH_RESULTS", "20"))
+
+# URL del microservicio del motor de búsqueda
+SEARCH_ENGINE_URL = os.getenv("SEARCH_ENGINE_URL", "http://localhost:8001")
+
+# Cliente HTTP persistente hacia el motor de búsqueda (uno por proceso de la API)
+SEARCH_ENGINE_MAX_CONNECTIONS = int(os.getenv("SEARCH_ENGINE_MAX_CONNECTIONS", "100"))
+SEARCH_ENGINE_MAX_KEEPALIVE = int(os.getenv("SEARCH_ENGINE_MAX_KEEPALIVE", "20"))
+SEARCH_ENGINE_KEEPALIVE_EXPIRY = float(os.getenv("SEARCH_ENGINE_KEEPALIVE_EXPIRY", "30"))
+SEARCH_ENGINE_CONNECT_TIMEOUT = float(os.getenv("SEARCH_ENGINE_CONNECT_TIMEOUT", "2"))
+SEARCH_ENGINE_READ_TIMEOUT = float(os.getenv("SEARCH_ENGINE_READ_TIMEOUT", "10"))
+SEARCH_ENGINE_POOL_TIMEOUT = float(os.getenv("SEARCH_ENGINE_POOL_TIMEOUT", "5"))
+# HTTP/2 solo se negocia sobre TLS y requiere el paquete h2 (httpx[http2])
+SEARCH_ENGINE_HTTP2 = os.getenv("SEARCH_ENGINE_HTTP2", "false").lower() == "true"
+
+# Caché HTTP: los documentos no cambian tras la ingesta; las categorías, casi nunca
+DOCUMENT_CACHE_CONTROL = os.getenv("DOCUMENT_CACHE_CONTROL", "public, max-age=604800")
+CATEGORY_CACHE_CONTROL = os.getenv("CATEGORY_CACHE_CONTROL", "public, max-age=300")
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "10000"))
+ETAG_CACHE_TTL = float(os.getenv("ETAG_CACHE_TTL", "300"))
+
+# Catálogo de categorías en memoria: canal de avisos y recarga de respaldo
+CATEGORY_NOTIFY_CHANNEL = os.getenv("CATEGORY_NOTIFY_CHANNEL", "categoria_cambios")
+CATEGORY_CATALOG_TTL = float(os.getenv("CATEGORY_CATALOG_TTL", "600"))
+
+# Lectura de documentos por lotes (POST /api/documents/batch)
+DOCUMENT_BATCH_MAX = int(os.getenv("DOCUMENT_BATCH_MAX", "1000"))
+DOCUMENT_BATCH_CHUNK = int(os.getenv("DOCUMENT_BATCH_CHUNK", "100"))
+
+# Réplicas del motor de búsqueda (separadas por comas); por defecto, solo SEARCH_ENGINE_URL
+SEARCH_ENGINE_URLS = [
+    url.strip().rstrip("/")
+    for url in os.getenv("SEARCH_ENGINE_URLS", SEARCH_ENGINE_URL).split(",")
+    if url.strip()
+]
+
+# Circuit breaker: fallos seguidos para abrirlo y segundos hasta la petición de prueba
+SEARCH_BREAKER_FAILURES = int(os.getenv("SEARCH_BREAKER_FAILURES", "5"))
+SEARCH_BREAKER_RESET = float(os.getenv("SEARCH_BREAKER_RESET", "30"))
+
+# Peticiones de respaldo (hedging) a otra réplica tras el p95 de latencia
+SEARCH_HEDGE = os.getenv("SEARCH_HEDGE", "true").lower() == "true"
+SEARCH_HEDGE_DELAY = float(os.getenv("SEARCH_HEDGE_DELAY", "0.5"))
+SEARCH_HEDGE_MIN_DELAY = float(os.getenv("SEARCH_HEDGE_MIN_DELAY", "0.02"))
+SEARCH_HEDGE_MIN_SAMPLES = int(os.getenv("SEARCH_HEDGE_MIN_SAMPLES", "20"))
+SEARCH_HEDGE_WINDOW = int(os.getenv("SEARCH_HEDGE_WINDOW", "500"))
+
+# Búsqueda degradada sobre la base de datos de la API mientras el motor no responde
+SEARCH_FALLBACK_TIMEOUT_MS = int(os.getenv("SEARCH_FALLBACK_TIMEOUT_MS", "1000"))
+
+# Reparto entre réplicas: "p2c" (dos al azar) o "least" (todas), por peticiones en curso
+SEARCH_BALANCER = os.getenv("SEARCH_BALANCER", "p2c")
+SEARCH_EJECT_FAILURES = int(os.getenv("SEARCH_EJECT_FAILURES", "3"))
+SEARCH_EJECT_TIME = float(os.getenv("SEARCH_EJECT_TIME", "10"))
+SEARCH_MAX_EJECTED = float(os.getenv("SEARCH_MAX_EJECTED", "0.5"))
+SEARCH_HEALTH_INTERVAL = float(os.getenv("SEARCH_HEALTH_INTERVAL", "5"))
+SEARCH_HEALTH_TIMEOUT = float(os.getenv("SEARCH_HEALTH_TIMEOUT", "1"))
+
+# Estadísticas del corpus (GET /api/stats): la vista se refresca tras cada lote de ingesta
+STATS_CACHE_CONTROL = os.getenv("STATS_CACHE_CONTROL", "public, max-age=60")
@@ -0,0 +1,132 @@
+"""
+Catálogo de categorías en memoria.
+
+La tabla categoria es diminuta y casi nunca cambia, así que la API la carga
+entera al arrancar y sirve los endpoints de categorías sin tocar la base de
+datos. Un hilo escucha el canal CATEGORY_NOTIFY_CHANNEL (LISTEN/NOTIFY; lo
+dispara el trigger de database/migrations/003_categoria_notify.sql cuando el
+scraper crea una categoría) y recarga el catálogo al recibir un aviso. Si no
+llegan avisos (migración sin aplicar, conexión caída) el catálogo se recarga
+igualmente cuando supera CATEGORY_CATALOG_TTL segundos.
+"""
+import logging
+import select
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+
+from app.api.etag import make_etag
+from app.config import DATABASE_URL, CATEGORY_CATALOG_TTL, CATEGORY_NOTIFY_CHANNEL
+from app.db.database import run_query
+
+logger = logging.getLogger("category_catalog")
+
+CATEGORIES_SQL = "SELECT id, nombre FROM categoria ORDER BY nombre"
+
+
+class CategorySnapshot:
+    """ Estado inmutable del catálogo: se sustituye entero en cada recarga """
+
+    def __init__(self, rows):
+        self.categories: List[Dict[str, Any]] = [{"id": row[0], "nombre": row[1]} for row in rows]
+        self.by_id: Dict[int, Dict[str, Any]] = {c["id"]: c for c in self.categories}
+        self.etag = make_etag(*(f"{c['id']}:{c['nombre']}" for c in self.categories))
+        self.loaded_at = time.monotonic()
+
+
+class CategoryCatalog:
+    def __init__(self, dsn: str, channel: str, ttl: float):
+        self.dsn = dsn
+        self.channel = channel
+        self.ttl = ttl
+        self._snapshot: Optional[CategorySnapshot] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.notifications = 0
+        self.listening = False
+
+    def _set(self, rows):
+        self._snapshot = CategorySnapshot(rows)
+        self.reloads += 1
+
+    async def reload(self):
+        self._set(await run_query(CATEGORIES_SQL))
+
+    async def snapshot(self) -> CategorySnapshot:
+        """ Catálogo vigente; se recarga si no se ha cargado o ha caducado """
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > self.ttl:
+            await self.reload()
+            snapshot = self._snapshot
+        return snapshot
+
+    async def get(self, id_categoria: int) -> Optional[Dict[str, Any]]:
+        snapshot = await self.snapshot()
+        category = snapshot.by_id.get(id_categoria)
+        if category is None and not self.listening:
+            # sin avisos la categoría puede ser más reciente que el catálogo
+            await self.reload()
+            category = self._snapshot.by_id.get(id_categoria)
+        return category
+
+    def _listen(self):
+        """ Hilo de escucha: recarga con cada aviso y se reconecta si la conexión cae """
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                    # se recarga tras el LISTEN para no perder cambios ocurridos mientras tanto
+                    cursor.execute(CATEGORIES_SQL)
+                    self._set(cursor.fetchall())
+                self.listening = True
+                logger.info(f"Catálogo de categorías escuchando en '{self.channel}'")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    self.notifications += len(conn.notifies)
+                    conn.notifies.clear()
+                    with conn.cursor() as cursor:
+                        cursor.execute(CATEGORIES_SQL)
+                        self._set(cursor.fetchall())
+                    logger.info(f"Catálogo de categorías recargado ({len(self._snapshot.categories)} categorías)")
+            except Exception as e:
+                logger.warning(f"Escucha de categorías interrumpida: {e}")
+                self._stop.wait(5)
+            finally:
+                self.listening = False
+                if conn is not None:
+                    conn.close()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen, name="category-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "categories": len(snapshot.categories) if snapshot else 0,
+            "age_s": time.monotonic() - snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "notifications": self.notifications,
+            "listening": self.listening
+        }
+
+
+category_catalog = CategoryCatalog(DATABASE_URL, CATEGORY_NOTIFY_CHANNEL, CATEGORY_CATALOG_TTL)
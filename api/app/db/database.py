@@ -1,17 +1,140 @@
-import psycopg2
+import asyncio
+import logging
+import threading
+import time
 from contextlib import contextmanager
-from app.config import DATABASE_URL
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2.pool import ThreadedConnectionPool
+
+from app.config import DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_QUERY_TIMEOUT_MS, DB_ACQUIRE_TIMEOUT
+
+logger = logging.getLogger("database")
+
+
+class DatabaseTimeout(Exception):
+    """ No hay conexión libre a tiempo o la consulta ha superado DB_QUERY_TIMEOUT_MS """
+
+
+class DatabasePool:
+    """
+    Pool de conexiones compartido por los handlers.
+
+    Las consultas se ejecutan en hilos (asyncio.to_thread) para no bloquear el
+    event loop; un semáforo limita las consultas simultáneas al tamaño del
+    pool, de modo que ningún hilo se queda esperando una conexión.
+    """
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._semaphore = None
+        self.in_use = 0
+        self.waiting = 0
+        self.queries = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        """ Conexión del pool; se descarta si ha quedado rota """
+        pool = self._get_pool()
+        conn = pool.getconn()
+        self.in_use += 1
+        broken = False
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            self.in_use -= 1
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            pool.putconn(conn, close=broken or conn.closed != 0)
+
+    def execute(self, query, params=None, fetchone=False, commit=False, timeout_ms=None):
+        """ Ejecuta una consulta de forma síncrona con su propio statement_timeout """
+        timeout_ms = DB_QUERY_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        start = time.perf_counter()
+        self.queries += 1
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    if timeout_ms:
+                        cursor.execute("SET LOCAL statement_timeout = %s", [int(timeout_ms)])
+                    cursor.execute(query, params or ())
+                    result = cursor.fetchone() if fetchone else cursor.fetchall()
+                if commit:
+                    conn.commit()
+                return result
+        except errors.QueryCanceled as e:
+            self.timeouts += 1
+            raise DatabaseTimeout(f"La consulta ha superado {timeout_ms} ms") from e
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.total_ms += (time.perf_counter() - start) * 1000
+
+    async def run(self, query, params=None, fetchone=False, commit=False, timeout_ms=None):
+        """ Versión asíncrona: espera turno en el semáforo y ejecuta en un hilo """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.maxconn)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=DB_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise DatabaseTimeout(f"No hay conexiones libres tras {DB_ACQUIRE_TIMEOUT} s")
+        finally:
+            self.waiting -= 1
+        try:
+            return await asyncio.to_thread(self.execute, query, params, fetchone, commit, timeout_ms)
+        finally:
+            self._semaphore.release()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def stats(self):
+        return {
+            "min": self.minconn,
+            "max": self.maxconn,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "queries": self.queries,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_ms": self.total_ms / self.queries if self.queries else 0.0
+        }
+
+
+db_pool = DatabasePool(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX)
+
 
 @contextmanager
 def get_db_connection():
-    """Proporciona un contexto para la conexión a la base de datos."""
-    conn = None
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
+    """Proporciona un contexto para la conexión a la base de datos (tomada del pool)."""
+    with db_pool.connection() as conn:
         yield conn
-    finally:
-        if conn is not None:
-            conn.close()
 
 @contextmanager
 def get_db_cursor(commit=False):
@@ -26,9 +149,9 @@ def get_db_cursor(commit=False):
             cursor.close()
 
 def execute_query(query, params=None, fetchone=False, commit=False):
-    """Ejecuta una consulta en la base de datos."""
-    with get_db_cursor(commit=commit) as cursor:
-        cursor.execute(query, params or ())
-        if fetchone:
-            return cursor.fetchone()
-        return cursor.fetchall()
\ No newline at end of file
+    """Ejecuta una consulta en la base de datos (bloqueante: fuera de los handlers async)."""
+    return db_pool.execute(query, params, fetchone=fetchone, commit=commit)
+
+async def run_query(query, params=None, fetchone=False, commit=False, timeout_ms=None):
+    """Ejecuta una consulta sin bloquear el event loop."""
+    return await db_pool.run(query, params, fetchone=fetchone, commit=commit, timeout_ms=timeout_ms)
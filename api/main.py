@@ -1,12 +1,36 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.endpoints import search, documents, categories
+from app.api.endpoints import search, documents, categories, stats
+from app.clients.search_engine import search_engine
+from app.db.database import db_pool
+from app.db.category_catalog import category_catalog
+
+logger = logging.getLogger("api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # un único cliente con keep-alive hacia el motor de búsqueda
+    await search_engine.start()
+    # catálogo de categorías en memoria, recargado con LISTEN/NOTIFY
+    try:
+        await category_catalog.reload()
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el catálogo de categorías: {e}")
+    category_catalog.start()
+    yield
+    category_catalog.stop()
+    await search_engine.close()
+    db_pool.close()
 
 app = FastAPI(
     title="ClinicCloud API",
     description="API para el motor de búsqueda de información médica con procesamiento de lenguaje natural",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -15,16 +39,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 app.include_router(search.router, prefix="/api/search", tags=["search"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(categories.router, prefix="/api/categories", tags=["categories"])
+app.include_router(stats.router, prefix="/api/stats", tags=["stats"])
 
 @app.get("/")
 def read_root():
     return {"message": "Bienvenido a la API de ClinicCloud"}
 
+@app.get("/metrics")
+def read_metrics():
+    """
+    Métricas internas de la API.
+    """
+    return {
+        "search_engine_client": search_engine.stats(),
+        "db_pool": db_pool.stats(),
+        "category_catalog": category_catalog.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
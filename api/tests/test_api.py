@@ -7,6 +7,7 @@ BASE_URL = "http://localhost:8000/api"
 DOCUMENT_URL = f"{BASE_URL}/documents"
 SEARCH_URL = f"{BASE_URL}/search"
 CATEGORY_URL = f"{BASE_URL}/categories"
+STATS_URL = f"{BASE_URL}/stats"
 
 # Para mantener un registro de los tests
 test_results = {
@@ -150,6 +151,50 @@ def test_search_documentos(query, id_categoria=None, limit=10, offset=0):
     
     return response.json() if response.status_code == 200 else None
 
+def test_batch_documentos(ids):
+    """Prueba obtener varios documentos en una sola petición"""
+    print(f"\n📚 Testing POST /api/documents/batch ({len(ids)} ids)")
+    # un id inexistente al principio para comprobar el orden y los faltantes
+    solicitados = [999999] + list(reversed(ids))
+    response = requests.post(f"{DOCUMENT_URL}/batch", json={"ids": solicitados})
+    print_response(response, "Lote de documentos")
+    
+    # Verificaciones
+    assert_test(response.status_code == 200, "Obtener lote de documentos exitoso")
+    
+    if response.status_code == 200:
+        data = response.json()
+        assert_test(
+            [d["id"] for d in data["documentos"]] == list(reversed(ids)),
+            "Los documentos respetan el orden solicitado"
+        )
+        assert_test(data["faltantes"] == [999999], "Informa de los documentos inexistentes")
+    
+    return response.json() if response.status_code == 200 else None
+
+def test_similar_documentos(id_documento, limit=5):
+    """Prueba obtener documentos similares a uno dado"""
+    print(f"\n🔗 Testing GET /api/documents/{id_documento}/similar")
+    response = requests.get(f"{DOCUMENT_URL}/{id_documento}/similar", params={"limit": limit})
+    print_response(response, f"Similares a {id_documento}")
+    
+    # Verificaciones
+    assert_test(
+        response.status_code == 200, 
+        f"Obtener similares a {id_documento} exitoso"
+    )
+    
+    if response.status_code == 200:
+        data = response.json()
+        assert_test(data.get("id_documento") == id_documento, "Contiene el documento de referencia")
+        assert_test(len(data["results"]) <= limit, f"Respeta el límite de {limit} documentos")
+        assert_test(
+            all(r["id_documento"] != id_documento for r in data["results"]),
+            "El documento de referencia no aparece en los resultados"
+        )
+    
+    return response.json() if response.status_code == 200 else None
+
 def test_list_categorias():
     """Prueba listar todas las categorías"""
     print("\n📂 Testing GET /api/categories")
@@ -194,6 +239,28 @@ def test_get_categoria(id_categoria):
     
     return response.json() if response.status_code == 200 else None
 
+def test_stats():
+    """Prueba obtener las estadísticas del corpus"""
+    print("\n📈 Testing GET /api/stats")
+    response = requests.get(STATS_URL)
+    print_response(response, "Estadísticas del corpus")
+    
+    # Verificaciones
+    assert_test(response.status_code == 200, "Obtener estadísticas exitoso")
+    
+    if response.status_code == 200:
+        data = response.json()
+        assert_test(
+            data["con_resumen"] + data["sin_resumen"] == data["documentos"],
+            "Con y sin resumen suman el total"
+        )
+        assert_test(
+            sum(c["documentos"] for c in data["por_categoria"]) == data["documentos"],
+            "El desglose por categoría suma el total"
+        )
+    
+    return response.json() if response.status_code == 200 else None
+
 def test_error_handling():
     """Prueba manejo de errores en los endpoints"""
     print("\n🧪 Testing error handling")
@@ -229,6 +296,8 @@ def run_all_tests():
     documentos = test_list_documentos(limit=5)
     if documentos and len(documentos) > 0:
         test_get_documento(documentos[0]["id"])
+        test_similar_documentos(documentos[0]["id"])
+        test_batch_documentos([d["id"] for d in documentos])
     
     # Pruebas con categoría si existe
     if id_categoria_test:
@@ -239,6 +308,9 @@ def run_all_tests():
     # Pruebas de búsqueda
     test_search_documentos("documento de prueba")
     
+    # Estadísticas del corpus
+    test_stats()
+    
     # Pruebas de manejo de errores
     test_error_handling()
     
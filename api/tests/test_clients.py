@@ -0,0 +1,138 @@
+"""
+Pruebas unitarias del circuit breaker, del balanceo entre réplicas y de los
+parámetros de los listados (no necesitan la API en marcha, a diferencia de
+test_api.py).
+
+Ejecución desde api/:
+    python -m pytest tests/test_clients.py
+"""
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints.documents import decode_cursor, encode_cursor, parse_fields
+from app.clients import balancer, circuit_breaker
+from app.clients.balancer import ReplicaBalancer
+from app.clients.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Reloj:
+    """ time.monotonic controlado por la prueba """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    clock = Reloj()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    monkeypatch.setattr(balancer.time, "monotonic", clock)
+    return clock
+
+
+def test_circuito_se_abre_y_se_recupera(reloj):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    # pasado el reset_timeout solo entra una petición de prueba
+    reloj.now += 5
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.stats()["opens"] == 1 and breaker.stats()["rejected"] == 2
+
+
+def test_prueba_fallida_reabre(reloj):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5)
+    for _ in range(3):
+        breaker.record_failure()
+    reloj.now += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+
+def test_prueba_sin_terminar_no_bloquea_para_siempre(reloj):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    reloj.now += 5
+    # la petición de prueba se cancela sin registrar éxito ni fallo
+    assert breaker.allow()
+    reloj.now += 5
+    assert breaker.allow()
+
+
+def test_elige_la_replica_menos_cargada(reloj):
+    lb = ReplicaBalancer(["http://a", "http://b", "http://c"], strategy="least")
+    a, b, c = lb.replicas
+    lb.started(a)
+    lb.started(b)
+    assert lb.pick() is c
+    # a igualdad de peticiones en curso, la de menor latencia media
+    lb.started(c)
+    lb.finished(a, True, 50.0)
+    lb.finished(b, True, 10.0)
+    assert lb.pick() is b
+    assert lb.pick(exclude=b) is a
+
+
+def test_expulsion_y_limite_de_expulsadas(reloj):
+    lb = ReplicaBalancer(["http://a", "http://b"], eject_failures=2, eject_time=10, max_ejected=0.5)
+    a, b = lb.replicas
+    for _ in range(2):
+        lb.started(a)
+        lb.finished(a, False, 1.0)
+    assert lb.available() == [b]
+
+    # como mucho la mitad fuera: b no se expulsa mientras a siga fuera
+    for _ in range(2):
+        lb.started(b)
+        lb.finished(b, False, 1.0)
+    assert lb.available() == [b]
+
+    # la segunda expulsión seguida dura el doble
+    reloj.now += 10
+    assert lb.available() == [a, b]
+    lb.eject(a, "prueba")
+    reloj.now += 10
+    assert lb.available() == [b]
+    reloj.now += 10
+    assert lb.available() == [a, b]
+
+
+def test_cancelada_no_cuenta_como_fallo(reloj):
+    lb = ReplicaBalancer(["http://a"], eject_failures=1)
+    replica = lb.replicas[0]
+    lb.started(replica)
+    lb.finished(replica, None, 1.0)
+    assert replica.outstanding == 0 and replica.errors == 0 and replica.ewma_ms is None
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields(" titulo, autor,titulo ") == ("autor", "titulo")
+    with pytest.raises(HTTPException) as excinfo:
+        parse_fields("titulo,color")
+    assert excinfo.value.status_code == 422
+
+
+@pytest.mark.parametrize("fecha", [date(2023, 5, 17), None])
+def test_cursor_ida_y_vuelta(fecha):
+    cursor = encode_cursor((42, "titulo", None, fecha))
+    # los documentos sin fecha van primero: el cursor guarda el centinela 'infinity'
+    assert decode_cursor(cursor) == (fecha or "infinity", 42)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "c2luLXNlcGFyYWRvcg", "MjAyMy0xMy0wMXw0Mg"])
+def test_cursor_no_valido(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
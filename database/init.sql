@@ -1,4 +1,5 @@
 CREATE EXTENSION IF NOT EXISTS vector;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Tabla de categorías
 CREATE TABLE categoria (
@@ -6,17 +7,57 @@ CREATE TABLE categoria (
     nombre VARCHAR(255) UNIQUE NOT NULL
 );
 
+-- aviso a la API (catálogo de categorías en memoria) en cada cambio
+CREATE FUNCTION notificar_cambio_categoria() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('categoria_cambios', COALESCE(NEW.id, OLD.id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER categoria_cambios
+AFTER INSERT OR UPDATE OR DELETE ON categoria
+FOR EACH ROW EXECUTE FUNCTION notificar_cambio_categoria();
+
 -- Tabla de documentos
 CREATE TABLE documento (
     id SERIAL PRIMARY KEY,
     titulo VARCHAR(500) NOT NULL,
-    autor VARCHAR(255),
+    autor TEXT,
     fecha_publicacion DATE,
     contenido_vectorizado VECTOR(768), 
     url_fuente TEXT NOT NULL,
     id_categoria INTEGER REFERENCES categoria(id)
 );
 
+-- índice para filtros por rango de fechas y listados ordenados por fecha
+CREATE INDEX idx_documento_fecha ON documento (fecha_publicacion);
+
+-- paginación por cursor de los listados: (fecha, id), sin fecha primero
+CREATE INDEX idx_documento_orden ON documento ((COALESCE(fecha_publicacion, 'infinity'::date)), id);
+CREATE INDEX idx_documento_categoria_orden ON documento (id_categoria, (COALESCE(fecha_publicacion, 'infinity'::date)), id);
+
+-- búsqueda degradada de la API por palabras del título (ILIKE '%palabra%')
+CREATE INDEX idx_documento_titulo_trgm ON documento USING gin (titulo gin_trgm_ops);
+
+-- Autores normalizados
+CREATE TABLE autor (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(255) UNIQUE NOT NULL
+);
+
+-- Relación documento-autor conservando el orden de firma
+CREATE TABLE documento_autor (
+    id_documento INTEGER REFERENCES documento(id) ON DELETE CASCADE,
+    id_autor INTEGER REFERENCES autor(id) ON DELETE CASCADE,
+    orden SMALLINT NOT NULL,
+    PRIMARY KEY (id_documento, id_autor)
+);
+
+-- índices para filtrar por autor sin recorrer documento
+CREATE INDEX idx_autor_nombre_lower ON autor (LOWER(nombre));
+CREATE INDEX idx_documento_autor_autor ON documento_autor (id_autor, id_documento);
+
 -- Tabla de resúmenes
 CREATE TABLE resumen (
     id SERIAL PRIMARY KEY,
@@ -26,4 +67,19 @@ CREATE TABLE resumen (
 
 -- índice para búsquedas vectoriales
 CREATE INDEX ON documento USING ivfflat (contenido_vectorizado vector_cosine_ops) 
-WITH (lists = 100);
\ No newline at end of file
+WITH (lists = 100);
+
+-- Estadísticas del corpus para GET /api/stats; el scraper la refresca
+-- (CONCURRENTLY, con el índice único) tras cada lote de inserciones
+CREATE MATERIALIZED VIEW estadisticas_corpus AS
+SELECT
+    COALESCE(d.id_categoria, 0) AS id_categoria,
+    COALESCE(EXTRACT(YEAR FROM d.fecha_publicacion)::integer, 0) AS anio,
+    EXISTS (SELECT 1 FROM resumen r WHERE r.id_documento = d.id) AS con_resumen,
+    COUNT(*) AS documentos,
+    COUNT(d.contenido_vectorizado) AS vectorizados,
+    now() AS actualizado
+FROM documento d
+GROUP BY 1, 2, 3;
+
+CREATE UNIQUE INDEX idx_estadisticas_corpus ON estadisticas_corpus (id_categoria, anio, con_resumen);
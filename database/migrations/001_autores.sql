@@ -0,0 +1,42 @@
+-- Migración: autores normalizados para bases de datos ya existentes.
+-- init.sql solo se ejecuta al crear el volumen, por lo que las instalaciones
+-- anteriores deben aplicar este script a mano:
+--   docker-compose exec -T db psql -U admin -d cliniccloud < database/migrations/001_autores.sql
+
+BEGIN;
+
+-- la lista de autores concatenada ya no se trunca a 255 caracteres
+ALTER TABLE documento ALTER COLUMN autor TYPE TEXT;
+
+CREATE TABLE IF NOT EXISTS autor (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(255) UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS documento_autor (
+    id_documento INTEGER REFERENCES documento(id) ON DELETE CASCADE,
+    id_autor INTEGER REFERENCES autor(id) ON DELETE CASCADE,
+    orden SMALLINT NOT NULL,
+    PRIMARY KEY (id_documento, id_autor)
+);
+
+CREATE INDEX IF NOT EXISTS idx_autor_nombre_lower ON autor (LOWER(nombre));
+CREATE INDEX IF NOT EXISTS idx_documento_autor_autor ON documento_autor (id_autor, id_documento);
+
+-- Relleno a partir de la columna documento.autor ("Apellido Nombre, Apellido Nombre, ...")
+INSERT INTO autor (nombre)
+SELECT DISTINCT LEFT(TRIM(t.nombre), 255)
+FROM documento d
+CROSS JOIN LATERAL unnest(string_to_array(d.autor, ',')) AS t(nombre)
+WHERE TRIM(t.nombre) <> ''
+ON CONFLICT (nombre) DO NOTHING;
+
+INSERT INTO documento_autor (id_documento, id_autor, orden)
+SELECT d.id, a.id, MIN(t.orden)
+FROM documento d
+CROSS JOIN LATERAL unnest(string_to_array(d.autor, ',')) WITH ORDINALITY AS t(nombre, orden)
+JOIN autor a ON a.nombre = LEFT(TRIM(t.nombre), 255)
+GROUP BY d.id, a.id
+ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,5 @@
+-- Migración: índice sobre documento.fecha_publicacion para los filtros
+-- fecha_desde/fecha_hasta y los listados ordenados por fecha.
+-- CONCURRENTLY no bloquea las inserciones del scraper (no admite BEGIN/COMMIT).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_fecha ON documento (fecha_publicacion);
@@ -0,0 +1,14 @@
+-- Migración: aviso (NOTIFY) en cada cambio de la tabla categoria para que la
+-- API recargue su catálogo en memoria sin consultar la tabla en cada petición.
+
+CREATE OR REPLACE FUNCTION notificar_cambio_categoria() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('categoria_cambios', COALESCE(NEW.id, OLD.id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categoria_cambios ON categoria;
+CREATE TRIGGER categoria_cambios
+AFTER INSERT OR UPDATE OR DELETE ON categoria
+FOR EACH ROW EXECUTE FUNCTION notificar_cambio_categoria();
@@ -0,0 +1,11 @@
+-- Migración: índices para la paginación por cursor (keyset) de los listados
+-- de documentos, ordenados por fecha descendente (sin fecha al final) e id.
+-- La migración 007 los reconstruye con los documentos sin fecha primero.
+-- CONCURRENTLY no bloquea las inserciones del scraper (no admite BEGIN/COMMIT).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_orden
+    ON documento ((COALESCE(fecha_publicacion, '-infinity'::date)), id);
+
+-- listados filtrados por categoría
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_categoria_orden
+    ON documento (id_categoria, (COALESCE(fecha_publicacion, '-infinity'::date)), id);
@@ -0,0 +1,19 @@
+-- Migración: vista materializada con el número de documentos por categoría,
+-- año de publicación y presencia de resumen, para GET /api/stats.
+-- El scraper la refresca con REFRESH MATERIALIZED VIEW CONCURRENTLY tras cada
+-- lote de inserciones; CONCURRENTLY necesita el índice único de abajo.
+-- Categoría y año sin valor se guardan como 0 para que el índice único los cubra.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS estadisticas_corpus AS
+SELECT
+    COALESCE(d.id_categoria, 0) AS id_categoria,
+    COALESCE(EXTRACT(YEAR FROM d.fecha_publicacion)::integer, 0) AS anio,
+    EXISTS (SELECT 1 FROM resumen r WHERE r.id_documento = d.id) AS con_resumen,
+    COUNT(*) AS documentos,
+    COUNT(d.contenido_vectorizado) AS vectorizados,
+    now() AS actualizado
+FROM documento d
+GROUP BY 1, 2, 3;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_estadisticas_corpus
+    ON estadisticas_corpus (id_categoria, anio, con_resumen);
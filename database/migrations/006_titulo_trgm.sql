@@ -0,0 +1,9 @@
+-- Migración: índice de trigramas sobre documento.titulo para la búsqueda
+-- degradada de la API (titulo ILIKE '%palabra%' cuando el motor no responde).
+-- Un B-tree no sirve para patrones con comodín inicial; el GIN de pg_trgm sí.
+-- CONCURRENTLY no bloquea las inserciones del scraper (no admite BEGIN/COMMIT).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_titulo_trgm
+    ON documento USING gin (titulo gin_trgm_ops);
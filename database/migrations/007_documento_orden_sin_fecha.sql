@@ -0,0 +1,17 @@
+-- Migración: los listados de documentos vuelven a mostrar primero los
+-- documentos sin fecha (como el ORDER BY fecha_publicacion DESC original);
+-- reconstruye los índices de la migración 004 con el centinela 'infinity'.
+-- La expresión debe coincidir con ORDER_KEY_SQL de api/app/api/endpoints/documents.py.
+-- CONCURRENTLY no bloquea las inserciones del scraper (no admite BEGIN/COMMIT);
+-- el índice nuevo se crea antes de retirar el antiguo.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_orden_007
+    ON documento ((COALESCE(fecha_publicacion, 'infinity'::date)), id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_documento_orden;
+ALTER INDEX idx_documento_orden_007 RENAME TO idx_documento_orden;
+
+-- listados filtrados por categoría
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documento_categoria_orden_007
+    ON documento (id_categoria, (COALESCE(fecha_publicacion, 'infinity'::date)), id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_documento_categoria_orden;
+ALTER INDEX idx_documento_categoria_orden_007 RENAME TO idx_documento_categoria_orden;
@@ -1,4 +1,5 @@
 
+import logging
 import os
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -24,12 +25,81 @@ class Settings(BaseSettings):
     EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "768"))
     SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
     MAX_SEARCH_RESULTS: int = int(os.getenv("MAX_SEARCH_RESULTS", "20"))
+
+    # Sondeo adaptativo del índice ivfflat: se empieza con pocas listas y se
+    # multiplica por SEARCH_PROBES_FACTOR hasta SEARCH_PROBES_MAX (= lists del índice)
+    SEARCH_PROBES_INITIAL: int = int(os.getenv("SEARCH_PROBES_INITIAL", "1"))
+    SEARCH_PROBES_MAX: int = int(os.getenv("SEARCH_PROBES_MAX", "100"))
+    SEARCH_PROBES_FACTOR: int = int(os.getenv("SEARCH_PROBES_FACTOR", "4"))
+    # Rangos de fechas con menos documentos que este umbral se buscan de forma exacta
+    DATE_PREFILTER_MAX_ROWS: int = int(os.getenv("DATE_PREFILTER_MAX_ROWS", "20000"))
+    # Número de candidatos sobre los que se cuentan las facetas por categoría
+    FACET_WINDOW: int = int(os.getenv("FACET_WINDOW", "200"))
+
+    # Parámetros BM25 del índice de palabras clave en memoria
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+
+    # La generación del corpus (id máximo de documento) se vuelve a leer cada TTL segundos
+    CORPUS_GENERATION_TTL: float = float(os.getenv("CORPUS_GENERATION_TTL", "10"))
+    SIMILAR_CACHE_SIZE: int = int(os.getenv("SIMILAR_CACHE_SIZE", "2000"))
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "5000"))
+
+    # Registro de consultas y precalentamiento de cachés
+    QUERY_LOG_DIR: str = os.getenv("QUERY_LOG_DIR", "/app/query_log")
+    QUERY_LOG_FLUSH_INTERVAL: float = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", "5"))
+    QUERY_LOG_WINDOW_HOURS: float = float(os.getenv("QUERY_LOG_WINDOW_HOURS", "168"))
+    QUERY_LOG_TOP_K: int = int(os.getenv("QUERY_LOG_TOP_K", "20"))
+    PREWARM_CHECK_INTERVAL: float = float(os.getenv("PREWARM_CHECK_INTERVAL", "60"))
+
+    # Re-ranking con cross-encoder: "none", "cross-encoder" o "stub" (pruebas).
+    # Es el único interruptor: con un backend, las búsquedas se re-ordenan salvo rerank=false
+    RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "none")
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "50"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "150"))
+
+    # Backend de búsqueda vectorial: "pgvector" (índice ivfflat) o "memoria"
+    # (matriz compartida entre workers publicada por app.search.shared_matrix)
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "pgvector")
+    # volumen persistente (ver docker-compose.yml): la última generación sobrevive a los reinicios
+    SHARED_MATRIX_DIR: str = os.getenv("SHARED_MATRIX_DIR", "/var/lib/cliniccloud/shared_matrix")
+    SHARED_MATRIX_CHECK_INTERVAL: float = float(os.getenv("SHARED_MATRIX_CHECK_INTERVAL", "5"))
+    SHARED_MATRIX_POLL_INTERVAL: float = float(os.getenv("SHARED_MATRIX_POLL_INTERVAL", "60"))
+    # Búsqueda en dos etapas con vectores reducidos por PCA (solo backend "memoria").
+    # PCA_DIMENSION=0 no guarda proyección; se reajusta al crecer el corpus PCA_REFIT_GROWTH
+    PCA_DIMENSION: int = int(os.getenv("PCA_DIMENSION", "64"))
+    PCA_SEARCH: bool = os.getenv("PCA_SEARCH", "false").lower() == "true"
+    PCA_SHORTLIST_FACTOR: int = int(os.getenv("PCA_SHORTLIST_FACTOR", "10"))
+    PCA_SHORTLIST_MIN: int = int(os.getenv("PCA_SHORTLIST_MIN", "200"))
+    PCA_SAMPLE_SIZE: int = int(os.getenv("PCA_SAMPLE_SIZE", "20000"))
+    PCA_REFIT_GROWTH: float = float(os.getenv("PCA_REFIT_GROWTH", "0.2"))
     
+    # Fragmentación: SHARD_COUNT > 1 limita el nodo al fragmento SHARD_INDEX (por
+    # "id" o "categoria"); SHARD_URLS (separadas por comas) lo convierte en coordinador
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", "1"))
+    SHARD_INDEX: int = int(os.getenv("SHARD_INDEX", "0"))
+    SHARD_KEY: str = os.getenv("SHARD_KEY", "id")
+    SHARD_URLS: str = os.getenv("SHARD_URLS", "")
+    SHARD_TIMEOUT: float = float(os.getenv("SHARD_TIMEOUT", "2"))
+
     MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "/app/models")
     
+    @property
+    def rerank_enabled(self) -> bool:
+        return self.RERANK_BACKEND not in ("", "none")
+
     class Config:
         env_file = ".env"
         case_sensitive = True
         
 # crear una instancia de settings
 settings = Settings()
+
+if "RERANK_ENABLED" in os.environ:
+    logging.getLogger("config").warning(
+        "RERANK_ENABLED ya no se usa: el re-ranking se activa con RERANK_BACKEND "
+        f"(actual: {settings.RERANK_BACKEND!r})"
+    )
@@ -1,5 +1,5 @@
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
 from pydantic import BaseModel, Field
 
@@ -7,19 +7,38 @@ class Categoria(BaseModel):
     id: int
     nombre: str
 
+# campos que se pueden pedir con `fields` (id y score se devuelven siempre)
+ResultField = Literal["titulo", "autor", "fecha_publicacion", "url_fuente", "categoria", "texto_resumen"]
+
 class SearchResult(BaseModel):
     id: int
-    titulo: str
+    titulo: Optional[str] = None
     autor: List[str] = []
     fecha_publicacion: Optional[date] = None
     url_fuente: Optional[str] = None
     texto_resumen: Optional[str] = None
     score: float = Field(..., description="Puntuación de similitud con la consulta")
+    score_rerank: Optional[float] = Field(None, description="Puntuación del cross-encoder, si se ha aplicado")
+    origen: Literal["vectorial", "texto", "reciente"] = Field(
+        "vectorial",
+        description="Búsqueda de la que sale el score: similitud coseno, BM25 normalizado o documentos recientes"
+    )
     categoria: Optional[Categoria] = None
 
+class FacetaCategoria(BaseModel):
+    id: int
+    nombre: str
+    total: int = Field(..., description="Resultados de la categoría entre los mejores candidatos")
+
 class SearchQuery(BaseModel):
     query: str = Field(..., description="Consulta en lenguaje natural")
     id_categoria: Optional[int] = Field(None, description="ID de la categoría para filtrar resultados")
+    autor: Optional[str] = Field(None, description="Nombre del autor para filtrar resultados")
+    fecha_desde: Optional[date] = Field(None, description="Fecha de publicación mínima (incluida)")
+    fecha_hasta: Optional[date] = Field(None, description="Fecha de publicación máxima (incluida)")
+    facetas: bool = Field(False, description="Incluir el número de resultados por categoría")
+    rerank: Optional[bool] = Field(None, description="Reordenar con el cross-encoder (por defecto, sí si RERANK_BACKEND no es none)")
+    fields: Optional[List[ResultField]] = Field(None, description="Campos de cada resultado (por defecto, todos)")
     limit: int = Field(20, description="Número máximo de resultados")
     offset: int = Field(0, description="Posición inicial para paginación")
 
@@ -27,3 +46,11 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
     query: str
+    facetas: Optional[List[FacetaCategoria]] = None
+    parcial: bool = Field(False, description="Algún fragmento no ha respondido y faltan sus resultados")
+    fragmentos_fallidos: Optional[List[str]] = None
+
+class SimilarResponse(BaseModel):
+    results: List[SearchResult]
+    total: int
+    id_documento: int = Field(..., description="Documento de referencia")
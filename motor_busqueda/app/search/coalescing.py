@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger("coalescing")
+
+
+class SingleFlight:
+    """
+    Agrupa peticiones idénticas concurrentes en una sola ejecución.
+
+    La primera petición con una clave ejecuta la búsqueda; las que llegan
+    mientras sigue en curso esperan al mismo resultado (o a la misma excepción).
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # la ejecución va en su propia tarea: si el cliente que la inició
+            # se desconecta, los demás siguen recibiendo el resultado
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "coalescing_ratio": self.coalesced / self.requests if self.requests else 0.0
+        }
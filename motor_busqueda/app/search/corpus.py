@@ -0,0 +1,48 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.config import settings
+from app.db.database import get_connection
+
+logger = logging.getLogger("corpus")
+
+# id máximo de documento: las ingestas solo añaden filas con id SERIAL creciente,
+# así que sirve como número de generación del corpus
+_generation: Optional[int] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_corpus_generation(cursor=None) -> int:
+    """
+    Devuelve la generación actual del corpus (id máximo de documento).
+
+    La consulta usa el índice de la clave primaria y, además, solo se repite
+    cada CORPUS_GENERATION_TTL segundos; entre medias se devuelve el valor en caché.
+    Si no se pasa un cursor y hay que consultar, se abre una conexión propia.
+    """
+    global _generation, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _generation is not None and now - _checked_at < settings.CORPUS_GENERATION_TTL:
+            return _generation
+
+    if cursor is None:
+        connection = get_connection()
+        try:
+            return get_corpus_generation(connection.cursor())
+        finally:
+            connection.close()
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM documento")
+    generation = int(cursor.fetchone()[0])
+
+    with _lock:
+        if generation != _generation:
+            if _generation is not None:
+                logger.info(f"Nueva generación del corpus: {_generation} -> {generation}")
+            _generation = generation
+        _checked_at = now
+    return generation
@@ -0,0 +1,128 @@
+"""
+Embedding léxico por feature hashing.
+
+Sustituye al antiguo embedding pseudoaleatorio (que resembraba el estado
+global de np.random en cada llamada) como codificador offline / de reserva.
+Cada texto se descompone en palabras y n-gramas de caracteres; cada rasgo se
+convierte en un hash de 64 bits calculado con aritmética de NumPy (sin
+bucles de Python por carácter) y se proyecta a una dimensión y un signo.
+
+El hash no depende de PYTHONHASHSEED ni de ningún estado global: un mismo
+texto produce exactamente el mismo vector en cualquier proceso o hilo.
+"""
+import re
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# constantes de FNV-1a y del finalizador de MurmurHash3 (fmix64)
+_PRIME = np.uint64(1099511628211)
+_FMIX_1 = np.uint64(0xFF51AFD7ED558CCD)
+_FMIX_2 = np.uint64(0xC4CEB9FE1A85EC53)
+_SHIFT = np.uint64(33)
+_SIGN_SHIFT = np.uint64(63)
+
+# sal distinta por tipo de rasgo para que "abc" palabra y "abc" trigrama no colisionen
+_WORD_SALT = np.uint64(0x9E3779B97F4A7C15)
+_NGRAM_SALT = np.uint64(0xC2B2AE3D27D4EB4F)
+
+WORD_WEIGHT = 1.0
+NGRAM_WEIGHT = 0.5
+NGRAM_SIZE = 3
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _fmix64(h: np.ndarray) -> np.ndarray:
+    """ Mezcla de bits de MurmurHash3; la aritmética uint64 de NumPy es modular """
+    h = h ^ (h >> _SHIFT)
+    h = h * _FMIX_1
+    h = h ^ (h >> _SHIFT)
+    h = h * _FMIX_2
+    return h ^ (h >> _SHIFT)
+
+
+def _powers(n: int) -> np.ndarray:
+    """ _PRIME ** i (mód 2**64) para i en [0, n) """
+    powers = np.full(max(n, 1), _PRIME, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)[:n]
+
+
+def _codes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def _word_hashes(text: str, codes: np.ndarray) -> np.ndarray:
+    """ Hash polinómico de cada palabra, calculado para todas a la vez con reduceat """
+    spans = np.array([m.span() for m in _TOKEN_RE.finditer(text)], dtype=np.int64).reshape(-1, 2)
+    if spans.shape[0] == 0:
+        return np.empty(0, dtype=np.uint64)
+    starts, lengths = spans[:, 0], spans[:, 1] - spans[:, 0]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    position = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+    chars = codes[np.repeat(starts, lengths) + position]
+    hashes = np.add.reduceat(chars * _powers(int(lengths.max()))[position], offsets)
+    return hashes ^ _WORD_SALT
+
+
+def _ngram_hashes(codes: np.ndarray, n: int) -> np.ndarray:
+    """ Hash polinómico de todos los n-gramas de caracteres mediante ventanas desplazadas """
+    count = codes.shape[0] - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    powers = _powers(n)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for j in range(n):
+        hashes = hashes + codes[j:j + count] * powers[n - 1 - j]
+    return hashes ^ _NGRAM_SALT
+
+
+def _features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """ Hashes finales y pesos de todos los rasgos de un texto """
+    text = normalize_text(text)
+    if not text:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float32)
+    words = _word_hashes(text, _codes(text))
+    # espacios en los extremos para marcar inicio y fin de palabra en los n-gramas
+    ngrams = _ngram_hashes(_codes(f" {text} "), NGRAM_SIZE)
+    hashes = _fmix64(np.concatenate((words, ngrams)))
+    weights = np.concatenate((
+        np.full(words.shape[0], WORD_WEIGHT, dtype=np.float32),
+        np.full(ngrams.shape[0], NGRAM_WEIGHT, dtype=np.float32)
+    ))
+    return hashes, weights
+
+
+def lexical_embeddings(texts: Sequence[str], dim: int = 768) -> np.ndarray:
+    """
+    Codifica un lote de textos en una matriz float32 (len(texts), dim) con filas
+    de norma 1 (o cero si el texto no contiene ningún rasgo).
+    """
+    rows, cols, values = [], [], []
+    for i, text in enumerate(texts):
+        hashes, weights = _features(text)
+        # el bit más alto decide el signo; el resto, la dimensión
+        signs = 1.0 - 2.0 * (hashes >> _SIGN_SHIFT).astype(np.float32)
+        rows.append(np.full(hashes.shape[0], i, dtype=np.int64))
+        cols.append((hashes % np.uint64(dim)).astype(np.int64))
+        values.append(weights * signs)
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    if rows:
+        flat = np.concatenate(rows) * dim + np.concatenate(cols)
+        matrix = np.bincount(
+            flat, weights=np.concatenate(values), minlength=len(texts) * dim
+        ).astype(np.float32).reshape(len(texts), dim)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def lexical_embedding(text: str, dim: int = 768) -> np.ndarray:
+    return lexical_embeddings([text], dim)[0]
@@ -0,0 +1,370 @@
+"""
+Índice invertido BM25 en memoria sobre titulo + resumen.texto_resumen.
+
+Cada término guarda su lista de documentos como un array uint32 ordenado y
+codificado en deltas (posiciones internas, que crecen con el id), las
+frecuencias en uint16 y un "salto" con la posición absoluta cada
+POSTING_BLOCK entradas. Así la búsqueda puede decodificar solo los bloques
+que contienen a los candidatos.
+
+Las puntuaciones se devuelven divididas por la suma de las cotas superiores
+de los términos de la consulta, de modo que quedan entre 0 y 1 como las
+similitudes coseno (aunque no son comparables con ellas).
+
+La búsqueda usa MaxScore término a término: los términos se recorren de
+mayor a menor cota superior y, en cuanto la suma de las cotas restantes no
+alcanza al k-ésimo mejor resultado, los términos que quedan solo se evalúan
+sobre los candidatos ya reunidos y se descartan los que no pueden entrar.
+
+Los documentos solo se añaden (el corpus crece con id SERIAL), de modo que
+la actualización incremental consiste en leer las filas con id mayor que el
+último indexado y añadirlas al final de cada lista.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.search.corpus import get_corpus_generation
+from app.search.sharding import shard_clause
+
+logger = logging.getLogger("keyword_index")
+
+POSTING_BLOCK = 128
+# a partir de este número de bloques se decodifica la lista completa
+LOOKUP_MAX_BLOCKS = 16
+NO_CATEGORY = -1
+_MAX_TF = np.iinfo(np.uint16).max
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """ Minúsculas, sin tildes y descartando términos de un solo carácter """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if len(t) > 1]
+
+
+class PostingList:
+    """ Lista de documentos de un término """
+
+    __slots__ = ("deltas", "tfs", "skips", "last_doc", "max_tf", "min_len")
+
+    def __init__(self):
+        self.deltas = np.empty(0, dtype=np.uint32)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.skips = np.empty(0, dtype=np.int64)
+        self.last_doc = -1
+        self.max_tf = 0
+        self.min_len = np.iinfo(np.int64).max
+
+    def __len__(self) -> int:
+        return int(self.deltas.shape[0])
+
+    def append(self, docs: np.ndarray, tfs: np.ndarray, lengths: np.ndarray):
+        """ Añade postings con posiciones mayores que las ya indexadas """
+        start = len(self)
+        previous = np.concatenate(([self.last_doc if start else 0], docs[:-1]))
+        deltas = docs - previous
+        if start == 0:
+            deltas[0] = docs[0]
+        block_starts = np.flatnonzero((np.arange(start, start + docs.shape[0]) % POSTING_BLOCK) == 0)
+
+        self.deltas = np.concatenate((self.deltas, deltas.astype(np.uint32)))
+        self.tfs = np.concatenate((self.tfs, np.minimum(tfs, _MAX_TF).astype(np.uint16)))
+        self.skips = np.concatenate((self.skips, docs[block_starts]))
+        self.last_doc = int(docs[-1])
+        self.max_tf = max(self.max_tf, int(tfs.max()))
+        self.min_len = min(self.min_len, int(lengths.min()))
+
+    def decode(self) -> np.ndarray:
+        return np.cumsum(self.deltas, dtype=np.int64)
+
+    def lookup(self, docs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca `docs` (ordenados) decodificando solo los bloques que pueden
+        contenerlos. Devuelve (máscara de encontrados, frecuencias de los encontrados).
+        """
+        if docs.shape[0] == 0 or len(self) == 0:
+            return np.zeros(docs.shape[0], dtype=bool), np.empty(0, dtype=np.float64)
+        blocks = np.unique(np.searchsorted(self.skips, docs, side="right") - 1)
+        blocks = blocks[blocks >= 0]
+        if blocks.shape[0] > LOOKUP_MAX_BLOCKS:
+            # con muchos bloques sale más barato decodificar la lista entera
+            decoded = self.decode()
+            idx = np.minimum(np.searchsorted(decoded, docs), decoded.shape[0] - 1)
+            found = decoded[idx] == docs
+            return found, self.tfs[idx[found]].astype(np.float64)
+        decoded, positions = [], []
+        for block in blocks.tolist():
+            lo, hi = block * POSTING_BLOCK, min((block + 1) * POSTING_BLOCK, len(self))
+            steps = np.cumsum(self.deltas[lo + 1:hi], dtype=np.int64)
+            decoded.append(np.concatenate(([self.skips[block]], self.skips[block] + steps)))
+            positions.append(np.arange(lo, hi))
+        if not decoded:
+            return np.zeros(docs.shape[0], dtype=bool), np.empty(0, dtype=np.float64)
+        decoded, positions = np.concatenate(decoded), np.concatenate(positions)
+        idx = np.minimum(np.searchsorted(decoded, docs), decoded.shape[0] - 1)
+        found = decoded[idx] == docs
+        return found, self.tfs[positions[idx[found]]].astype(np.float64)
+
+
+class KeywordIndex:
+    """ Índice BM25 de un worker; las búsquedas y las ampliaciones se serializan con un lock """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.max_id = 0
+        self._postings: Dict[str, PostingList] = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._categorias = np.empty(0, dtype=np.int64)
+        self._fechas = np.empty(0, dtype="datetime64[D]")
+        self._lengths = np.empty(0, dtype=np.int64)
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.search_ms = 0.0
+
+    def __len__(self) -> int:
+        return int(self._ids.shape[0])
+
+    def add_documents(self, rows: Sequence[Tuple[int, Optional[int], Optional[date], str]]):
+        """ Añade documentos (id, id_categoria, fecha_publicacion, texto) con ids crecientes """
+        rows = [row for row in rows if row[0] > self.max_id]
+        if not rows:
+            return
+        # el análisis del texto se hace fuera del lock para no frenar las búsquedas
+        new_postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for offset, (_, _, _, text) in enumerate(rows):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                new_postings[term].append((offset, tf))
+        lengths = np.array(lengths, dtype=np.int64)
+
+        with self._lock:
+            base = len(self)
+            self._ids = np.concatenate((self._ids, np.array([r[0] for r in rows], dtype=np.int64)))
+            self._categorias = np.concatenate((self._categorias, np.array(
+                [r[1] if r[1] is not None else NO_CATEGORY for r in rows], dtype=np.int64
+            )))
+            self._fechas = np.concatenate((self._fechas, np.array(
+                [np.datetime64(r[2], "D") if r[2] is not None else np.datetime64("NaT") for r in rows],
+                dtype="datetime64[D]"
+            )))
+            self._lengths = np.concatenate((self._lengths, lengths))
+            self._total_length += int(lengths.sum())
+
+            for term, entries in new_postings.items():
+                entries = np.array(entries, dtype=np.int64)
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = PostingList()
+                postings.append(base + entries[:, 0], entries[:, 1], lengths[entries[:, 0]])
+            self.max_id = int(rows[-1][0])
+
+    def _filter(
+        self,
+        docs: np.ndarray,
+        id_categoria: Optional[int],
+        allowed_ids: Optional[np.ndarray],
+        fecha_desde: Optional[date],
+        fecha_hasta: Optional[date]
+    ) -> np.ndarray:
+        keep = np.ones(docs.shape[0], dtype=bool)
+        if id_categoria is not None:
+            keep &= self._categorias[docs] == id_categoria
+        if allowed_ids is not None:
+            keep &= np.isin(self._ids[docs], allowed_ids)
+        # las comparaciones con NaT son siempre falsas: sin fecha queda fuera
+        if fecha_desde is not None:
+            keep &= self._fechas[docs] >= np.datetime64(fecha_desde, "D")
+        if fecha_hasta is not None:
+            keep &= self._fechas[docs] <= np.datetime64(fecha_hasta, "D")
+        return keep
+
+    def _bm25(self, idf: float, tfs: np.ndarray, lengths: np.ndarray, avgdl: float) -> np.ndarray:
+        return idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / avgdl))
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        id_categoria: Optional[int] = None,
+        allowed_ids: Optional[np.ndarray] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve los k documentos con mayor puntuación BM25.
+
+        Returns:
+            (ids, scores) ordenados de mayor a menor puntuación, con la
+            puntuación normalizada entre 0 y 1 (ver la cabecera del módulo)
+        """
+        start = time.perf_counter()
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        filtered = id_categoria is not None or allowed_ids is not None or fecha_desde is not None or fecha_hasta is not None
+
+        with self._lock:
+            n = len(self)
+            terms = [self._postings[t] for t in set(tokenize(query)) if t in self._postings]
+            if k <= 0 or n == 0 or not terms:
+                return empty
+            avgdl = max(self._total_length / n, 1.0)
+
+            # cota superior de cada término: máxima frecuencia en el documento más corto
+            scored_terms = []
+            for postings in terms:
+                df = len(postings)
+                idf = float(np.log(1 + (n - df + 0.5) / (df + 0.5)))
+                bound = float(self._bm25(idf, np.float64(postings.max_tf), np.float64(postings.min_len), avgdl))
+                scored_terms.append((bound, idf, postings))
+            scored_terms.sort(key=lambda t: -t[0])
+            remaining = np.cumsum([t[0] for t in scored_terms][::-1])[::-1].tolist() + [0.0]
+
+            docs = np.empty(0, dtype=np.int64)
+            scores = np.empty(0, dtype=np.float64)
+            threshold = -np.inf
+            for i, (bound, idf, postings) in enumerate(scored_terms):
+                if remaining[i] >= threshold:
+                    # término esencial: puede aportar documentos nuevos al top-k
+                    term_docs = postings.decode()
+                    term_scores = self._bm25(idf, postings.tfs.astype(np.float64), self._lengths[term_docs], avgdl)
+                    if filtered:
+                        keep = self._filter(term_docs, id_categoria, allowed_ids, fecha_desde, fecha_hasta)
+                        term_docs, term_scores = term_docs[keep], term_scores[keep]
+                    docs, inverse = np.unique(np.concatenate((docs, term_docs)), return_inverse=True)
+                    scores = np.bincount(inverse, weights=np.concatenate((scores, term_scores)))
+                else:
+                    # término no esencial: solo suma a los candidatos existentes
+                    found, tfs = postings.lookup(docs)
+                    scores[found] += self._bm25(idf, tfs, self._lengths[docs[found]], avgdl)
+
+                if docs.shape[0] >= k:
+                    threshold = float(np.partition(scores, -k)[-k])
+                    keep = scores + remaining[i + 1] >= threshold
+                    docs, scores = docs[keep], scores[keep]
+
+            top_k = min(k, docs.shape[0])
+            if top_k == 0:
+                return empty
+            # a igual puntuación gana la posición menor (el documento más antiguo), también
+            # en el corte del k-ésimo: `docs` está ordenado, así que los empates ya vienen por
+            # posición y la paginación con offset es determinista
+            kth = np.partition(scores, -top_k)[-top_k]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:top_k - above.shape[0]]
+            top = np.concatenate((above, ties))
+            top = top[np.lexsort((docs[top], -scores[top]))]
+            # ningún documento puede superar la suma de las cotas de todos los términos
+            result = self._ids[docs[top]], np.minimum(scores[top] / remaining[0], 1.0)
+
+            self.searches += 1
+            self.search_ms += (time.perf_counter() - start) * 1000
+            return result
+
+    def count(
+        self,
+        query: str,
+        id_categoria: Optional[int] = None,
+        allowed_ids: Optional[np.ndarray] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None
+    ) -> int:
+        """ Número de documentos que contienen algún término de la consulta """
+        with self._lock:
+            terms = [self._postings[t] for t in set(tokenize(query)) if t in self._postings]
+            if not terms:
+                return 0
+            docs = np.unique(np.concatenate([postings.decode() for postings in terms]))
+            return int(self._filter(docs, id_categoria, allowed_ids, fecha_desde, fecha_hasta).sum())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self),
+                "terms": len(self._postings),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "max_id": self.max_id,
+                "searches": self.searches,
+                "avg_search_ms": self.search_ms / self.searches if self.searches else 0.0
+            }
+
+
+_keyword_index: Optional[KeywordIndex] = None
+_refresh_lock = threading.Lock()
+
+KEYWORD_INDEX_SQL = """
+SELECT d.id, d.id_categoria, d.fecha_publicacion, CONCAT_WS(' ', d.titulo, r.texto_resumen)
+FROM documento d
+LEFT JOIN resumen r ON d.id = r.id_documento
+WHERE d.id > %s AND d.id <= %s{shard}
+ORDER BY d.id
+"""
+
+
+def get_keyword_index(cursor, batch_size: int = 2000) -> KeywordIndex:
+    """
+    Devuelve el índice del worker, añadiendo antes los documentos con id mayor
+    que el último indexado si la generación del corpus ha avanzado.
+    """
+    global _keyword_index
+    generation = get_corpus_generation(cursor)
+    with _refresh_lock:
+        if _keyword_index is None:
+            _keyword_index = KeywordIndex(settings.BM25_K1, settings.BM25_B)
+        index = _keyword_index
+        if generation > index.max_id:
+            start = time.perf_counter()
+            before = len(index)
+            # cursor con nombre: el servidor entrega las filas por lotes
+            loader = cursor.connection.cursor(name="keyword_index")
+            loader.itersize = batch_size
+            shard_sql, shard_params = shard_clause()
+            loader.execute(KEYWORD_INDEX_SQL.format(shard=shard_sql), [index.max_id, generation] + shard_params)
+            while True:
+                rows = loader.fetchmany(batch_size)
+                if not rows:
+                    break
+                index.add_documents(rows)
+            loader.close()
+            # aunque no haya filas nuevas vectorizables, no se vuelve a consultar este tramo
+            index.max_id = max(index.max_id, generation)
+            logger.info(
+                f"Índice BM25 actualizado: {len(index) - before} documentos nuevos "
+                f"({len(index)} en total) en {time.perf_counter() - start:.2f} s"
+            )
+        return index
+
+
+def keyword_index_stats() -> Dict[str, Any]:
+    return _keyword_index.stats() if _keyword_index is not None else {"documents": 0}
+
+
+def warm_keyword_index():
+    """ Construye el índice al arrancar el worker para que la primera búsqueda no pague la carga """
+    from app.db.database import get_connection
+
+    connection = None
+    try:
+        connection = get_connection()
+        get_keyword_index(connection.cursor())
+        connection.commit()
+    except Exception as e:
+        logger.error(f"No se pudo construir el índice BM25: {str(e)}")
+    finally:
+        if connection:
+            connection.close()
@@ -0,0 +1,184 @@
+"""
+Proyección PCA para la búsqueda en dos etapas sobre la matriz compartida.
+
+Al publicar una generación se ajusta (o se reutiliza) una proyección
+dim -> PCA_DIMENSION y se guardan los vectores reducidos junto a los
+completos. La búsqueda calcula primero el producto con los vectores
+reducidos, se queda con una lista corta y vuelve a puntuarla con los
+vectores completos, así que las puntuaciones devueltas son exactas.
+
+Como los vectores están normalizados, x·q = (x - media)·q + media·q y el
+segundo término es igual para todos los documentos: basta con ordenar por
+((x - media) P)·(q P), donde P son las componentes principales.
+
+Informe de recall frente a la búsqueda exacta, para elegir la dimensión:
+    python -m app.search.pca --dims 16 32 64 128 --k 10 --queries 200
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger("pca")
+
+
+def fit_pca(
+    vectors: np.ndarray,
+    dim: int,
+    sample_size: Optional[int] = None,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Ajusta la proyección sobre una muestra de filas.
+
+    Returns:
+        (media (d,), componentes (d, dim), fracción de varianza explicada)
+    """
+    sample_size = sample_size or settings.PCA_SAMPLE_SIZE
+    n = vectors.shape[0]
+    if n > sample_size:
+        rows = np.sort(np.random.default_rng(seed).choice(n, sample_size, replace=False))
+        sample = np.asarray(vectors[rows], dtype=np.float64)
+    else:
+        sample = np.asarray(vectors, dtype=np.float64)
+
+    mean = sample.mean(axis=0)
+    centered = sample - mean
+    # la matriz de covarianza es d x d: más barato que la SVD de la muestra completa
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    order = np.argsort(eigenvalues)[::-1][:dim]
+    total = float(eigenvalues.sum())
+    explained = float(eigenvalues[order].sum() / total) if total > 0 else 0.0
+    return mean.astype(np.float32), eigenvectors[:, order].astype(np.float32), explained
+
+
+def project(
+    vectors: np.ndarray,
+    mean: np.ndarray,
+    components: np.ndarray,
+    out: Optional[np.ndarray] = None,
+    batch_size: int = 20000
+) -> np.ndarray:
+    """ Proyecta por bloques (los vectores pueden estar mapeados desde disco) """
+    if out is None:
+        out = np.empty((vectors.shape[0], components.shape[1]), dtype=np.float32)
+    for lo in range(0, vectors.shape[0], batch_size):
+        hi = min(lo + batch_size, vectors.shape[0])
+        out[lo:hi] = (np.asarray(vectors[lo:hi]) - mean) @ components
+    return out
+
+
+def shortlist_size(k: int, factor: Optional[int] = None) -> int:
+    factor = settings.PCA_SHORTLIST_FACTOR if factor is None else factor
+    return max(k * factor, settings.PCA_SHORTLIST_MIN)
+
+
+def coarse_rows(
+    reduced: np.ndarray,
+    components: np.ndarray,
+    query: np.ndarray,
+    k: int,
+    rows: Optional[np.ndarray] = None,
+    factor: Optional[int] = None
+) -> Optional[np.ndarray]:
+    """
+    Primera etapa: filas candidatas según los vectores reducidos, ordenadas por
+    posición. Devuelve `rows` sin cambios si la lista corta no reduciría nada.
+    `factor` sustituye a PCA_SHORTLIST_FACTOR (p. ej. en las mediciones de recall).
+    """
+    size = shortlist_size(k, factor)
+    candidates = reduced.shape[0] if rows is None else rows.shape[0]
+    if size >= candidates:
+        return rows
+    approx = (reduced if rows is None else reduced[rows]) @ (query @ components)
+    short = np.sort(np.argpartition(-approx, size - 1)[:size])
+    return short if rows is None else rows[short]
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """ Posiciones de los k vecinos exactos de cada consulta (fuerza bruta) """
+    scores = queries @ np.asarray(vectors).T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def without_self(found: np.ndarray, own: int, k: int) -> np.ndarray:
+    """ Los k primeros de `found` (ordenados) sin la propia consulta """
+    return found[found != own][:k]
+
+
+def recall_report(
+    vectors: np.ndarray,
+    dims: Sequence[int],
+    k: int = 10,
+    num_queries: int = 200,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Compara la búsqueda en dos etapas con la exacta para cada dimensión.
+    Las consultas son documentos del propio corpus elegidos al azar; cada uno
+    se descarta de su verdad y de sus resultados, porque encontrarse a sí mismo
+    es trivial e inflaría el recall.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample = np.sort(rng.choice(n, min(num_queries, n), replace=False))
+    queries = np.asarray(vectors[sample], dtype=np.float32)
+
+    truth = [without_self(row, own, k) for row, own in zip(exact_top_k(vectors, queries, k + 1), sample)]
+    # latencia exacta consulta a consulta, comparable con la de las dos etapas
+    start = time.perf_counter()
+    for query in queries:
+        np.argpartition(-(np.asarray(vectors) @ query), k - 1)[:k]
+    exact_ms = (time.perf_counter() - start) * 1000 / queries.shape[0]
+
+    report = [{"dimension": int(vectors.shape[1]), "recall": 1.0, "latency_ms": exact_ms, "explained_variance": 1.0}]
+    for dim in dims:
+        mean, components, explained = fit_pca(vectors, dim, seed=seed)
+        reduced = project(vectors, mean, components)
+        hits = 0
+        start = time.perf_counter()
+        for query, own, expected in zip(queries, sample, truth):
+            rows = coarse_rows(reduced, components, query, k + 1)
+            rows = np.arange(n) if rows is None else rows
+            scores = np.asarray(vectors[rows]) @ query
+            top = np.argpartition(-scores, k)[:k + 1]
+            found = without_self(rows[top[np.argsort(-scores[top])]], own, k)
+            hits += len(np.intersect1d(found, expected))
+        latency_ms = (time.perf_counter() - start) * 1000 / queries.shape[0]
+        report.append({
+            "dimension": int(dim),
+            "recall": hits / (k * queries.shape[0]),
+            "latency_ms": latency_ms,
+            "explained_variance": explained
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from app.search.shared_matrix import load_current
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Recall de la búsqueda PCA en dos etapas frente a la exacta")
+    parser.add_argument("--dims", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    generation = load_current(settings.SHARED_MATRIX_DIR)
+    if generation is None or len(generation) <= args.k:
+        raise SystemExit(f"No hay una generación publicada en {settings.SHARED_MATRIX_DIR} con suficientes vectores")
+
+    rows = recall_report(generation.vectors, args.dims, args.k, args.queries)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'dim':>6} {'recall@' + str(args.k):>10} {'ms/consulta':>12} {'varianza':>9}")
+        for row in rows:
+            print(f"{row['dimension']:>6} {row['recall']:>10.3f} {row['latency_ms']:>12.2f} {row['explained_variance']:>9.3f}")
@@ -0,0 +1,174 @@
+"""
+Registro de consultas y precalentamiento de cachés.
+
+Cada búsqueda se anota en un buffer en memoria (una operación O(1) en la
+petición). Una tarea en segundo plano vuelca el buffer por lotes a ficheros
+JSONL diarios en QUERY_LOG_DIR (solo se añade al final, nunca se reescribe).
+
+Cada entrada guarda la búsqueda completa normalizada (consulta y resto de
+parámetros: limit, fields, facetas...), que es lo que forma la clave de las
+cachés. Otra tarea calcula las QUERY_LOG_TOP_K búsquedas más frecuentes por
+categoría en las últimas QUERY_LOG_WINDOW_HOURS horas y las vuelve a ejecutar
+tal cual al arrancar y cada vez que cambia la generación del corpus (tras una
+ingesta), de modo que las cachés de embeddings y de resultados nunca están
+frías para las búsquedas habituales.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.search.corpus import get_corpus_generation
+
+logger = logging.getLogger("query_log")
+
+
+def normalize_query(query: str) -> str:
+    """ Normaliza una consulta: minúsculas y espacios colapsados """
+    return " ".join(query.lower().split())
+
+
+class QueryLog:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._buffer: deque = deque()
+        self.recorded = 0
+        self.written = 0
+
+    def record(self, params: Dict[str, Any]):
+        """ Anota una búsqueda (SearchQuery serializada y normalizada); no hace E/S en la petición """
+        self._buffer.append({
+            "ts": time.time(),
+            "q": params["query"],
+            "cat": params.get("id_categoria"),
+            "params": params
+        })
+        self.recorded += 1
+
+    def _path_for(self, day: datetime) -> str:
+        return os.path.join(self.directory, f"queries-{day:%Y%m%d}.jsonl")
+
+    def _write(self, entries: List[Dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        by_day = defaultdict(list)
+        for entry in entries:
+            by_day[self._path_for(datetime.fromtimestamp(entry["ts"]))].append(entry)
+        for path, day_entries in by_day.items():
+            # una única escritura por lote en modo append
+            data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in day_entries)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(data)
+
+    async def flush(self):
+        entries = []
+        while self._buffer:
+            entries.append(self._buffer.popleft())
+        if not entries:
+            return
+        try:
+            await asyncio.to_thread(self._write, entries)
+            self.written += len(entries)
+        except Exception as e:
+            logger.error(f"Error escribiendo el registro de consultas: {str(e)}")
+
+    async def run_flusher(self, interval: float):
+        """ Vuelca el buffer cada `interval` segundos hasta que se cancela la tarea """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+    def top_queries(self, window_hours: float, top_k: int) -> Dict[Optional[int], List[Dict[str, Any]]]:
+        """ Búsquedas (sus parámetros) más frecuentes por categoría dentro de la ventana deslizante """
+        since = time.time() - window_hours * 3600
+        first_day = datetime.fromtimestamp(since).date()
+        counters: Dict[Optional[int], Counter] = defaultdict(Counter)
+
+        day = first_day
+        while day <= datetime.now().date():
+            path = self._path_for(datetime.combine(day, datetime.min.time()))
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if entry.get("ts", 0) >= since and entry.get("q"):
+                            # las entradas antiguas solo tienen la consulta y la categoría
+                            params = entry.get("params") or {"query": entry["q"], "id_categoria": entry.get("cat")}
+                            counters[entry.get("cat")][json.dumps(params, sort_keys=True)] += 1
+            day += timedelta(days=1)
+
+        return {
+            cat: [json.loads(key) for key, _ in counter.most_common(top_k)]
+            for cat, counter in counters.items()
+        }
+
+    def remove_expired(self, window_hours: float):
+        """ Borra los ficheros diarios que ya han salido de la ventana """
+        if not os.path.isdir(self.directory):
+            return
+        oldest = self._path_for(datetime.fromtimestamp(time.time() - window_hours * 3600 - 86400))
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("queries-") and path < oldest:
+                os.remove(path)
+
+    def stats(self):
+        return {"recorded": self.recorded, "written": self.written, "pending": len(self._buffer)}
+
+
+class Prewarmer:
+    """ Reejecuta las búsquedas más frecuentes, con sus mismos parámetros, para rellenar las cachés """
+
+    def __init__(self, query_log: QueryLog, search_fn: Callable[[Dict[str, Any]], Awaitable]):
+        self.query_log = query_log
+        self.search_fn = search_fn
+        self.runs = 0
+        self.queries = 0
+        self.last_generation: Optional[int] = None
+
+    async def prewarm(self):
+        top = await asyncio.to_thread(
+            self.query_log.top_queries,
+            settings.QUERY_LOG_WINDOW_HOURS,
+            settings.QUERY_LOG_TOP_K
+        )
+        total = 0
+        for searches in top.values():
+            for params in searches:
+                try:
+                    await self.search_fn(params)
+                    total += 1
+                except Exception as e:
+                    logger.error(f"Error precalentando '{params.get('query')}': {str(e)}")
+        self.runs += 1
+        self.queries += total
+        logger.info(f"Precalentamiento completado: {total} consultas en {len(top)} categorías")
+
+    async def run(self, interval: float):
+        """
+        Precalienta al arrancar y después cada vez que cambia la generación del
+        corpus, comprobándola cada `interval` segundos.
+        """
+        while True:
+            try:
+                generation = await asyncio.to_thread(get_corpus_generation)
+                if generation != self.last_generation:
+                    self.last_generation = generation
+                    await self.prewarm()
+                    await asyncio.to_thread(self.query_log.remove_expired, settings.QUERY_LOG_WINDOW_HOURS)
+            except Exception as e:
+                logger.error(f"Error en el precalentamiento de cachés: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return {"runs": self.runs, "queries": self.queries, "generation": self.last_generation}
@@ -0,0 +1,210 @@
+"""
+Medición del recall de los backends de búsqueda vectorial.
+
+Exporta los vectores de la base de datos, toma como consultas una muestra
+de documentos y calcula los k vecinos exactos por fuerza bruta con NumPy.
+El documento de cada consulta se descarta de la verdad y de los resultados
+(encontrarse a sí mismo es trivial y sumaría hasta 1/k de recall a todos los
+backends), así que cada búsqueda pide k + 1 vecinos. Después lanza las mismas
+consultas contra:
+
+    pgvector      índice ivfflat con cada valor de --probes
+    memoria       matriz compartida publicada, búsqueda exacta
+    memoria-pca   matriz compartida en dos etapas con cada --shortlist
+
+y muestra recall@k y latencia (p50/p95) de cada combinación.
+
+Uso:
+    python -m app.search.recall --k 10 --queries 200 --probes 1 4 10 40 100
+    python -m app.search.recall --json recall.json
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.search.pca import exact_top_k, shortlist_size
+from app.search.shared_matrix import load_current, parse_vector
+from app.search.sharding import shard_clause
+
+logger = logging.getLogger("recall")
+
+
+def export_vectors(connection, batch_size: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+    """ Lee todos los vectores del nodo (normalizados) con sus ids """
+    shard_sql, shard_params = shard_clause("documento")
+    cursor = connection.cursor(name="recall_export")
+    cursor.itersize = batch_size
+    cursor.execute(
+        "SELECT id, contenido_vectorizado FROM documento WHERE contenido_vectorizado IS NOT NULL"
+        + shard_sql + " ORDER BY id",
+        shard_params
+    )
+    ids, vectors = [], []
+    for doc_id, vector in cursor:
+        ids.append(doc_id)
+        vectors.append(parse_vector(vector))
+    cursor.close()
+    connection.commit()
+
+    matrix = np.vstack(vectors) if vectors else np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return np.array(ids, dtype=np.int64), matrix
+
+
+def ivfflat_lists(cursor) -> Optional[str]:
+    """ Opciones (lists) del índice ivfflat de documento, para incluirlas en el informe """
+    cursor.execute(
+        """
+        SELECT c.reloptions FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = 'documento'::regclass AND am.amname = 'ivfflat'
+        """
+    )
+    row = cursor.fetchone()
+    return ",".join(row[0] or []) if row else None
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in vector.tolist()) + "]"
+
+
+def measure(
+    name: str,
+    parameter: str,
+    search: Callable[[np.ndarray], Sequence[int]],
+    queries: np.ndarray,
+    query_ids: np.ndarray,
+    truth: List[set],
+    k: int
+) -> Dict[str, Any]:
+    """
+    Ejecuta todas las consultas con `search` (que devuelve k + 1 ids) y resume
+    recall y latencias, sin contar el propio documento de cada consulta
+    """
+    latencies, hits = [], 0
+    for query, own, expected in zip(queries, query_ids.tolist(), truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected.intersection([int(i) for i in found if int(i) != own][:k]))
+    return {
+        "backend": name,
+        "parametro": parameter,
+        "recall": hits / (k * len(truth)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95))
+    }
+
+
+def run(
+    connection,
+    k: int,
+    num_queries: int,
+    probes: Sequence[int],
+    shortlists: Sequence[int],
+    seed: int = 0
+) -> Dict[str, Any]:
+    ids, vectors = export_vectors(connection)
+    if ids.shape[0] <= k:
+        raise SystemExit(f"Hacen falta más de {k} documentos vectorizados ({ids.shape[0]} encontrados)")
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(ids.shape[0], min(num_queries, ids.shape[0]), replace=False))
+    queries, query_ids = vectors[sample], ids[sample]
+    truth = [
+        set([i for i in ids[row].tolist() if i != own][:k])
+        for row, own in zip(exact_top_k(vectors, queries, k + 1), query_ids.tolist())
+    ]
+    logger.info(f"Verdad exacta calculada para {len(truth)} consultas sobre {ids.shape[0]} vectores")
+
+    cursor = connection.cursor()
+    report = {
+        "k": k,
+        "consultas": len(truth),
+        "documentos": int(ids.shape[0]),
+        "ivfflat": ivfflat_lists(cursor),
+        "resultados": []
+    }
+
+    shard_sql, shard_params = shard_clause("documento")
+    for value in probes:
+        def search_pgvector(query: np.ndarray, value=value) -> List[int]:
+            cursor.execute("SET LOCAL ivfflat.probes = %s", [value])
+            cursor.execute(
+                "SELECT id FROM documento WHERE contenido_vectorizado IS NOT NULL" + shard_sql
+                + " ORDER BY contenido_vectorizado <=> %s::vector LIMIT %s",
+                shard_params + [vector_literal(query), k + 1]
+            )
+            found = [row[0] for row in cursor.fetchall()]
+            connection.rollback()
+            return found
+        report["resultados"].append(measure("pgvector", f"probes={value}", search_pgvector, queries, query_ids, truth, k))
+
+    generation = load_current(settings.SHARED_MATRIX_DIR)
+    if generation is None:
+        logger.warning(f"No hay matriz publicada en {settings.SHARED_MATRIX_DIR}: se omite el backend memoria")
+    else:
+        report["generacion"] = generation.name
+        report["resultados"].append(measure(
+            "memoria", "exacta",
+            lambda query: generation.top_k(query, k + 1, coarse=False)[0],
+            queries, query_ids, truth, k
+        ))
+        if generation.reduced is None:
+            logger.warning(f"La generación {generation.name} no tiene proyección PCA")
+            shortlists = []
+        for factor in shortlists:
+            report["resultados"].append(measure(
+                "memoria-pca", f"dim={generation.reduced.shape[1]},lista={shortlist_size(k + 1, factor)}",
+                lambda query, factor=factor: generation.top_k(query, k + 1, coarse=True, shortlist_factor=factor)[0],
+                queries, query_ids, truth, k
+            ))
+
+    cursor.close()
+    return report
+
+
+def print_table(report: Dict[str, Any]):
+    print(
+        f"{report['documentos']} documentos, {report['consultas']} consultas, "
+        f"ivfflat: {report['ivfflat'] or 'sin índice'}"
+    )
+    print(f"{'backend':<12} {'parámetro':<24} {'recall@' + str(report['k']):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in report["resultados"]:
+        print(
+            f"{row['backend']:<12} {row['parametro']:<24} {row['recall']:>10.3f} "
+            f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    from app.db.database import get_connection
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Recall@k y latencia de los backends de búsqueda vectorial")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 10, 40, 100])
+    parser.add_argument("--shortlist", type=int, nargs="+", default=[5, 10, 20],
+                        help="Factores PCA_SHORTLIST_FACTOR a probar en memoria-pca")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Fichero donde guardar el informe en JSON")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        result = run(conn, args.k, args.queries, args.probes, args.shortlist, args.seed)
+    finally:
+        conn.close()
+
+    print_table(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,208 @@
+"""
+Segunda etapa de ordenación con un cross-encoder.
+
+Los candidatos de perform_vector_search se puntúan por lotes con pares
+(consulta, titulo + texto_resumen) en el orden de la primera etapa. Antes de
+cada lote se estima su duración con el último tiempo por candidato medido
+(también en peticiones anteriores) y solo se puntúa si cabe dentro del
+presupuesto RERANK_BUDGET_MS; si no cabe ni el primero no se re-ordena nada.
+Los candidatos puntuados se reordenan entre sí y el resto conserva el orden
+original detrás.
+
+El modelo se carga (y se mide con un lote de prueba) en el arranque con
+warm_reranker, fuera del bucle de eventos.
+"""
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import settings
+
+logger = logging.getLogger("rerank")
+
+
+class Reranker(ABC):
+    """ Interfaz de los modelos de re-ranking: una puntuación por texto """
+
+    name = "base"
+
+    @abstractmethod
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        """ Puntuación de cada texto para la consulta (mayor es más relevante) """
+
+
+class CrossEncoderReranker(Reranker):
+    """ Cross-encoder de sentence-transformers ejecutado en CPU """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str, batch_size: int):
+        # dependencia opcional: solo se importa si se activa este backend
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+        logger.info(f"Cross-encoder cargado: {model_name}")
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        scores = self.model.predict([(query, text) for text in texts], batch_size=self.batch_size)
+        return [float(s) for s in scores]
+
+
+class StubReranker(Reranker):
+    """
+    Sustituto determinista para pruebas: fracción de términos de la consulta
+    presentes en el texto. No necesita descargar ningún modelo.
+    """
+
+    name = "stub"
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        terms = set(re.findall(r"\w+", query.lower()))
+        if not terms:
+            return [0.0] * len(texts)
+        return [len(terms & set(re.findall(r"\w+", text.lower()))) / len(terms) for text in texts]
+
+
+class RerankMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.budget_exhausted = 0
+        self.candidates = 0
+        self.scored = 0
+        self.total_ms = 0.0
+        # último tiempo por candidato medido; estima la duración de los lotes
+        self.per_candidate_ms: Optional[float] = None
+
+    def observe_batch(self, size: int, elapsed_ms: float):
+        if size:
+            with self._lock:
+                self.per_candidate_ms = elapsed_ms / size
+
+    def add(self, candidates: int, scored: int, elapsed_ms: float, exhausted: bool):
+        with self._lock:
+            self.requests += 1
+            self.candidates += candidates
+            self.scored += scored
+            self.total_ms += elapsed_ms
+            if exhausted:
+                self.budget_exhausted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": settings.RERANK_BACKEND,
+                "requests": self.requests,
+                "avg_ms": self.total_ms / self.requests if self.requests else 0.0,
+                "budget_exhausted": self.budget_exhausted,
+                "budget_exhausted_ratio": self.budget_exhausted / self.requests if self.requests else 0.0,
+                "scored_ratio": self.scored / self.candidates if self.candidates else 0.0,
+                "per_candidate_ms": self.per_candidate_ms
+            }
+
+
+rerank_metrics = RerankMetrics()
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """ Devuelve el modelo configurado en RERANK_BACKEND (None si no hay o no se puede cargar) """
+    global _reranker
+    if not settings.rerank_enabled:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            try:
+                if settings.RERANK_BACKEND == "stub":
+                    _reranker = StubReranker()
+                elif settings.RERANK_BACKEND == "cross-encoder":
+                    _reranker = CrossEncoderReranker(settings.RERANK_MODEL, settings.RERANK_BATCH_SIZE)
+                else:
+                    logger.error(f"RERANK_BACKEND desconocido: {settings.RERANK_BACKEND}")
+            except Exception as e:
+                logger.error(f"No se pudo cargar el modelo de re-ranking: {str(e)}")
+        return _reranker
+
+
+def set_reranker(reranker: Optional[Reranker]):
+    """ Sustituye el modelo de re-ranking (p. ej. por StubReranker en pruebas) """
+    global _reranker
+    with _reranker_lock:
+        _reranker = reranker
+
+
+def warm_reranker():
+    """
+    Carga el modelo de RERANK_BACKEND y puntúa un lote de prueba para que la
+    primera búsqueda no pague la carga y el presupuesto tenga una estimación.
+    Se ejecuta en un hilo desde el lifespan.
+    """
+    reranker = get_reranker()
+    if reranker is None:
+        return
+    size = settings.RERANK_BATCH_SIZE
+    start = time.perf_counter()
+    try:
+        reranker.score("consulta de prueba", ["texto de prueba"] * size)
+    except Exception as e:
+        logger.error(f"Error en el lote de prueba del re-ranking: {str(e)}")
+        return
+    rerank_metrics.observe_batch(size, (time.perf_counter() - start) * 1000)
+    logger.info(f"Re-ranking listo ({reranker.name}): {rerank_metrics.per_candidate_ms:.2f} ms por candidato")
+
+
+def candidate_text(result: Dict[str, Any]) -> str:
+    return f"{result.get('titulo') or ''} {result.get('texto_resumen') or ''}".strip()
+
+
+def rerank_results(
+    query: str,
+    results: List[Dict[str, Any]],
+    reranker: Reranker,
+    budget_ms: Optional[float] = None,
+    batch_size: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Reordena los resultados de la primera etapa dentro del presupuesto de latencia.
+    Los diccionarios de entrada no se modifican (pueden estar en caché).
+    """
+    budget_ms = settings.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    batch_size = batch_size or settings.RERANK_BATCH_SIZE
+
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    scores: List[float] = []
+    exhausted = False
+
+    for i in range(0, len(results), batch_size):
+        now = time.perf_counter()
+        batch = results[i:i + batch_size]
+        # sin ninguna medida todavía (modelo sin precalentar) el primer lote se arriesga
+        per_candidate_ms = rerank_metrics.per_candidate_ms or 0.0
+        if now + per_candidate_ms * len(batch) / 1000 > deadline:
+            exhausted = True
+            break
+        try:
+            scores.extend(reranker.score(query, [candidate_text(r) for r in batch]))
+        except Exception as e:
+            logger.error(f"Error en el re-ranking, se mantiene el orden original: {str(e)}")
+            scores = []
+            exhausted = True
+            break
+        rerank_metrics.observe_batch(len(batch), (time.perf_counter() - now) * 1000)
+
+    scored = len(scores)
+    order = sorted(range(scored), key=lambda idx: -scores[idx])
+    reranked = [dict(results[idx], score_rerank=scores[idx]) for idx in order] + results[scored:]
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    rerank_metrics.add(len(results), scored, elapsed_ms, exhausted)
+    if exhausted:
+        logger.info(f"Presupuesto de re-ranking agotado: {scored}/{len(results)} candidatos en {elapsed_ms:.1f} ms")
+    return reranked
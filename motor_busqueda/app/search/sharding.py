@@ -0,0 +1,155 @@
+"""
+Búsqueda repartida entre varios nodos de motor_busqueda (scatter-gather).
+
+Cada nodo sirve un fragmento del corpus (SHARD_COUNT > 1, SHARD_INDEX):
+los documentos se asignan por id (mod(id, SHARD_COUNT)) o por categoría
+(SHARD_KEY=categoria). El filtro se añade a todas las consultas del nodo y
+a la carga de la matriz compartida y del índice BM25, así que cada nodo puede
+tener su propia base de datos o compartir una sola en pruebas locales.
+
+Un nodo con SHARD_URLS actúa de coordinador: envía la búsqueda a todos los
+fragmentos a la vez, espera como mucho SHARD_TIMEOUT segundos y mezcla las
+listas ya ordenadas de cada fragmento con un heap. Los scores de la búsqueda
+de texto (BM25) no son comparables con las similitudes coseno, así que los
+resultados de un fragmento que ha caído en ella van detrás de los vectoriales
+(ver merge_key). Si algún fragmento falla o
+no responde a tiempo la respuesta se marca como parcial. /similar no se
+reparte: el coordinador responde 501.
+
+Prueba local con dos fragmentos y un coordinador:
+    SHARD_COUNT=2 SHARD_INDEX=0 uvicorn main:app --port 8101
+    SHARD_COUNT=2 SHARD_INDEX=1 uvicorn main:app --port 8102
+    SHARD_URLS=http://localhost:8101,http://localhost:8102 uvicorn main:app --port 8001
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger("sharding")
+
+
+def shard_clause(alias: str = "d") -> Tuple[str, List]:
+    """ Condición SQL (precedida de AND) que limita las consultas al fragmento del nodo """
+    if settings.SHARD_COUNT <= 1:
+        return "", []
+    if settings.SHARD_KEY == "categoria":
+        column = f"COALESCE({alias}.id_categoria, 0)"
+    else:
+        column = f"{alias}.id"
+    return f" AND mod({column}, %s) = %s", [settings.SHARD_COUNT, settings.SHARD_INDEX]
+
+
+def shard_urls() -> List[str]:
+    return [url.strip().rstrip("/") for url in settings.SHARD_URLS.split(",") if url.strip()]
+
+
+# orden de los resultados según su origen; solo se comparan scores del mismo origen
+ORIGIN_RANK = {"vectorial": 1, "texto": 2, "reciente": 3}
+
+
+def merge_key(result: Dict[str, Any]) -> Tuple[int, float]:
+    """
+    Orden de mezcla: primero los re-ordenados por el cross-encoder, después los
+    vectoriales, los de la búsqueda de texto y los recientes, cada grupo por score
+    """
+    if result.get("score_rerank") is not None:
+        return 0, -result["score_rerank"]
+    return ORIGIN_RANK.get(result.get("origen", "vectorial"), 1), -result["score"]
+
+
+class ShardUnavailable(Exception):
+    """ Ningún fragmento ha respondido """
+
+
+class ShardCoordinator:
+    """ Reparte cada búsqueda entre los fragmentos y mezcla sus resultados """
+
+    def __init__(self, urls: Sequence[str], timeout: float):
+        self.urls = list(urls)
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.partial = 0
+        self.failures: Dict[str, int] = {url: 0 for url in self.urls}
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _search_shard(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._client.post(f"{url}/search", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def search(
+        self,
+        payload: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[List[Dict[str, Any]]], List[str]]:
+        """
+        Busca en todos los fragmentos. `payload` es la SearchQuery serializada.
+
+        Returns:
+            (resultados, total, facetas, fragmentos que han fallado)
+        """
+        self.requests += 1
+        limit, offset = payload["limit"], payload["offset"]
+        # cada fragmento devuelve sus offset + limit mejores; la página se corta tras la mezcla
+        shard_payload = dict(payload, limit=offset + limit, offset=0)
+        tasks = {url: asyncio.create_task(self._search_shard(url, shard_payload)) for url in self.urls}
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+
+        ranked, failed = [], []
+        total = 0
+        facet_totals: Dict[int, Dict[str, Any]] = {}
+        for url, task in tasks.items():
+            # task.exception() lanza CancelledError si la tarea se ha cancelado
+            if task not in done or task.cancelled() or task.exception() is not None:
+                if task not in done:
+                    reason = "timeout"
+                elif task.cancelled():
+                    reason = "cancelled"
+                else:
+                    reason = repr(task.exception())
+                logger.warning(f"Fragmento {url} sin respuesta: {reason}")
+                self.failures[url] += 1
+                failed.append(url)
+                continue
+            data = task.result()
+            ranked.append(data["results"])
+            total += data["total"]
+            for faceta in data.get("facetas") or []:
+                entry = facet_totals.setdefault(faceta["id"], dict(faceta, total=0))
+                entry["total"] += faceta["total"]
+
+        if not ranked:
+            raise ShardUnavailable(f"Ningún fragmento ha respondido ({len(self.urls)} consultados)")
+        if failed:
+            self.partial += 1
+
+        # mezcla k-way de las listas ya ordenadas de cada fragmento
+        merged = list(itertools.islice(heapq.merge(*ranked, key=merge_key), offset, offset + limit))
+        facetas = None
+        if payload.get("facetas"):
+            facetas = sorted(facet_totals.values(), key=lambda f: (-f["total"], f["nombre"]))
+        return merged, total, facetas, failed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": len(self.urls),
+            "requests": self.requests,
+            "partial": self.partial,
+            "partial_ratio": self.partial / self.requests if self.requests else 0.0,
+            "failures": dict(self.failures)
+        }
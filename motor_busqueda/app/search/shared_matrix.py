@@ -0,0 +1,535 @@
+"""
+Matriz de embeddings compartida entre procesos.
+
+Un proceso cargador lee los vectores de la base de datos y publica una
+"generación" en SHARED_MATRIX_DIR (por defecto un volumen persistente; los
+mmap de los workers comparten igualmente las páginas de la caché del sistema):
+
+    SHARED_MATRIX_DIR/
+        CURRENT              -> nombre de la generación activa
+        gen-000003/
+            vectors.npy      float32 (n, dim), normalizados a norma 1
+            ids.npy          int64 (n,)
+            categorias.npy   int64 (n,), -1 si no tiene categoría
+            fechas.npy       datetime64[D] (n,), NaT si no tiene fecha
+            pca_mean.npy     float32 (dim,)      } proyección PCA opcional
+            pca_components.npy float32 (dim, r)  } (ver app.search.pca)
+            reduced.npy      float32 (n, r)      }
+            meta.json        formato, generación, número de filas, id máximo
+
+El formato está versionado (campo "format" de meta.json, FORMAT_VERSION) y
+meta.json guarda además el id máximo incluido (max_id), que sirve de marca
+de agua: al reiniciar basta con mapear la última generación y el cargador
+solo lee de la base de datos las filas con id mayor que max_id (ver
+publish_generation). Los workers nunca leen esas filas por su cuenta: hasta
+que el cargador publica la siguiente generación buscan sobre la última, sin
+los documentos ingeridos después.
+
+Cada worker de uvicorn abre los ficheros con np.load(mmap_mode="r"), de modo
+que todas las páginas se comparten y la memoria no crece con el número de
+workers. El cambio de generación es atómico: se escribe el directorio nuevo
+completo y después se reemplaza CURRENT con os.replace.
+
+Uso del cargador:
+    python -m app.search.shared_matrix            # publica una generación
+    python -m app.search.shared_matrix --watch    # republica al detectar ingestas
+    python -m app.search.shared_matrix --full     # reconstruye sin partir de la anterior
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.search.pca import coarse_rows, fit_pca, project
+from app.search.sharding import shard_clause
+
+logger = logging.getLogger("shared_matrix")
+
+CURRENT_FILE = "CURRENT"
+# versión del formato en disco; se incrementa al cambiar los ficheros o meta.json
+FORMAT_VERSION = 1
+NO_CATEGORY = -1
+
+
+def parse_vector(value) -> np.ndarray:
+    """ Convierte el texto '[0.1,0.2,...]' que devuelve pgvector en un array float32 """
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def get_corpus_state(cursor) -> Tuple[int, int]:
+    """ Devuelve (número de documentos vectorizados, id máximo) para detectar ingestas """
+    shard_sql, shard_params = shard_clause("documento")
+    cursor.execute(
+        "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM documento WHERE contenido_vectorizado IS NOT NULL" + shard_sql,
+        shard_params
+    )
+    count, max_id = cursor.fetchone()
+    return int(count), int(max_id)
+
+
+class MatrixGeneration:
+    """ Vista de solo lectura sobre una generación publicada """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        version = int(self.meta.get("format", FORMAT_VERSION))
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Formato de instantánea {version} no soportado (máximo {FORMAT_VERSION})")
+        self.generation = int(self.meta["generation"])
+        self.max_id = int(self.meta["max_id"])
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.categorias = np.load(os.path.join(path, "categorias.npy"), mmap_mode="r")
+        fechas_path = os.path.join(path, "fechas.npy")
+        self.fechas = np.load(fechas_path, mmap_mode="r") if os.path.exists(fechas_path) else None
+        self.pca_mean = self.pca_components = self.reduced = None
+        if os.path.exists(os.path.join(path, "reduced.npy")):
+            self.pca_mean = np.load(os.path.join(path, "pca_mean.npy"))
+            self.pca_components = np.load(os.path.join(path, "pca_components.npy"))
+            self.reduced = np.load(os.path.join(path, "reduced.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @property
+    def dimension(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def top_k(
+        self,
+        query_embedding: List[float],
+        k: int,
+        id_categoria: Optional[int] = None,
+        threshold: Optional[float] = None,
+        allowed_ids: Optional[np.ndarray] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+        coarse: Optional[bool] = None,
+        shortlist_factor: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Como search, sin el número de coincidencias """
+        ids, scores, _ = self.search(
+            query_embedding, k, id_categoria, threshold, allowed_ids,
+            fecha_desde, fecha_hasta, coarse, shortlist_factor
+        )
+        return ids, scores
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        id_categoria: Optional[int] = None,
+        threshold: Optional[float] = None,
+        allowed_ids: Optional[np.ndarray] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+        coarse: Optional[bool] = None,
+        shortlist_factor: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Búsqueda por similitud coseno sobre la matriz compartida.
+        `allowed_ids` restringe la búsqueda a un subconjunto de documentos.
+        Con `coarse` (por defecto PCA_SEARCH) y una proyección PCA publicada,
+        solo se puntúa con los vectores completos una lista corta elegida con
+        los reducidos, de tamaño k * `shortlist_factor` (por defecto
+        PCA_SHORTLIST_FACTOR).
+
+        Returns:
+            (ids, scores) ordenados de mayor a menor similitud y número de
+            documentos con los filtros y por encima de `threshold` (con la lista
+            corta PCA, solo entre los candidatos de la lista)
+        """
+        if k <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        has_dates = fecha_desde is not None or fecha_hasta is not None
+        if has_dates and self.fechas is None:
+            raise ValueError(f"La generación {self.name} no incluye fechas de publicación")
+
+        if id_categoria is not None or allowed_ids is not None or has_dates:
+            mask = np.ones(len(self), dtype=bool)
+            if id_categoria is not None:
+                mask &= self.categorias == id_categoria
+            if allowed_ids is not None:
+                mask &= np.isin(self.ids, allowed_ids)
+            # las comparaciones con NaT son siempre falsas: sin fecha queda fuera
+            if fecha_desde is not None:
+                mask &= self.fechas >= np.datetime64(fecha_desde, "D")
+            if fecha_hasta is not None:
+                mask &= self.fechas <= np.datetime64(fecha_hasta, "D")
+            rows = np.flatnonzero(mask)
+        else:
+            rows = None
+
+        coarse = settings.PCA_SEARCH if coarse is None else coarse
+        if coarse and self.reduced is not None:
+            rows = coarse_rows(self.reduced, self.pca_components, query, k, rows, shortlist_factor)
+        scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+
+        if threshold is not None:
+            keep = np.flatnonzero(scores >= threshold)
+            scores = scores[keep]
+            rows = keep if rows is None else rows[keep]
+
+        matched = int(scores.shape[0])
+        k = min(k, matched)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), matched
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        positions = top if rows is None else rows[top]
+        return np.asarray(self.ids[positions]), np.asarray(scores[top]), matched
+
+
+class SharedEmbeddingMatrix:
+    """
+    Punto de acceso de cada worker a la generación activa.
+
+    Comprueba CURRENT como mucho cada SHARED_MATRIX_CHECK_INTERVAL segundos y
+    cambia de generación sin bloquear a las búsquedas en curso, que conservan
+    la referencia a la generación anterior hasta terminar.
+    """
+
+    def __init__(self, directory: str, check_interval: float):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._generation: Optional[MatrixGeneration] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get(self) -> Optional[MatrixGeneration]:
+        now = time.monotonic()
+        if self._generation is not None and now - self._last_check < self.check_interval:
+            return self._generation
+
+        with self._lock:
+            if self._generation is not None and now - self._last_check < self.check_interval:
+                return self._generation
+            self._last_check = now
+            name = self._read_current()
+            if name is None:
+                return self._generation
+            if self._generation is None or self._generation.name != name:
+                try:
+                    self._generation = MatrixGeneration(os.path.join(self.directory, name))
+                    logger.info(f"Adjuntada generación {name} con {len(self._generation)} vectores")
+                except Exception as e:
+                    logger.error(f"No se pudo adjuntar la generación {name}: {str(e)}")
+            return self._generation
+
+
+_shared_matrix: Optional[SharedEmbeddingMatrix] = None
+
+
+def get_shared_matrix() -> Optional[MatrixGeneration]:
+    """ Devuelve la generación activa de la matriz compartida, o None si no hay ninguna publicada """
+    global _shared_matrix
+    if _shared_matrix is None:
+        _shared_matrix = SharedEmbeddingMatrix(
+            settings.SHARED_MATRIX_DIR,
+            settings.SHARED_MATRIX_CHECK_INTERVAL
+        )
+    return _shared_matrix.get()
+
+
+def _next_generation(directory: str) -> int:
+    generations = [
+        int(name.split("-", 1)[1]) for name in os.listdir(directory)
+        if name.startswith("gen-") and name.split("-", 1)[1].isdigit()
+    ]
+    return max(generations, default=0) + 1
+
+
+def load_current(directory: str) -> Optional[MatrixGeneration]:
+    """ Abre la generación apuntada por CURRENT, o None si no hay ninguna válida """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            name = f.read().strip()
+        return MatrixGeneration(os.path.join(directory, name)) if name else None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Instantánea no válida en {directory}: {str(e)}")
+        return None
+
+
+def publish_generation(
+    connection,
+    directory: Optional[str] = None,
+    batch_size: int = 2000,
+    full: bool = False
+) -> str:
+    """
+    Publica una nueva generación con todos los vectores de la base de datos.
+
+    Si ya hay una generación publicada con el mismo formato y dimensión, se
+    parte de ella (copiando los bloques mapeados, sin volver a leer ni parsear
+    esos vectores) y solo se leen de la base de datos las filas con id mayor que
+    su `max_id`. Si el número de filas no cuadra (borrados, documentos antiguos
+    vectorizados después) se reconstruye entera, igual que con `full=True`.
+
+    Los vectores se escriben directamente en el fichero mapeado, sin construir
+    la matriz completa en memoria del cargador.
+    """
+    directory = directory or settings.SHARED_MATRIX_DIR
+    os.makedirs(directory, exist_ok=True)
+    dim = settings.EMBEDDING_DIMENSION
+
+    cursor = connection.cursor()
+    count, max_id = get_corpus_state(cursor)
+
+    base = None if full else load_current(directory)
+    if base is not None and (base.dimension != dim or base.max_id > max_id):
+        logger.info(f"La generación {base.name} no es compatible con el corpus actual, reconstrucción completa")
+        base = None
+    start_id = base.max_id if base is not None else 0
+
+    shard_sql, shard_params = shard_clause("documento")
+    cursor.execute(
+        "SELECT COUNT(*) FROM documento WHERE contenido_vectorizado IS NOT NULL AND id > %s AND id <= %s" + shard_sql,
+        [start_id, max_id] + shard_params
+    )
+    delta_count = int(cursor.fetchone()[0])
+    cursor.close()
+
+    if base is not None and len(base) + delta_count != count:
+        logger.info(f"La generación {base.name} no cuadra con la base de datos, reconstrucción completa")
+        base, start_id, delta_count = None, 0, count
+    if base is not None and delta_count == 0:
+        connection.commit()
+        logger.info(f"La generación {base.name} ya está al día (id máximo {max_id})")
+        return base.name
+
+    base_rows = len(base) if base is not None else 0
+    total = base_rows + delta_count
+    generation = _next_generation(directory)
+    name = f"gen-{generation:06d}"
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(total, dim)
+    )
+    ids = np.empty(total, dtype=np.int64)
+    categorias = np.empty(total, dtype=np.int64)
+    fechas = np.full(total, np.datetime64("NaT"), dtype="datetime64[D]")
+
+    if base is not None:
+        # copia por bloques de la generación anterior: no se vuelve a leer de la base de datos
+        for lo in range(0, base_rows, batch_size * 10):
+            hi = min(lo + batch_size * 10, base_rows)
+            vectors[lo:hi] = base.vectors[lo:hi]
+        ids[:base_rows] = base.ids
+        categorias[:base_rows] = base.categorias
+        if base.fechas is not None:
+            fechas[:base_rows] = base.fechas
+        base_name = base.name
+        base_pca = _base_projection(base)
+        del base
+    else:
+        base_pca = None
+
+    # cursor con nombre: el servidor entrega las filas por lotes
+    cursor = connection.cursor(name=f"shared_matrix_{generation}")
+    cursor.itersize = batch_size
+    cursor.execute(
+        """
+        SELECT id, id_categoria, fecha_publicacion, contenido_vectorizado
+        FROM documento
+        WHERE contenido_vectorizado IS NOT NULL AND id > %s AND id <= %s""" + shard_sql + """
+        ORDER BY id
+        """,
+        [start_id, max_id] + shard_params
+    )
+    n = base_rows
+    for doc_id, id_categoria, fecha_publicacion, vector in cursor:
+        if n >= total:
+            break
+        row = parse_vector(vector)[:dim]
+        norm = np.linalg.norm(row)
+        vectors[n, :row.shape[0]] = row / norm if norm > 0 else row
+        vectors[n, row.shape[0]:] = 0
+        ids[n] = doc_id
+        categorias[n] = id_categoria if id_categoria is not None else NO_CATEGORY
+        if fecha_publicacion is not None:
+            fechas[n] = np.datetime64(fecha_publicacion, "D")
+        n += 1
+    cursor.close()
+    connection.commit()
+
+    vectors.flush()
+    del vectors
+    if n < total:
+        # se han borrado filas durante la carga: se recorta la matriz
+        data = np.load(os.path.join(tmp_path, "vectors.npy"))[:n]
+        np.save(os.path.join(tmp_path, "vectors.npy"), data)
+    pca_meta = _write_projection(tmp_path, base_pca, base_rows, n)
+    np.save(os.path.join(tmp_path, "ids.npy"), ids[:n])
+    np.save(os.path.join(tmp_path, "categorias.npy"), categorias[:n])
+    np.save(os.path.join(tmp_path, "fechas.npy"), fechas[:n])
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({
+            "format": FORMAT_VERSION,
+            "generation": generation,
+            "rows": n,
+            "dimension": dim,
+            "max_id": max_id,
+            "base": base_name if base_rows else None,
+            "delta_rows": n - base_rows,
+            "pca": pca_meta,
+            "created_at": time.time()
+        }, f)
+    _sync_files(tmp_path)
+
+    final_path = os.path.join(directory, name)
+    os.rename(tmp_path, final_path)
+
+    # cambio atómico de generación
+    current_tmp = os.path.join(directory, f".{CURRENT_FILE}.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+    logger.info(f"Publicada generación {name}: {n} vectores ({n - base_rows} nuevos), id máximo {max_id}")
+
+    _remove_old_generations(directory, keep=name)
+    return name
+
+
+def _base_projection(base: MatrixGeneration) -> Optional[Dict[str, Any]]:
+    """ Proyección de la generación anterior, si se puede reutilizar para la nueva """
+    pca = base.meta.get("pca")
+    if base.reduced is None or not pca or pca["dimension"] != settings.PCA_DIMENSION:
+        return None
+    return {
+        "meta": pca,
+        "mean": base.pca_mean,
+        "components": base.pca_components,
+        # el mapeo sigue siendo válido aunque se borre el directorio anterior
+        "reduced": base.reduced
+    }
+
+
+def _write_projection(path: str, base_pca: Optional[Dict[str, Any]], base_rows: int, n: int) -> Optional[Dict[str, Any]]:
+    """
+    Guarda la proyección PCA de la generación. Se reutiliza la anterior (y solo
+    se proyectan las filas nuevas) mientras el corpus no crezca más de
+    PCA_REFIT_GROWTH desde el último ajuste; si no, se vuelve a ajustar.
+    """
+    dim = settings.PCA_DIMENSION
+    if dim <= 0 or n <= dim:
+        return None
+
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    reduced = np.lib.format.open_memmap(
+        os.path.join(path, "reduced.npy"), mode="w+", dtype=np.float32, shape=(n, dim)
+    )
+    if base_pca is not None and n <= base_pca["meta"]["fitted_rows"] * (1 + settings.PCA_REFIT_GROWTH):
+        mean, components = base_pca["mean"], base_pca["components"]
+        meta = base_pca["meta"]
+        reduced[:base_rows] = base_pca["reduced"][:base_rows]
+        project(vectors[base_rows:n], mean, components, out=reduced[base_rows:n])
+    else:
+        start = time.perf_counter()
+        mean, components, explained = fit_pca(vectors[:n], dim)
+        project(vectors[:n], mean, components, out=reduced)
+        meta = {"dimension": dim, "fitted_rows": n, "explained_variance": explained, "fitted_at": time.time()}
+        logger.info(
+            f"Proyección PCA {vectors.shape[1]} -> {dim} ajustada en {time.perf_counter() - start:.2f} s "
+            f"(varianza explicada {explained:.3f})"
+        )
+    reduced.flush()
+    del reduced, vectors
+    np.save(os.path.join(path, "pca_mean.npy"), mean)
+    np.save(os.path.join(path, "pca_components.npy"), components)
+    return meta
+
+
+def _sync_files(path: str):
+    """ Fuerza a disco los ficheros de la generación antes de publicarla (instantáneas persistentes) """
+    for entry in os.listdir(path):
+        fd = os.open(os.path.join(path, entry), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _remove_old_generations(directory: str, keep: str):
+    """
+    Borra las generaciones anteriores. Los workers que aún las tengan mapeadas
+    siguen leyendo sin problemas: el fichero desaparece al cerrar el último mapeo.
+    """
+    for entry in os.listdir(directory):
+        if entry.startswith("gen-") and entry != keep:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def watch(poll_interval: float):
+    """ Republica la matriz cada vez que cambia el estado del corpus """
+    from app.db.database import get_connection
+
+    last_state = None
+    while True:
+        connection = None
+        try:
+            connection = get_connection()
+            cursor = connection.cursor()
+            state = get_corpus_state(cursor)
+            cursor.close()
+            if state != last_state:
+                publish_generation(connection)
+                last_state = state
+        except Exception as e:
+            logger.error(f"Error publicando la matriz compartida: {str(e)}")
+        finally:
+            if connection:
+                connection.close()
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Cargador de la matriz de embeddings compartida")
+    parser.add_argument("--watch", action="store_true", help="Republicar al detectar nuevas ingestas")
+    parser.add_argument("--interval", type=float, default=settings.SHARED_MATRIX_POLL_INTERVAL)
+    parser.add_argument("--full", action="store_true", help="Reconstruir sin partir de la generación anterior")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.interval)
+    else:
+        from app.db.database import get_connection
+        conn = get_connection()
+        try:
+            publish_generation(conn, full=args.full)
+        finally:
+            conn.close()
@@ -1,11 +1,21 @@
+import asyncio
 import logging
 import psycopg2
 import numpy as np
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Hashable, Optional, Sequence
+from datetime import date
 import os
-import hashlib
 import time
 
+from app.config import settings
+from app.search.shared_matrix import get_shared_matrix, parse_vector
+from app.search.corpus import get_corpus_generation
+from app.search.cache import GenerationCache
+from app.search.query_log import normalize_query
+from app.search.embedding import lexical_embedding
+from app.search.keyword_index import get_keyword_index
+from app.search.sharding import shard_clause
+
 # logging oara debugg
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("vector_search")
@@ -36,47 +46,491 @@ def create_connection():
 
 def get_simple_embedding(query_text: str, embedding_dim=768) -> List[float]:
     """
-    Genera un embedding a partir de una cadena de texto
+    Genera un embedding a partir de una cadena de texto mediante feature hashing
+    de palabras y trigramas (ver app.search.embedding). Es determinista y no
+    toca el estado global de np.random, así que es seguro entre hilos.
     """
-    # normalizamos la cadena
-    text = query_text.lower().strip()
-    
-    # Se genera una semilla a partir del hash de la cadena
-    # Esto asegura que el embedding sea reproducible
-    # y que no dependa de la longitud del texto
-    text_hash = hashlib.md5(text.encode()).hexdigest()
-    seed = int(text_hash, 16) % (2**32)
-
-    np.random.seed(seed)
-    
-    # generamos un embedding aleatorio
-    embedding = np.random.normal(0, 1, embedding_dim)
-    
-    # e influenciamos el embedding con la cadena de texto
-    chunks = [text[i:i+3] for i in range(0, len(text), 3)]
-    for i, chunk in enumerate(chunks[:100]):
-        chunk_val = sum(ord(c) for c in chunk)
-        chunk_idx = chunk_val % embedding_dim
-        embedding[chunk_idx] += chunk_val / 1000
-    
-    # volvemos a normalizar
-    norm = np.linalg.norm(embedding)
-    if norm > 0:
-        embedding = embedding / norm
-        
-    return embedding.tolist()
+    return lexical_embedding(query_text, embedding_dim).tolist()
+
+# autores del documento en su orden original, leídos de la tabla de unión
+AUTHORS_SQL = """ARRAY(
+        SELECT a.nombre FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+        WHERE da.id_documento = d.id ORDER BY da.orden
+    ) AS autores"""
+
+# documentos de un autor, resuelto con los índices de autor y documento_autor
+AUTHOR_FILTER_SQL = """d.id IN (
+        SELECT da.id_documento FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+        WHERE LOWER(a.nombre) = LOWER(%s)
+    )"""
+
+# campos opcionales de los resultados; id y score se devuelven siempre
+RESULT_FIELDS = ("titulo", "autor", "fecha_publicacion", "url_fuente", "categoria", "texto_resumen")
+
+def result_columns(fields: Optional[Sequence[str]] = None, categorias: bool = False) -> Tuple[str, str]:
+    """
+    Columnas y joins de las consultas de resultados para los campos pedidos
+    (todos si `fields` es None). Los campos no pedidos se sustituyen por NULL
+    para que las filas conserven sus posiciones (row_to_result, facets_from_rows)
+    y sus joins se omiten. `categorias` fuerza el join con categoria (facetas).
+
+    Returns:
+        Lista de columnas tras d.id y fragmento con los LEFT JOIN necesarios
+    """
+    wanted = set(RESULT_FIELDS if fields is None else fields)
+    with_categoria = "categoria" in wanted or categorias
+    columns = [
+        "d.titulo" if "titulo" in wanted else "NULL AS titulo",
+        AUTHORS_SQL if "autor" in wanted else "NULL AS autores",
+        "d.fecha_publicacion" if "fecha_publicacion" in wanted else "NULL AS fecha_publicacion",
+        "d.url_fuente" if "url_fuente" in wanted else "NULL AS url_fuente",
+        "c.id as id_categoria" if with_categoria else "NULL::integer AS id_categoria",
+        "c.nombre as categoria_nombre" if with_categoria else "NULL AS categoria_nombre",
+        "r.texto_resumen" if "texto_resumen" in wanted else "NULL AS texto_resumen"
+    ]
+    joins = ""
+    if with_categoria:
+        joins += "\nLEFT JOIN \n    categoria c ON d.id_categoria = c.id"
+    if "texto_resumen" in wanted:
+        joins += "\nLEFT JOIN \n    resumen r ON d.id = r.id_documento"
+    return ", \n    ".join(columns), joins
+
+def build_filters(
+    id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    excluir_id: Optional[int] = None
+) -> Tuple[str, List]:
+    """
+    Construye las condiciones de filtrado comunes a todas las consultas.
+
+    Returns:
+        Fragmento SQL (cada condición precedida de AND) y sus parámetros
+    """
+    clauses = []
+    params = []
+    if id_categoria is not None:
+        clauses.append("d.id_categoria = %s")
+        params.append(id_categoria)
+    if autor:
+        clauses.append(AUTHOR_FILTER_SQL)
+        params.append(autor.strip())
+    if fecha_desde is not None:
+        clauses.append("d.fecha_publicacion >= %s")
+        params.append(fecha_desde)
+    if fecha_hasta is not None:
+        clauses.append("d.fecha_publicacion <= %s")
+        params.append(fecha_hasta)
+    if excluir_id is not None:
+        clauses.append("d.id <> %s")
+        params.append(excluir_id)
+    # en modo fragmentado cada nodo solo ve su parte del corpus
+    shard_sql, shard_params = shard_clause()
+    return "".join(f" AND {clause}" for clause in clauses) + shard_sql, params + shard_params
+
+# embeddings por consulta normalizada (no dependen del corpus)
+embedding_cache = GenerationCache(settings.EMBEDDING_CACHE_SIZE)
+# resultados por consulta y parámetros, invalidados al cambiar la generación del corpus
+result_cache = GenerationCache(settings.RESULT_CACHE_SIZE)
+
+def cache_generation(matrix=None, cursor=None) -> Hashable:
+    """
+    Versión de las cachés de resultados: la generación del corpus y, si se busca
+    sobre la matriz compartida, también la de la matriz, que se publica después
+    de las ingestas. Así un resultado calculado con la matriz anterior no se
+    sirve tras el cambio de generación.
+    """
+    generation = get_corpus_generation(cursor)
+    return generation if matrix is None else (generation, matrix.generation)
+
+def get_query_embedding(query: str) -> List[float]:
+    """ Devuelve el embedding de la consulta normalizada, usando la caché si es posible """
+    text = normalize_query(query)
+    embedding = embedding_cache.get(text)
+    if embedding is None:
+        embedding = get_simple_embedding(text)
+        embedding_cache.put(text, embedding)
+    return embedding
+
+VECTOR_SEARCH_SQL = """
+SELECT 
+    d.id, 
+    {columns},
+    1 - (d.contenido_vectorizado <=> %s::vector) as score
+FROM 
+    documento d{joins}
+WHERE 
+    d.contenido_vectorizado IS NOT NULL
+"""
+
+# Recuento por categoría sobre el conjunto de candidatos ya limitado por el índice:
+# el agregado de ventana no añade recorridos sobre documento
+FACETS_SQL = """
+SELECT candidatos.*, COUNT(*) OVER (PARTITION BY candidatos.id_categoria) AS faceta_total
+FROM ({candidatos}) candidatos
+WHERE candidatos.score >= %s
+ORDER BY candidatos.score DESC
+"""
+
+def facets_from_rows(rows: List[Tuple]) -> List[Dict[str, Any]]:
+    """ Extrae las facetas (id, nombre, total) de las filas con la columna faceta_total """
+    facetas = {}
+    for row in rows:
+        if row[5] is not None and row[5] not in facetas:
+            facetas[row[5]] = {"id": row[5], "nombre": row[6], "total": int(row[9])}
+    return sorted(facetas.values(), key=lambda f: (-f["total"], f["nombre"]))
+
+def count_date_window(
+    cursor,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None
+) -> int:
+    """
+    Cuenta los documentos de un rango de fechas usando solo el índice de
+    fecha_publicacion. El recuento se corta en DATE_PREFILTER_MAX_ROWS + 1,
+    así que su coste está acotado aunque la ventana sea muy amplia.
+    """
+    filter_sql, filter_params = build_filters(fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+    cursor.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM documento d WHERE TRUE" + filter_sql + " LIMIT %s) ventana",
+        filter_params + [settings.DATE_PREFILTER_MAX_ROWS + 1]
+    )
+    return cursor.fetchone()[0]
+
+def adaptive_vector_search(
+    cursor,
+    query_embedding: List[float],
+    id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    excluir_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+    threshold: Optional[float] = None,
+    facet_window: int = 0,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Tuple], int, Optional[List[Dict[str, Any]]], int]:
+    """
+    Ejecuta la búsqueda vectorial aplicando SIMILARITY_THRESHOLD con sondeo adaptativo.
+
+    Se empieza con SEARCH_PROBES_INITIAL listas del índice ivfflat y solo se amplía
+    el número de sondas cuando no aparecen suficientes candidatos por encima del umbral.
+    Si una ampliación no añade ningún candidato válido se deja de ampliar: la consulta
+    tiene pocos documentos cercanos y más sondas solo encarecerían la búsqueda.
+    Las consultas fáciles terminan en la primera ronda y las difíciles conservan el recall.
+
+    Con un rango de fechas estrecho (como mucho DATE_PREFILTER_MAX_ROWS documentos)
+    se hace una búsqueda exacta solo sobre esa ventana, seleccionada con el índice
+    de fecha_publicacion, en lugar de filtrar después del índice ivfflat.
+
+    Con `facet_window` > 0 se recuperan hasta ese número de candidatos en la misma
+    consulta y se cuentan por categoría con un agregado de ventana. Con una
+    categoría seleccionada las facetas se cuentan aparte, sin ese filtro, para que
+    sigan mostrando las demás categorías; el filtro solo se aplica a la página.
+
+    Solo se seleccionan (y se unen) las columnas de `fields` (ver result_columns).
+
+    Returns:
+        Filas por encima del umbral (como mucho `limit`), número de sondas utilizadas
+        (0 si la búsqueda ha sido exacta sobre la ventana de fechas), facetas
+        por categoría (None si no se han pedido) y candidatos por encima del
+        umbral entre los recuperados. Se recupera al menos uno más de los que
+        caben en la página, así que un valor mayor que offset + limit indica que
+        hay más resultados (es una cota inferior, no un recuento exacto).
+    """
+    if threshold is None:
+        threshold = settings.SIMILARITY_THRESHOLD
+
+    if facet_window and id_categoria is not None:
+        # mismas rondas de sondeo que la página, pero solo con las columnas de las facetas
+        _, _, facetas, _ = adaptive_vector_search(
+            cursor, query_embedding, None, autor, fecha_desde, fecha_hasta, excluir_id,
+            limit=offset + limit, threshold=threshold, facet_window=facet_window, fields=()
+        )
+        rows, probes, _, matched = adaptive_vector_search(
+            cursor, query_embedding, id_categoria, autor, fecha_desde, fecha_hasta, excluir_id,
+            limit=limit, offset=offset, threshold=threshold, fields=fields
+        )
+        return rows, probes, facetas, matched
+
+    # El ORDER BY debe ser la distancia coseno para que el planificador use el índice
+    filter_sql, filter_params = build_filters(id_categoria, autor, fecha_desde, fecha_hasta, excluir_id)
+    columns, joins = result_columns(fields, categorias=bool(facet_window))
+    sql = VECTOR_SEARCH_SQL.format(columns=columns, joins=joins) + filter_sql
+    params = [query_embedding] + filter_params
+    sql += " ORDER BY d.contenido_vectorizado <=> %s::vector LIMIT %s"
+    params.extend([query_embedding, max(offset + limit + 1, facet_window)])
+    if facet_window:
+        sql = FACETS_SQL.format(candidatos=sql)
+        params.append(threshold)
+
+    if (fecha_desde is not None or fecha_hasta is not None) and \
+            count_date_window(cursor, fecha_desde, fecha_hasta) <= settings.DATE_PREFILTER_MAX_ROWS:
+        # sin index scan el planificador recorre solo la ventana (bitmap scan sobre
+        # el índice de fecha) y ordena por distancia exacta
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        cursor.execute(sql, params)
+        candidates = cursor.fetchall()
+        cursor.execute("SET LOCAL enable_indexscan = on")
+        good = [row for row in candidates if row[8] is not None and float(row[8]) >= threshold]
+        return good[offset:offset + limit], 0, facets_from_rows(good) if facet_window else None, len(good)
+
+    max_probes = max(settings.SEARCH_PROBES_MAX, 1)
+    probes = min(max(settings.SEARCH_PROBES_INITIAL, 1), max_probes)
+    previous = None
+    while True:
+        # SET LOCAL solo afecta a la transacción en curso
+        cursor.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+        cursor.execute(sql, params)
+        candidates = cursor.fetchall()
+
+        # Las filas vienen ordenadas por distancia: las válidas forman un prefijo
+        good = [row for row in candidates if row[8] is not None and float(row[8]) >= threshold]
+        if len(good) >= offset + limit or probes >= max_probes:
+            break
+        if previous is not None and len(good) <= previous:
+            logger.info(f"probes={probes} no añade candidatos sobre el umbral {threshold}, se deja de ampliar")
+            break
+        previous = len(good)
+
+        logger.info(f"Solo {len(good)} candidatos sobre el umbral {threshold} con probes={probes}, ampliando")
+        probes = min(probes * max(settings.SEARCH_PROBES_FACTOR, 2), max_probes)
+
+    return good[offset:offset + limit], probes, facets_from_rows(good) if facet_window else None, len(good)
+
+def author_document_ids(cursor, autor: str) -> np.ndarray:
+    """ Ids de los documentos de un autor, para filtrar las búsquedas en memoria """
+    cursor.execute(
+        """
+        SELECT da.id_documento FROM documento_autor da JOIN autor a ON a.id = da.id_autor
+        WHERE LOWER(a.nombre) = LOWER(%s)
+        """,
+        [autor.strip()]
+    )
+    return np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+
+def memory_vector_search(
+    cursor,
+    matrix,
+    query_embedding: List[float],
+    id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    excluir_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+    threshold: Optional[float] = None,
+    facet_window: int = 0,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Tuple], Optional[List[Dict[str, Any]]], int]:
+    """
+    Búsqueda exacta sobre la matriz compartida en memoria. Solo se consulta la
+    base de datos para recuperar los campos de los documentos seleccionados
+    (y los nombres de las categorías si se piden facetas).
+
+    Returns:
+        Filas de la página, facetas (None si no se piden) y número de documentos
+        por encima del umbral, contado con las mismas puntuaciones de la matriz
+    """
+    if threshold is None:
+        threshold = settings.SIMILARITY_THRESHOLD
+
+    allowed_ids = author_document_ids(cursor, autor) if autor else None
+
+    def candidates(k: int, categoria: Optional[int]) -> Tuple[np.ndarray, np.ndarray, int]:
+        # se pide un candidato más para poder descartar el documento excluido
+        ids, scores, matched = matrix.search(
+            query_embedding,
+            k + (1 if excluir_id is not None else 0),
+            categoria,
+            threshold,
+            allowed_ids,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta
+        )
+        if excluir_id is not None:
+            keep = ids != excluir_id
+            matched -= int(ids.shape[0] - keep.sum())
+            ids, scores = ids[keep][:k], scores[keep][:k]
+        return ids, scores, matched
+
+    facetas = None
+    if facet_window and id_categoria is not None:
+        # las facetas se cuentan sin la categoría seleccionada (ver adaptive_vector_search)
+        ids, scores, matched = candidates(offset + limit, id_categoria)
+        facetas = memory_facets(cursor, matrix, candidates(facet_window, None)[0])
+    else:
+        ids, scores, matched = candidates(max(offset + limit, facet_window), id_categoria)
+        if facet_window:
+            facetas = memory_facets(cursor, matrix, ids)
+
+    page = slice(offset, offset + limit)
+    return fetch_rows_by_id(cursor, ids[page], scores[page], fields), facetas, matched
+
+def fetch_rows_by_id(
+    cursor,
+    ids: np.ndarray,
+    scores: np.ndarray,
+    fields: Optional[Sequence[str]] = None
+) -> List[Tuple]:
+    """ Recupera las filas de los documentos seleccionados en memoria, en el mismo orden """
+    if ids.shape[0] == 0:
+        return []
+
+    columns, joins = result_columns(fields)
+    cursor.execute(
+        f"""
+        SELECT 
+            d.id, 
+            {columns}
+        FROM 
+            documento d{joins}
+        WHERE d.id = ANY(%s)
+        """,
+        [ids.tolist()]
+    )
+    by_id = {row[0]: row for row in cursor.fetchall()}
+    rows = [
+        tuple(by_id[doc_id]) + (float(score),)
+        for doc_id, score in zip(ids.tolist(), scores.tolist())
+        if doc_id in by_id
+    ]
+    return rows
+
+def memory_facets(cursor, matrix, ids: np.ndarray) -> List[Dict[str, Any]]:
+    """ Cuenta por categoría los candidatos de la matriz compartida """
+    positions = np.searchsorted(matrix.ids, ids)
+    categorias, totales = np.unique(np.asarray(matrix.categorias[positions]), return_counts=True)
+    counts = {int(c): int(t) for c, t in zip(categorias, totales) if c >= 0}
+    if not counts:
+        return []
+    cursor.execute("SELECT id, nombre FROM categoria WHERE id = ANY(%s)", [list(counts)])
+    facetas = [{"id": row[0], "nombre": row[1], "total": counts[row[0]]} for row in cursor.fetchall()]
+    return sorted(facetas, key=lambda f: (-f["total"], f["nombre"]))
+
+def keyword_search(
+    cursor,
+    query: str,
+    id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = 20,
+    offset: int = 0,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Tuple], int]:
+    """
+    Búsqueda por palabras clave con el índice BM25 en memoria. La puntuación
+    devuelta es BM25 normalizada entre 0 y 1 (KeywordIndex.search), no una
+    similitud coseno: los resultados se marcan con origen "texto".
+    """
+    index = get_keyword_index(cursor)
+    allowed_ids = author_document_ids(cursor, autor) if autor else None
+    ids, scores = index.search(
+        query,
+        offset + limit,
+        id_categoria=id_categoria,
+        allowed_ids=allowed_ids,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta
+    )
+    rows = fetch_rows_by_id(cursor, ids[offset:offset + limit], scores[offset:offset + limit], fields)
+    if len(rows) < limit:
+        total = offset + len(rows)
+    else:
+        total = index.count(query, id_categoria, allowed_ids, fecha_desde, fecha_hasta)
+    return rows, total
+
+def row_to_result(row: Tuple, fields: Optional[Sequence[str]] = None, origen: str = "vectorial") -> Dict[str, Any]:
+    """
+    Convierte una fila de las consultas de búsqueda en el diccionario de respuesta (JSON).
+    Con `fields` solo se incluyen esos campos, además de id, score y origen.
+    `origen` indica de qué búsqueda sale el score (vectorial, texto o reciente).
+    """
+    result = {
+        "id": row[0],
+        "titulo": row[1],
+        # los autores ya llegan como lista desde la tabla documento_autor
+        "autor": list(row[2]) if row[2] else [],
+        "fecha_publicacion": row[3],
+        "url_fuente": row[4],
+        "categoria": {
+            "id": row[5],
+            "nombre": row[6]
+        } if row[5] else None,
+        "texto_resumen": row[7],
+        "score": float(row[8]) if row[8] is not None else 0.0,
+        "origen": origen
+    }
+    if fields is not None:
+        result = {key: value for key, value in result.items() if key in ("id", "score", "origen") or key in fields}
+    return result
 
 async def perform_vector_search(
     query: str,
     id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
     limit: int = 20,
-    offset: int = 0
-) -> Tuple[List[Dict[Any, Any]], int]:
-    """  Realiza una búsqueda por similitud vectorial en la base de datos. """
+    offset: int = 0,
+    facetas: bool = False,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Dict[Any, Any]], int, Optional[List[Dict[str, Any]]]]:
+    """
+    Realiza una búsqueda por similitud vectorial en la base de datos.
+    El trabajo bloqueante (embedding y consultas) se ejecuta en un hilo
+    para no detener el bucle de eventos. Con `fields` solo se consultan y
+    devuelven esos campos de cada resultado.
+
+    Returns:
+        Resultados, total (documentos por encima del umbral: exacto con la matriz
+        en memoria o si la página no se llena; si no, una cota inferior mayor que
+        offset + limit; aproximado en los fallbacks) y facetas por categoría
+        (None si no se piden o si la búsqueda vectorial no ha sido posible)
+    """
+    return await asyncio.to_thread(
+        vector_search,
+        query,
+        id_categoria=id_categoria,
+        autor=autor,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        limit=limit,
+        offset=offset,
+        facetas=facetas,
+        fields=fields
+    )
+
+def vector_search(
+    query: str,
+    id_categoria: Optional[int] = None,
+    autor: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = 20,
+    offset: int = 0,
+    facetas: bool = False,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Dict[Any, Any]], int, Optional[List[Dict[str, Any]]]]:
+    """  Versión síncrona de perform_vector_search. """
     try:
         start_time = time.time()
+        
+        matrix = get_shared_matrix() if settings.SEARCH_BACKEND == "memoria" else None
+        generation = cache_generation(matrix)
+        fields = None if fields is None else tuple(sorted(set(fields)))
+        cache_key = (normalize_query(query), id_categoria, autor, fecha_desde, fecha_hasta, limit, offset, facetas, fields)
+        cached = result_cache.get(cache_key, generation)
+        if cached is not None:
+            logger.info(f"Resultados servidos desde caché (generación {generation})")
+            return cached
+        
         # obtenemos el embedding de la query
-        query_embedding = get_simple_embedding(query)
+        query_embedding = get_query_embedding(query)
         logger.info(f"Embedding generado en {time.time() - start_time:.2f} segundos")
         
         # creamos la conexion 
@@ -90,7 +544,7 @@ async def perform_vector_search(
         
         if doc_count == 0:
             logger.warning("No documents in database!")
-            return [], 0
+            return [], 0, None
             
         # Debugging: muestra un documento de ejemplo
         cursor.execute("SELECT id, titulo, autor FROM documento LIMIT 1")
@@ -110,6 +564,11 @@ async def perform_vector_search(
         except Exception as e:
             logger.error(f"Simple query failed: {e}")
         
+        # las facetas se calculan sobre los FACET_WINDOW mejores candidatos
+        facet_window = settings.FACET_WINDOW if facetas else 0
+        facet_counts = None
+        origen = "vectorial"
+        
         try:
             logger.info("Attempting vector search...")
             
@@ -127,60 +586,46 @@ async def perform_vector_search(
                 # Si tenemos la extensión y documentos vectorizados, procedemos con la búsqueda
                 logger.info("Executing vector search with embedding...")
                 
-                # SQL para búsqueda vectorial usando el operador de distancia coseno (<->)
-                # Ordenamos por similitud (1 - distancia) para que los más similares aparezcan primero
-                vector_sql = """
-                SELECT 
-                    d.id, 
-                    d.titulo, 
-                    d.autor, 
-                    d.fecha_publicacion, 
-                    d.url_fuente,
-                    c.id as id_categoria,
-                    c.nombre as categoria_nombre,
-                    r.texto_resumen,
-                    1 - (d.contenido_vectorizado <-> %s::vector) as score
-                FROM 
-                    documento d
-                LEFT JOIN 
-                    categoria c ON d.id_categoria = c.id
-                LEFT JOIN 
-                    resumen r ON d.id = r.id_documento
-                WHERE 
-                    d.contenido_vectorizado IS NOT NULL
-                """
-                
-                # Parámetros para la consulta
-                params = [query_embedding]
-                
-                # Añadir filtro de categoría si es necesario
-                if id_categoria is not None:
-                    vector_sql += " AND d.id_categoria = %s"
-                    params.append(id_categoria)
-                
-                # Ordenar por score y aplicar límite y offset
-                vector_sql += " ORDER BY score DESC LIMIT %s OFFSET %s"
-                params.extend([limit, offset])
-                
+                if matrix is not None:
+                    # Búsqueda exacta sobre la matriz compartida entre workers
+                    rows, facet_counts, matched = memory_vector_search(
+                        cursor,
+                        matrix,
+                        query_embedding,
+                        id_categoria=id_categoria,
+                        autor=autor,
+                        fecha_desde=fecha_desde,
+                        fecha_hasta=fecha_hasta,
+                        limit=limit,
+                        offset=offset,
+                        facet_window=facet_window,
+                        fields=fields
+                    )
+                    logger.info(f"Memory search returned {len(rows)} results (generation={matrix.generation})")
+                else:
+                    # Búsqueda por umbral con sondeo adaptativo del índice ivfflat
+                    rows, probes, facet_counts, matched = adaptive_vector_search(
+                        cursor,
+                        query_embedding,
+                        id_categoria=id_categoria,
+                        autor=autor,
+                        fecha_desde=fecha_desde,
+                        fecha_hasta=fecha_hasta,
+                        limit=limit,
+                        offset=offset,
+                        facet_window=facet_window,
+                        fields=fields
+                    )
+                    logger.info(f"Vector search returned {len(rows)} results (probes={probes})")
+
                 try:
-                    # Ejecutamos la consulta vectorial
-                    logger.info(f"Executing vector query with {len(query_embedding)}-dimensional embedding")
-                    cursor.execute(vector_sql, params)
-                    rows = cursor.fetchall()
-                    logger.info(f"Vector search returned {len(rows)} results")
-                    
-                    # Si tenemos resultados, calculamos el total aproximado
-                    if rows:
-                        # Consulta para estimar el total sin límite
-                        if id_categoria is not None:
-                            cursor.execute(
-                                "SELECT COUNT(*) FROM documento WHERE contenido_vectorizado IS NOT NULL AND id_categoria = %s", 
-                                [id_categoria]
-                            )
-                        else:
-                            cursor.execute("SELECT COUNT(*) FROM documento WHERE contenido_vectorizado IS NOT NULL")
-                        total_count = cursor.fetchone()[0]
-                        logger.info(f"Estimated total matches: {total_count}")
+                    # Si la ventana no se ha llenado, el total es exacto
+                    if rows and len(rows) < limit:
+                        total_count = offset + len(rows)
+                    elif rows:
+                        # sin recorrer la tabla: lo que la búsqueda ya ha contado por encima del umbral
+                        total_count = matched
+                        logger.info(f"Matches above threshold seen: {total_count}")
                     else:
                         total_count = 0
                     
@@ -198,123 +643,160 @@ async def perform_vector_search(
                 
         except Exception as e:
             logger.error(f"Vector search failed, falling back to text search: {str(e)}")
+            # descartamos la transacción (y el SET LOCAL) por si quedó abortada
+            conn.rollback()
+            facet_counts = None
             
-            # Búsqueda de texto como fallback
-            search_terms = query.lower().split()
-            search_sql = """
-            SELECT 
-                d.id, 
-                d.titulo, 
-                d.autor, 
-                d.fecha_publicacion, 
-                d.url_fuente,
-                c.id as id_categoria,
-                c.nombre as categoria_nombre,
-                r.texto_resumen,
-                1.0 as score
-            FROM 
-                documento d
-            LEFT JOIN 
-                categoria c ON d.id_categoria = c.id
-            LEFT JOIN 
-                resumen r ON d.id = r.id_documento
-            WHERE 
-                LOWER(d.titulo) LIKE %s
-                OR LOWER(d.autor) LIKE %s
-            """
-            
-            search_pattern = f"%{search_terms[0]}%"
-            params = [search_pattern, search_pattern]
-            
-            # si se especifica una categoria se aplica como filtro
-            if id_categoria is not None:
-                search_sql += " AND d.id_categoria = %s"
-                params.append(id_categoria)
-            
-            # se ejecuta la consulta
-            search_sql += " ORDER BY d.fecha_publicacion DESC LIMIT %s OFFSET %s"
-            
-            logger.info(f"Executing text search with pattern: {search_pattern}")
-            cursor.execute(search_sql, params + [limit, offset])
-            rows = cursor.fetchall()
-            logger.info(f"Text search query returned {len(rows)} results")
+            # Búsqueda por palabras clave (BM25) en memoria como fallback
+            total_count = None
+            try:
+                rows, total_count = keyword_search(
+                    cursor,
+                    query,
+                    id_categoria=id_categoria,
+                    autor=autor,
+                    fecha_desde=fecha_desde,
+                    fecha_hasta=fecha_hasta,
+                    limit=limit,
+                    offset=offset,
+                    fields=fields
+                )
+                logger.info(f"Keyword search returned {len(rows)} results")
+                origen = "texto"
+            except Exception as e:
+                logger.error(f"Keyword search failed: {str(e)}")
+                conn.rollback()
+                rows = []
             
             # Si la búsqueda de texto también falla, usamos el último recurso
             if not rows:
                 logger.info("Text search returned no results, using last resort fallback...")
                 
                 # Last resort fallback - simplemente devuelve los documentos más recientes
-                fallback_sql = """
+                columns, joins = result_columns(fields)
+                fallback_sql = f"""
                 SELECT 
                     d.id, 
-                    d.titulo, 
-                    d.autor, 
-                    d.fecha_publicacion, 
-                    d.url_fuente,
-                    c.id as id_categoria,
-                    c.nombre as categoria_nombre,
-                    r.texto_resumen,
+                    {columns},
                     0.75 as score
                 FROM 
-                    documento d
-                LEFT JOIN 
-                    categoria c ON d.id_categoria = c.id
-                LEFT JOIN 
-                    resumen r ON d.id = r.id_documento
+                    documento d{joins}
+                WHERE 
+                    TRUE
                 """
                 
-                if id_categoria is not None:
-                    fallback_sql += " WHERE d.id_categoria = %s"
-                    cursor.execute(fallback_sql + " ORDER BY d.fecha_publicacion DESC LIMIT %s OFFSET %s", 
-                                 [id_categoria, limit, offset])
-                else:
-                    cursor.execute(fallback_sql + " ORDER BY d.fecha_publicacion DESC LIMIT %s OFFSET %s",
-                                 [limit, offset])
+                filter_sql, filter_params = build_filters(id_categoria, autor, fecha_desde, fecha_hasta)
+                cursor.execute(fallback_sql + filter_sql + " ORDER BY d.fecha_publicacion DESC LIMIT %s OFFSET %s",
+                             filter_params + [limit, offset])
                 
                 rows = cursor.fetchall()
+                origen = "reciente"
                 logger.info(f"Fallback query returned {len(rows)} results")
             
-            total_count = doc_count  # Estimación aproximada
+            if total_count is None or not rows:
+                total_count = doc_count  # Estimación aproximada
         
         # Procesamos los resultados
-        results = []
-        for row in rows:
-            # se convierte el autor a lista ya que suelen ser varios
-            authors = []
-            if row[2]:  
-                if isinstance(row[2], str):
-                    if ',' in row[2]:
-                        authors = [author.strip() for author in row[2].split(',')]
-                    else:
-                        authors = [row[2]]
-                else:
-                    authors = [row[2]]
-            
-            # y se genera el diccionario de respuesta (JSON)
-            result = {
-                "id": row[0],
-                "titulo": row[1],
-                "autor": authors,
-                "fecha_publicacion": row[3],
-                "url_fuente": row[4],
-                "categoria": {
-                    "id": row[5],
-                    "nombre": row[6]
-                } if row[5] else None,
-                "texto_resumen": row[7],
-                "score": float(row[8]) if row[8] is not None else 0.0 
-            }
-            results.append(result)
+        results = [row_to_result(row, fields, origen) for row in rows]
         
         # cerramos conexion
         cursor.close()
         conn.close()
         
         logger.info(f"Búsqueda completada en {time.time() - start_time:.2f} segundos. Resultados: {len(results)}/{total_count}")
-        return results, total_count
+        value = (results, total_count, facet_counts)
+        result_cache.put(cache_key, value, generation)
+        return value
         
     except Exception as e:
         logger.error(f"Error en búsqueda vectorial: {str(e)}")
         
         # Se devuelve vacío como último fallback
-        return [], 0
\ No newline at end of file
+        return [], 0, None
+
+# resultados de "documentos similares" por documento semilla y parámetros
+similar_cache = GenerationCache(settings.SIMILAR_CACHE_SIZE)
+
+async def perform_similar_search(
+    id_documento: int,
+    id_categoria: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> Optional[Tuple[List[Dict[Any, Any]], int]]:
+    """
+    Busca documentos similares a uno dado usando su vector almacenado.
+    Devuelve None si el documento no existe o no está vectorizado.
+    """
+    return await asyncio.to_thread(
+        similar_search,
+        id_documento,
+        id_categoria=id_categoria,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        limit=limit,
+        offset=offset
+    )
+
+def similar_search(
+    id_documento: int,
+    id_categoria: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> Optional[Tuple[List[Dict[Any, Any]], int]]:
+    """  Versión síncrona de perform_similar_search. """
+    conn = create_connection()
+    try:
+        cursor = conn.cursor()
+        matrix = get_shared_matrix() if settings.SEARCH_BACKEND == "memoria" else None
+        generation = cache_generation(matrix, cursor)
+        cache_key = (id_documento, id_categoria, fecha_desde, fecha_hasta, limit, offset)
+        cached = similar_cache.get(cache_key, generation)
+        if cached is not None:
+            return cached
+
+        # se usa el vector guardado tal cual, sin volver a generar un embedding
+        cursor.execute(
+            "SELECT contenido_vectorizado FROM documento WHERE id = %s AND contenido_vectorizado IS NOT NULL",
+            [id_documento]
+        )
+        seed = cursor.fetchone()
+        if seed is None:
+            return None
+
+        # sin umbral: se devuelven siempre los vecinos más próximos
+        if matrix is not None:
+            rows, _, _ = memory_vector_search(
+                cursor,
+                matrix,
+                parse_vector(seed[0]).tolist(),
+                id_categoria=id_categoria,
+                fecha_desde=fecha_desde,
+                fecha_hasta=fecha_hasta,
+                excluir_id=id_documento,
+                limit=limit,
+                offset=offset,
+                threshold=-1.0
+            )
+        else:
+            rows, _, _, _ = adaptive_vector_search(
+                cursor,
+                seed[0],
+                id_categoria=id_categoria,
+                fecha_desde=fecha_desde,
+                fecha_hasta=fecha_hasta,
+                excluir_id=id_documento,
+                limit=limit,
+                offset=offset,
+                threshold=-1.0
+            )
+
+        results = [row_to_result(row) for row in rows]
+        value = (results, offset + len(results))
+        similar_cache.put(cache_key, value, generation)
+        return value
+    finally:
+        conn.close()
@@ -1,6 +1,11 @@
+import asyncio
+import json
 import logging
 import os
 import sys
+from datetime import date
+from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
 
 
 logging.basicConfig(
@@ -12,16 +17,23 @@ logger = logging.getLogger("search_engine")
 # comprobar que todas las dependencias estan disponibles
 try:
     import fastapi
-    from fastapi import FastAPI, HTTPException
+    from fastapi import FastAPI, HTTPException, Query
     from fastapi.middleware.cors import CORSMiddleware
     import pydantic
     from pydantic import BaseModel, Field
     import pydantic_settings
     from pydantic_settings import BaseSettings
     
-    from app.models.search import SearchQuery, SearchResponse
+    from app.models.search import SearchQuery, SearchResponse, SimilarResponse
     from app.config import settings
-    from app.search.vector_search import perform_vector_search
+    from app.search.vector_search import (
+        perform_vector_search, perform_similar_search, similar_cache, embedding_cache, result_cache
+    )
+    from app.search.coalescing import SingleFlight
+    from app.search.query_log import QueryLog, Prewarmer, normalize_query
+    from app.search.rerank import get_reranker, warm_reranker, rerank_results, rerank_metrics
+    from app.search.keyword_index import warm_keyword_index, keyword_index_stats
+    from app.search.sharding import ShardCoordinator, ShardUnavailable, shard_urls
     
 except ImportError as e:
     logger.error(f"Error importing required dependencies: {str(e)}")
@@ -29,11 +41,45 @@ except ImportError as e:
     logger.error("pip install -U fastapi uvicorn pydantic==2.1.1 pydantic-settings==2.0.3 psycopg2-binary python-dotenv numpy")
     sys.exit(1)
 
+# registro de consultas y precalentamiento de las consultas más frecuentes
+query_log = QueryLog(settings.QUERY_LOG_DIR)
+
+async def prewarm_search(params: Dict[str, Any]):
+    """ Repite una búsqueda registrada con sus mismos parámetros para rellenar las cachés """
+    await run_search(SearchQuery(**params))
+
+prewarmer = Prewarmer(query_log, prewarm_search)
+
+# con SHARD_URLS el nodo no busca: reparte las consultas entre los fragmentos
+coordinator = ShardCoordinator(shard_urls(), settings.SHARD_TIMEOUT) if shard_urls() else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if coordinator is not None:
+        # el registro de consultas y las cachés viven en cada fragmento
+        await coordinator.start()
+        tasks = []
+    else:
+        tasks = [
+            asyncio.create_task(query_log.run_flusher(settings.QUERY_LOG_FLUSH_INTERVAL)),
+            asyncio.create_task(prewarmer.run(settings.PREWARM_CHECK_INTERVAL)),
+            asyncio.create_task(asyncio.to_thread(warm_keyword_index)),
+        ]
+        if settings.rerank_enabled:
+            tasks.append(asyncio.create_task(asyncio.to_thread(warm_reranker)))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if coordinator is not None:
+        await coordinator.close()
+
 # FastAPI app
 app = FastAPI(
     title="ClinicCloud Search Engine",
     description="Motor de búsqueda para documentos médicos usando embeddings vectoriales",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 #  CORS
@@ -45,11 +91,87 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# búsquedas idénticas concurrentes comparten una única ejecución
+search_flight = SingleFlight()
+
+def normalized_params(query: SearchQuery) -> Dict[str, Any]:
+    """ Parámetros de la búsqueda con la consulta normalizada """
+    params = query.model_dump(mode="json")
+    params["query"] = normalize_query(query.query)
+    return params
+
+def coalescing_key(query: SearchQuery) -> str:
+    """ Clave de agrupación: la consulta normalizada junto con el resto de parámetros """
+    return json.dumps(normalized_params(query), sort_keys=True)
+
 @app.get("/")
 def read_root():
     return {"message": "ClinicCloud Search Engine API", "status": "running"}
 
-@app.post("/search", response_model=SearchResponse)
+@app.get("/metrics")
+def read_metrics():
+    """
+    Métricas internas del motor de búsqueda.
+    """
+    return {
+        "coalescing": search_flight.stats(),
+        "similar_cache": similar_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "query_log": query_log.stats(),
+        "prewarm": prewarmer.stats(),
+        "rerank": rerank_metrics.stats(),
+        "keyword_index": keyword_index_stats(),
+        "sharding": coordinator.stats() if coordinator is not None else {
+            "shard_count": settings.SHARD_COUNT,
+            "shard_index": settings.SHARD_INDEX,
+            "shard_key": settings.SHARD_KEY
+        }
+    }
+
+async def run_search(query: SearchQuery):
+    """
+    Búsqueda completa: primera etapa vectorial y, si está activado, re-ranking
+    de los RERANK_CANDIDATES mejores candidatos dentro del presupuesto de latencia.
+    """
+    use_rerank = settings.rerank_enabled if query.rerank is None else query.rerank
+    # la primera carga del modelo puede tardar segundos: nunca en el bucle de eventos
+    reranker = await asyncio.to_thread(get_reranker) if use_rerank else None
+    if reranker is None:
+        return await perform_vector_search(
+            query.query,
+            id_categoria=query.id_categoria,
+            autor=query.autor,
+            fecha_desde=query.fecha_desde,
+            fecha_hasta=query.fecha_hasta,
+            limit=query.limit,
+            offset=query.offset,
+            facetas=query.facetas,
+            fields=query.fields
+        )
+
+    # el cross-encoder puntúa titulo + texto_resumen aunque no se hayan pedido
+    fields = None if query.fields is None else sorted(set(query.fields) | {"titulo", "texto_resumen"})
+    candidates, total, facetas = await perform_vector_search(
+        query.query,
+        id_categoria=query.id_categoria,
+        autor=query.autor,
+        fecha_desde=query.fecha_desde,
+        fecha_hasta=query.fecha_hasta,
+        limit=max(settings.RERANK_CANDIDATES, query.offset + query.limit),
+        offset=0,
+        facetas=query.facetas,
+        fields=fields
+    )
+    reranked = await asyncio.to_thread(rerank_results, query.query, candidates, reranker)
+    page = reranked[query.offset:query.offset + query.limit]
+    if query.fields is not None:
+        keep = {"id", "score", "score_rerank", "origen", *query.fields}
+        page = [{key: value for key, value in result.items() if key in keep} for result in page]
+    return page, total, facetas
+
+# los campos no pedidos con `fields` no se envían
+@app.post("/search", response_model=SearchResponse, response_model_exclude_unset=True)
 async def search_documents(query: SearchQuery):
     """
     Endpoint para buscar documentos utilizando similitud vectorial.
@@ -57,13 +179,21 @@ async def search_documents(query: SearchQuery):
     try:
         logger.info(f"Búsqueda recibida: {query.query}")
         
-        # Realizar la búsqueda vectorial
-        results, total = await perform_vector_search(
-            query.query,
-            id_categoria=query.id_categoria,
-            limit=query.limit,
-            offset=query.offset
-        )
+        if coordinator is not None:
+            # Reparto entre los fragmentos y mezcla de sus resultados
+            results, total, facetas, fallidos = await search_flight.do(
+                coalescing_key(query),
+                lambda: coordinator.search(query.model_dump(mode="json"))
+            )
+        else:
+            query_log.record(normalized_params(query))
+            
+            # Realizar la búsqueda vectorial
+            results, total, facetas = await search_flight.do(
+                coalescing_key(query),
+                lambda: run_search(query)
+            )
+            fallidos = []
         
         logger.info(f"Búsqueda completada. Resultados encontrados: {total}")
         
@@ -71,14 +201,60 @@ async def search_documents(query: SearchQuery):
         response = SearchResponse(
             results=results,
             total=total,
-            query=query.query
+            query=query.query,
+            facetas=facetas,
+            parcial=bool(fallidos),
+            fragmentos_fallidos=fallidos or None
         )
         
         return response
+    except ShardUnavailable as e:
+        logger.error(f"Error en la búsqueda: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error en la búsqueda: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {str(e)}")
 
+@app.get("/similar/{id_documento}", response_model=SimilarResponse)
+async def similar_documents(
+    id_documento: int,
+    id_categoria: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Endpoint para buscar documentos relacionados con uno dado ("más como este"),
+    usando directamente su vector almacenado como consulta.
+    """
+    if coordinator is not None:
+        # el vector del documento solo está en su fragmento y el coordinador no
+        # lo reparte; una respuesta con los vecinos de un solo fragmento sería incompleta
+        raise HTTPException(
+            status_code=501,
+            detail="La búsqueda de similares no está disponible en un nodo coordinador (SHARD_URLS)"
+        )
+
+    try:
+        found = await perform_similar_search(
+            id_documento,
+            id_categoria=id_categoria,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            limit=limit,
+            offset=offset
+        )
+    except Exception as e:
+        logger.error(f"Error buscando documentos similares a {id_documento}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda de similares: {str(e)}")
+
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Documento con ID {id_documento} no encontrado o sin vector")
+
+    results, total = found
+    return SimilarResponse(results=results, total=total, id_documento=id_documento)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
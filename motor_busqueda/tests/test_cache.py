@@ -0,0 +1,78 @@
+"""
+Pruebas de la caché por generación y de la agrupación de peticiones idénticas.
+
+Ejecución desde motor_busqueda/:
+    python -m pytest tests/test_cache.py
+"""
+import asyncio
+
+import pytest
+
+from app.search.cache import GenerationCache
+from app.search.coalescing import SingleFlight
+
+
+def test_generacion_distinta_invalida():
+    cache = GenerationCache(10)
+    # en modo memoria la generación es (corpus, matriz)
+    cache.put("q", [1, 2], generation=(5, 1))
+
+    assert cache.get("q", (5, 1)) == [1, 2]
+    # la matriz publica una generación nueva con el mismo corpus
+    assert cache.get("q", (5, 2)) is None
+    # la entrada descartada no vuelve aunque se pida con la generación original
+    assert cache.get("q", (5, 1)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lru_acotada():
+    cache = GenerationCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["size"] == 2
+
+
+def test_agrupa_peticiones_concurrentes():
+    flight = SingleFlight()
+    calls = []
+
+    async def busqueda():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("k", busqueda) for _ in range(5)))
+        # terminada la primera, la misma clave vuelve a ejecutarse
+        return results, await flight.do("k", busqueda)
+
+    results, later = asyncio.run(main())
+    assert results == [1] * 5
+    assert later == 2
+    assert flight.stats()["executions"] == 2 and flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_error_compartido_y_cancelacion_aislada():
+    flight = SingleFlight()
+
+    async def falla():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("motor caído")
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", falla))
+        second = asyncio.ensure_future(flight.do("k", falla))
+        await asyncio.sleep(0)
+        # el cliente que inició la búsqueda se desconecta; el otro recibe igualmente el error
+        first.cancel()
+        with pytest.raises(RuntimeError):
+            await second
+        return first.cancelled()
+
+    assert asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Pruebas del índice BM25 en memoria frente a un cálculo por fuerza bruta
+(no necesitan base de datos).
+
+Ejecución desde motor_busqueda/:
+    python -m pytest tests/test_keyword_index.py
+"""
+import math
+from collections import Counter
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.search.keyword_index import LOOKUP_MAX_BLOCKS, POSTING_BLOCK, KeywordIndex, PostingList, tokenize
+
+VOCABULARIO = [
+    "asma", "infantil", "diabetes", "tipo", "hipertension", "arterial", "tratamiento",
+    "ensayo", "clinico", "cohorte", "riesgo", "cardiovascular", "vacuna", "gripe",
+    "insulina", "pediatria", "obesidad", "dieta", "ejercicio", "revision"
+]
+
+
+def corpus(n: int, seed: int = 7):
+    """ Filas (id, id_categoria, fecha, texto) con ids crecientes y huecos """
+    rng = np.random.default_rng(seed)
+    # frecuencias tipo Zipf: unos pocos términos aparecen en casi todos los documentos
+    weights = 1.0 / np.arange(1, len(VOCABULARIO) + 1)
+    weights /= weights.sum()
+    rows = []
+    for i in range(n):
+        words = rng.choice(VOCABULARIO, size=int(rng.integers(3, 15)), p=weights)
+        categoria = None if i % 11 == 0 else int(i % 3)
+        rows.append((2 * i + 1, categoria, date(2020, 1, 1 + i % 28), " ".join(words)))
+    return rows
+
+
+def bm25_bruto(rows, query, k1=1.2, b=0.75, id_categoria=None):
+    """ Puntuaciones BM25 normalizadas documento a documento, sin índice """
+    docs = [Counter(tokenize(text)) for _, _, _, text in rows]
+    lengths = [sum(tf.values()) for tf in docs]
+    n = len(rows)
+    avgdl = max(sum(lengths) / n, 1.0)
+
+    def bm25(idf, tf, length):
+        return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avgdl))
+
+    scores = [0.0] * n
+    bounds = 0.0
+    for term in set(tokenize(query)):
+        containing = [i for i, tf in enumerate(docs) if term in tf]
+        if not containing:
+            continue
+        df = len(containing)
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        # misma cota que el índice: máxima frecuencia en el documento más corto
+        bounds += bm25(idf, max(docs[i][term] for i in containing), min(lengths[i] for i in containing))
+        for i in containing:
+            scores[i] += bm25(idf, docs[i][term], lengths[i])
+
+    return {
+        rows[i][0]: scores[i] / bounds
+        for i in range(n)
+        if scores[i] > 0 and (id_categoria is None or rows[i][1] == id_categoria)
+    }
+
+
+@pytest.fixture(scope="module")
+def filas():
+    return corpus(700)
+
+
+@pytest.fixture(scope="module")
+def indice(filas):
+    index = KeywordIndex()
+    # en varios lotes, como la actualización incremental de get_keyword_index
+    for lo in range(0, len(filas), 250):
+        index.add_documents(filas[lo:lo + 250])
+    return index
+
+
+@pytest.mark.parametrize("query", ["asma infantil", "diabetes insulina revision", "ejercicio", "gripe vacuna pediatria"])
+@pytest.mark.parametrize("id_categoria", [None, 1])
+def test_coincide_con_fuerza_bruta(filas, indice, query, id_categoria):
+    expected = bm25_bruto(filas, query, id_categoria=id_categoria)
+    ids, scores = indice.search(query, 10, id_categoria=id_categoria)
+
+    best = sorted(expected.values(), reverse=True)[:10]
+    np.testing.assert_allclose(scores, best, rtol=1e-9)
+    # cada id devuelto tiene la puntuación que le corresponde (los empates pueden salir cualquiera)
+    np.testing.assert_allclose(scores, [expected[i] for i in ids.tolist()], rtol=1e-9)
+    assert np.all(scores <= 1.0)
+    assert indice.count(query, id_categoria=id_categoria) == len(expected)
+
+
+def test_lotes_incrementales_igual_que_una_carga(filas, indice):
+    completo = KeywordIndex()
+    completo.add_documents(filas)
+    # las filas ya indexadas se ignoran
+    completo.add_documents(filas[:50])
+
+    assert len(completo) == len(indice) == len(filas)
+    for query in ("asma infantil", "riesgo cardiovascular"):
+        ids, scores = completo.search(query, 20)
+        expected_ids, expected_scores = indice.search(query, 20)
+        assert ids.tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_empates_ordenados_por_posicion():
+    index = KeywordIndex()
+    index.add_documents([(i, None, None, "asma infantil") for i in range(1, 40)])
+
+    ids, _ = index.search("asma", 5)
+    assert ids.tolist() == [1, 2, 3, 4, 5]
+    # la página siguiente continúa donde terminó la anterior
+    more, _ = index.search("asma", 10)
+    assert more.tolist()[:5] == ids.tolist()
+    assert more.tolist()[5:] == [6, 7, 8, 9, 10]
+
+
+@pytest.mark.parametrize("step", [1, 1000])
+def test_lookup_por_bloques(step):
+    docs = np.arange(0, POSTING_BLOCK * (LOOKUP_MAX_BLOCKS + 8) * 3, 3, dtype=np.int64)
+    tfs = (docs % 5 + 1).astype(np.int64)
+    postings = PostingList()
+    # en dos tramos para comprobar el delta entre el final del primero y el segundo
+    half = docs.shape[0] // 2 + 5
+    postings.append(docs[:half], tfs[:half], np.ones(half, dtype=np.int64))
+    postings.append(docs[half:], tfs[half:], np.ones(docs.shape[0] - half, dtype=np.int64))
+    assert postings.decode().tolist() == docs.tolist()
+
+    # step=1000 toca pocos bloques (decodificación parcial); step=1, todos (lista completa)
+    candidates = np.arange(0, docs[-1] + 2, step, dtype=np.int64)
+    found, found_tfs = postings.lookup(candidates)
+
+    expected = np.isin(candidates, docs)
+    assert found.tolist() == expected.tolist()
+    assert found_tfs.tolist() == (candidates[expected] % 5 + 1).tolist()
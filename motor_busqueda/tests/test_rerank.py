@@ -0,0 +1,78 @@
+"""
+Pruebas del re-ranking con StubReranker (no necesitan base de datos ni modelo).
+
+Ejecución desde motor_busqueda/:
+    python -m pytest tests/test_rerank.py
+"""
+import time
+
+import pytest
+
+from app.search.rerank import Reranker, StubReranker, rerank_metrics, rerank_results
+
+
+class SlowStubReranker(StubReranker):
+    """ StubReranker que tarda `delay` segundos por lote """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.batches = 0
+
+    def score(self, query, texts):
+        self.batches += 1
+        time.sleep(self.delay)
+        return super().score(query, texts)
+
+
+def candidatos():
+    # orden de la primera etapa: el más relevante para "asma infantil" está el último
+    return [
+        {"id": 1, "titulo": "Hipertensión arterial", "texto_resumen": "", "score": 0.9},
+        {"id": 2, "titulo": "Asma en adultos", "texto_resumen": "", "score": 0.8},
+        {"id": 3, "titulo": "Diabetes tipo 2", "texto_resumen": "", "score": 0.7},
+        {"id": 4, "titulo": "Asma infantil", "texto_resumen": "tratamiento", "score": 0.6},
+    ]
+
+
+@pytest.fixture(autouse=True)
+def sin_estimacion():
+    # cada prueba empieza sin medidas de lotes anteriores
+    rerank_metrics.per_candidate_ms = None
+    yield
+    rerank_metrics.per_candidate_ms = None
+
+
+def test_reranker_es_abstracto():
+    with pytest.raises(TypeError):
+        Reranker()
+
+
+def test_reordena_todos_los_candidatos():
+    results = candidatos()
+    reranked = rerank_results("asma infantil", results, StubReranker(), budget_ms=1000, batch_size=2)
+
+    assert [r["id"] for r in reranked] == [4, 2, 1, 3]
+    assert reranked[0]["score_rerank"] == 1.0
+    assert all("score_rerank" in r for r in reranked)
+    # los diccionarios de entrada (pueden estar en caché) no se modifican
+    assert all("score_rerank" not in r for r in results)
+
+
+def test_presupuesto_agotado_devuelve_resultado_parcial():
+    reranker = SlowStubReranker(delay=0.05)
+    reranked = rerank_results("asma infantil", candidatos(), reranker, budget_ms=80, batch_size=2)
+
+    # el primer lote (50 ms) cabe; el segundo, estimado con el primero, ya no
+    assert reranker.batches == 1
+    assert [r["id"] for r in reranked] == [2, 1, 3, 4]
+    assert [("score_rerank" in r) for r in reranked] == [True, True, False, False]
+
+
+def test_primer_lote_que_no_cabe_no_se_ejecuta():
+    rerank_metrics.per_candidate_ms = 100.0
+    reranker = SlowStubReranker(delay=0.0)
+    reranked = rerank_results("asma infantil", candidatos(), reranker, budget_ms=50, batch_size=2)
+
+    assert reranker.batches == 0
+    assert [r["id"] for r in reranked] == [1, 2, 3, 4]
+    assert all("score_rerank" not in r for r in reranked)
@@ -0,0 +1,135 @@
+"""
+Pruebas de la publicación de la matriz compartida con una conexión simulada
+(no necesitan base de datos).
+
+Ejecución desde motor_busqueda/:
+    python -m pytest tests/test_shared_matrix.py
+"""
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.search.shared_matrix import load_current, publish_generation
+
+DIMENSION = 8
+
+
+class FakeCursor:
+    """ Responde a las consultas de publish_generation sobre una lista de filas """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.itersize = None
+        self._result = []
+
+    def execute(self, sql, params):
+        start_id, max_id = (params[0], params[1]) if "id >" in sql else (0, None)
+        rows = [
+            row for row in self.rows
+            if row[3] is not None and row[0] > start_id and (max_id is None or row[0] <= max_id)
+        ]
+        if "MAX(id)" in sql:
+            self._result = [(len(rows), max((row[0] for row in rows), default=0))]
+        elif "COUNT(*)" in sql:
+            self._result = [(len(rows),)]
+        else:
+            self._result = sorted(rows)
+
+    def fetchone(self):
+        return self._result[0]
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self.rows)
+
+    def commit(self):
+        pass
+
+
+def documentos(first: int, last: int):
+    """ Filas (id, id_categoria, fecha, vector como texto de pgvector); los múltiplos de 7 sin vector """
+    rng = np.random.default_rng(first)
+    rows = []
+    for doc_id in range(first, last + 1):
+        vector = None
+        if doc_id % 7:
+            vector = "[" + ",".join(f"{v:.6f}" for v in rng.normal(size=DIMENSION)) + "]"
+        categoria = None if doc_id % 5 == 0 else doc_id % 3
+        fecha = None if doc_id % 4 == 0 else date(2021, 1 + doc_id % 12, 1 + doc_id % 28)
+        rows.append((doc_id, categoria, fecha, vector))
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def matriz_pequena(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_DIMENSION", DIMENSION)
+    monkeypatch.setattr(settings, "PCA_DIMENSION", 0)
+    monkeypatch.setattr(settings, "SHARD_COUNT", 1)
+
+
+def assert_misma_matriz(a, b):
+    assert a.ids.tolist() == b.ids.tolist()
+    assert a.categorias.tolist() == b.categorias.tolist()
+    assert a.fechas.tolist() == b.fechas.tolist()
+    np.testing.assert_array_equal(a.vectors, b.vectors)
+    assert a.max_id == b.max_id
+
+
+def test_incremental_igual_que_completa(tmp_path):
+    rows = documentos(1, 60)
+    incremental, completa = str(tmp_path / "incremental"), str(tmp_path / "completa")
+    publish_generation(FakeConnection(rows), incremental, batch_size=4)
+
+    rows += documentos(61, 90)
+    name = publish_generation(FakeConnection(rows), incremental, batch_size=4)
+    publish_generation(FakeConnection(rows), completa, batch_size=4, full=True)
+
+    with open(os.path.join(incremental, name, "meta.json")) as f:
+        meta = json.load(f)
+    # la segunda publicación parte de la primera y solo lee las filas nuevas
+    assert meta["base"] == "gen-000001"
+    assert meta["delta_rows"] == sum(1 for row in documentos(61, 90) if row[3] is not None)
+    assert sorted(os.listdir(incremental)) == ["CURRENT", name]
+
+    a, b = load_current(incremental), load_current(completa)
+    assert_misma_matriz(a, b)
+    query = np.ones(DIMENSION, dtype=np.float32)
+    for x, y in zip(a.search(query, 10, id_categoria=1), b.search(query, 10, id_categoria=1)):
+        np.testing.assert_array_equal(x, y)
+
+
+def test_sin_cambios_no_publica(tmp_path):
+    rows = documentos(1, 30)
+    name = publish_generation(FakeConnection(rows), str(tmp_path))
+
+    assert publish_generation(FakeConnection(rows), str(tmp_path)) == name
+
+
+def test_borrado_reconstruye_entera(tmp_path):
+    rows = documentos(1, 40)
+    publish_generation(FakeConnection(rows), str(tmp_path))
+
+    # un documento antiguo borrado: el número de filas ya no cuadra con la generación anterior
+    rows = [row for row in rows if row[0] != 3] + documentos(41, 50)
+    name = publish_generation(FakeConnection(rows), str(tmp_path))
+
+    with open(os.path.join(str(tmp_path), name, "meta.json")) as f:
+        assert json.load(f)["base"] is None
+    completa = tmp_path / "completa"
+    publish_generation(FakeConnection(rows), str(completa), full=True)
+    assert_misma_matriz(load_current(str(tmp_path)), load_current(str(completa)))
+    assert 3 not in load_current(str(tmp_path)).ids.tolist()
@@ -22,7 +22,7 @@ class ClinicScraperPipeline:
         return item
 
 class PostgreSQLPipeline:
-    def __init__(self, pg_host, pg_port, pg_db, pg_user, pg_password):
+    def __init__(self, pg_host, pg_port, pg_db, pg_user, pg_password, stats_refresh_every=200):
         self.pg_host = pg_host
         self.pg_port = pg_port
         self.pg_db = pg_db
@@ -33,6 +33,9 @@ class PostgreSQLPipeline:
         # No cargar el modelo aquí para evitar problemas de importación
         self.model = None
         self.categoria_default_id = None
+        # la vista de estadísticas se refresca por lotes, no en cada documento
+        self.stats_refresh_every = stats_refresh_every
+        self.pendientes_estadisticas = 0
     
     @classmethod
     def from_crawler(cls, crawler):
@@ -41,7 +44,8 @@ class PostgreSQLPipeline:
             pg_port=crawler.settings.get('PG_PORT', '5432'),
             pg_db=crawler.settings.get('PG_DATABASE', 'cliniccloud'),
             pg_user=crawler.settings.get('PG_USER', 'admin'),
-            pg_password=crawler.settings.get('PG_PASSWORD', 'admin123')
+            pg_password=crawler.settings.get('PG_PASSWORD', 'admin123'),
+            stats_refresh_every=crawler.settings.getint('STATS_REFRESH_EVERY', 200)
         )
     
     def open_spider(self, spider):
@@ -99,12 +103,25 @@ class PostgreSQLPipeline:
             raise
     
     def close_spider(self, spider):
+        if self.connection and self.pendientes_estadisticas:
+            self._refrescar_estadisticas(spider)
         if self.cursor:
             self.cursor.close()
         if self.connection:
             self.connection.close()
         spider.logger.info("Conexión a la base de datos cerrada")
     
+    def _refrescar_estadisticas(self, spider):
+        """ Refresca la vista estadisticas_corpus sin bloquear las lecturas de la API """
+        try:
+            self.cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY estadisticas_corpus")
+            self.connection.commit()
+            spider.logger.info(f"Estadísticas del corpus refrescadas tras {self.pendientes_estadisticas} documentos")
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            spider.logger.warning(f"No se pudieron refrescar las estadísticas (¿migración 005 aplicada?): {e}")
+        self.pendientes_estadisticas = 0
+
     def _crear_categorias_principales(self, spider):
         """Crea las categorías médicas principales en la base de datos"""
         categorias_principales = [
@@ -153,6 +170,34 @@ class PostgreSQLPipeline:
             spider.logger.error(f"Error al obtener/crear categoría: {e}")
             return self.categoria_default_id  # Fallback a categoría por defecto
 
+    def _guardar_autores(self, documento_id, autores, spider):
+        """ Registra los autores del documento en las tablas autor y documento_autor """
+        orden = 0
+        for nombre in autores:
+            nombre = nombre.strip()[:255]
+            if not nombre:
+                continue
+            # DO UPDATE (sin cambios) para que RETURNING devuelva también los autores ya existentes
+            self.cursor.execute(
+                """
+                INSERT INTO autor (nombre) VALUES (%s)
+                ON CONFLICT (nombre) DO UPDATE SET nombre = EXCLUDED.nombre
+                RETURNING id
+                """,
+                (nombre,)
+            )
+            autor_id = self.cursor.fetchone()[0]
+            orden += 1
+            self.cursor.execute(
+                """
+                INSERT INTO documento_autor (id_documento, id_autor, orden)
+                VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+                """,
+                (documento_id, autor_id, orden)
+            )
+        spider.logger.info(f"Registrados {orden} autores para documento ID: {documento_id}")
+
     def _generate_embedding(self, text, spider):
         """Genera el embedding para el texto dado"""
         if self.model is not None:
@@ -235,6 +280,12 @@ class PostgreSQLPipeline:
             documento_id = self.cursor.fetchone()[0]
             spider.logger.info(f"Documento insertado con ID: {documento_id}")
             
+            # Autores normalizados (el spider los envía ya separados en 'autores')
+            autores = item.get('autores')
+            if autores is None:
+                autores = [a for a in item.get('autor', '').split(',') if a.strip()]
+            self._guardar_autores(documento_id, autores, spider)
+            
             # Generar el resumen e insertar en la tabla resumen
             if abstract:
                 try:
@@ -260,6 +311,10 @@ class PostgreSQLPipeline:
             
             self.connection.commit()
             spider.logger.info(f"Transacción completada exitosamente para '{titulo[:50]}...'")
+            
+            self.pendientes_estadisticas += 1
+            if self.pendientes_estadisticas >= self.stats_refresh_every:
+                self._refrescar_estadisticas(spider)
 
         except Exception as e:
             if self.connection:
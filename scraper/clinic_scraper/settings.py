@@ -19,6 +19,9 @@ PG_DATABASE = 'cliniccloud'
 PG_USER = 'admin'
 PG_PASSWORD = 'admin123'
 
+# Documentos insertados entre cada refresco de la vista estadisticas_corpus (GET /api/stats)
+STATS_REFRESH_EVERY = 200
+
 ITEM_PIPELINES = {
     #'clinic_scraper.pipelines.PrintPipeline': 300,
     'clinic_scraper.pipelines.PostgreSQLPipeline': 300,
@@ -155,6 +155,7 @@ class PubmedSpider(scrapy.Spider):
                     yield {
                         'titulo': title,
                         'autor': ', '.join(authors) if authors else '',
+                        'autores': authors,
                         'fecha_publicacion': pub_date,
                         'url_fuente': url,
                         'abstract': abstract,